@@ -218,5 +218,11 @@ def health_check():
     })
 
 if __name__ == '__main__':
+    if Config.EMBEDDED_JOB_WORKER:
+        # Single-process development setup: process jobs in the web server
+        from worker import register_handlers
+        from utils.job_queue import job_worker
+        register_handlers()
+        job_worker.start()
     logger.info("Starting Flask server...")
     app.run(debug=not IS_PRODUCTION, port=5000, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Benchmark the reads of the processing pipeline: full mongoengine documents
+versus .only() documents versus lean projected dicts (utils/lean_reads.py),
+for the submission texts of a class and for an index sync of its stored
+features.
+
+Needs a running MongoDB. The synthetic classes are written to the collections
+of a throwaway database (dropped afterwards), so never point --uri at real data.
+
+Usage (from flask-server/):
+    python -m benchmarks.bench_lean_reads --docs 1000 10000 --uri mongodb://localhost:27017/plagexit_bench
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from mongoengine import connect
+
+from benchmarks.bench_minhash import make_corpus
+from models.submission import Submission
+from models.submission_features import SubmissionFeatures
+from utils.lean_reads import iter_projected
+
+FEATURE_FIELDS = ('submission', 'minhash', 'num_perm', 'signature_version', 'fingerprints',
+                  'term_counts', 'simhash', 'suppression_key', 'sentence_spans', 'sentence_embeddings',
+                  'embedding_model', 'embedding_dim', 'semantic_version')
+
+
+def make_class(num_docs, num_words, seed=11):
+    """Insert one assignment's worth of submissions and stored features, shaped like real ones."""
+    rng = random.Random(seed)
+    assignment_id = ObjectId()
+    submissions, features = [], []
+    for text in make_corpus(num_docs, num_words, seed=seed):
+        submission_id = ObjectId()
+        submissions.append({
+            '_id': submission_id, 'student': ObjectId(), 'assignment': assignment_id,
+            'answer_file': ObjectId(), 'status': 'Submitted', 'submitted_at': datetime.utcnow(),
+            'ocr_text': text, 'processing_status': 'Completed', 'plagiarism_result': 'found',
+            'plagiarism_details': {
+                'matches': [{'submission_id': str(ObjectId()), 'similarity': rng.random(),
+                             'passages': [text[:200], text[200:400]]} for _ in range(5)]
+            },
+            'correctness_score': 70.0, 'final_score': 60.0, 'stage_stamps': {'extract': '1:0123456789abcdef'}
+        })
+        features.append({
+            'submission': submission_id, 'assignment': assignment_id, 'updated_at': datetime.utcnow(),
+            'tokens': rng.randbytes(num_words * 4), 'shingle_hashes': rng.randbytes(num_words * 8),
+            'minhash': rng.randbytes(128 * 8), 'num_perm': 128, 'signature_version': 1,
+            'fingerprints': rng.randbytes(num_words), 'term_counts': rng.randbytes(num_words * 2),
+            'simhash': rng.randbytes(8), 'suppression_key': 0,
+            'sentence_spans': rng.randbytes(num_words // 2), 'sentence_embeddings': rng.randbytes(40 * 384 * 2),
+            'embedding_model': 'all-MiniLM-L6-v2', 'embedding_dim': 384, 'semantic_version': 1
+        })
+    Submission._get_collection().insert_many(submissions)
+    SubmissionFeatures._get_collection().insert_many(features)
+    return assignment_id
+
+
+def drop_collections():
+    Submission._get_collection().drop()
+    SubmissionFeatures._get_collection().drop()
+
+
+def best_of(repeat, read):
+    """Fastest of `repeat` runs (seconds) and the number of documents read."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = read()
+        timings.append(time.perf_counter() - start)
+    return min(timings), count
+
+
+def text_reads(assignment_id):
+    return {
+        'full documents': lambda: sum(
+            len(s.ocr_text or "") > 0 for s in Submission.objects(assignment=assignment_id)),
+        '.only() documents': lambda: sum(
+            len(s.ocr_text or "") > 0 for s in Submission.objects(assignment=assignment_id).only('id', 'ocr_text')),
+        'lean projected dicts': lambda: sum(
+            len(s.get('ocr_text') or "") > 0
+            for s in iter_projected(Submission, {'assignment': assignment_id}, ['ocr_text'])),
+    }
+
+
+def feature_reads(assignment_id):
+    return {
+        'full documents': lambda: sum(
+            f.minhash is not None for f in SubmissionFeatures.objects(assignment=assignment_id).no_dereference()),
+        '.only() documents': lambda: sum(
+            f.minhash is not None
+            for f in SubmissionFeatures.objects(assignment=assignment_id).only(*FEATURE_FIELDS).no_dereference()),
+        'lean projected dicts': lambda: sum(
+            f.get('minhash') is not None
+            for f in iter_projected(SubmissionFeatures, {'assignment': assignment_id}, FEATURE_FIELDS)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--words', type=int, default=600)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--uri', default=os.getenv('BENCH_MONGODB_URI', 'mongodb://localhost:27017/plagexit_bench'))
+    args = parser.parse_args()
+
+    connect(host=args.uri)
+    try:
+        for num_docs in args.docs:
+            drop_collections()
+            assignment_id = make_class(num_docs, args.words)
+            print(f"{num_docs} submissions, {args.words} words each")
+            for label, reads in (('submission texts', text_reads), ('feature sync', feature_reads)):
+                baseline = None
+                for name, read in reads(assignment_id).items():
+                    elapsed, count = best_of(args.repeat, read)
+                    baseline = baseline or elapsed
+                    print(f"  {label:<17} {name:<21} {elapsed:8.3f}s  {count / elapsed:10,.0f} docs/s  "
+                          f"speedup {baseline / elapsed:5.2f}x")
+    finally:
+        drop_collections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark MinHash signature generation: per-shingle MinHash.update (legacy
+scheme, which BatchMinHasher reproduces) versus the vectorized BatchMinHasher.
+
+Usage (from flask-server/):
+    python -m benchmarks.bench_minhash --docs 400 --words 1500
+"""
+import argparse
+import random
+import time
+
+from datasketch import MinHash
+
+from ml_models.cheating_detector import CheatingDetector
+
+
+def make_corpus(num_docs, num_words, vocabulary=5000, seed=42):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(vocabulary)]
+    return [' '.join(rng.choice(words) for _ in range(num_words)) for _ in range(num_docs)]
+
+
+def bench_update_loop(detector, shingle_lists):
+    start = time.perf_counter()
+    for shingles in shingle_lists:
+        minhash = MinHash(num_perm=detector.num_perm, scheme='legacy')
+        for shingle in shingles:
+            minhash.update(shingle.encode('utf-8'))
+    return time.perf_counter() - start
+
+
+def bench_batch_engine(detector, shingle_lists):
+    start = time.perf_counter()
+    hash_arrays = [detector.minhasher.hash_shingles(shingles) for shingles in shingle_lists]
+    detector.minhasher.signatures(hash_arrays)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=400)
+    parser.add_argument('--words', type=int, default=1500)
+    parser.add_argument('--num-perm', type=int, default=128)
+    args = parser.parse_args()
+
+    detector = CheatingDetector(num_perm=args.num_perm)
+    texts = make_corpus(args.docs, args.words)
+    shingle_lists = [detector._get_shingles(text, k=2) for text in texts]
+    total = sum(len(shingles) for shingles in shingle_lists)
+
+    print(f"{args.docs} documents, {total} shingles, {args.num_perm} permutations")
+    for name, bench in (('MinHash.update loop', bench_update_loop),
+                        ('BatchMinHasher', bench_batch_engine)):
+        elapsed = bench(detector, shingle_lists)
+        print(f"{name:<22} {elapsed:8.3f}s  {total / elapsed:14,.0f} shingles/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark a full class re-analysis: serial CheatingDetector.analyze_submissions
+versus the process-pool mode, checking that both produce identical results.
+
+Usage (from flask-server/):
+    python -m benchmarks.bench_parallel_analysis --docs 2000 --words 800 --workers 2 4 8 16
+"""
+import argparse
+import os
+import random
+import time
+
+from benchmarks.bench_minhash import make_corpus
+from ml_models.cheating_detector import CheatingDetector
+
+
+def make_submissions(num_docs, num_words, copy_rate=0.05, seed=7):
+    """Random submissions where a few are lightly edited copies of others."""
+    rng = random.Random(seed)
+    texts = make_corpus(num_docs, num_words)
+    for i in range(1, num_docs):
+        if rng.random() < copy_rate:
+            words = texts[rng.randrange(i)].split()
+            for _ in range(num_words // 20):
+                words[rng.randrange(len(words))] = f"edit{rng.randrange(1000)}"
+            texts[i] = ' '.join(words)
+    return [{'id': f"sub{i:05d}", 'text': text} for i, text in enumerate(texts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=800)
+    parser.add_argument('--workers', type=int, nargs='+', default=[os.cpu_count()])
+    args = parser.parse_args()
+
+    submissions = make_submissions(args.docs, args.words)
+    detector = CheatingDetector()
+
+    start = time.perf_counter()
+    expected = detector.analyze_submissions(submissions)
+    serial = time.perf_counter() - start
+    print(f"{args.docs} submissions, {args.words} words each")
+    print(f"{'serial':<12} {serial:8.3f}s")
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        result = detector.analyze_submissions(submissions, workers=workers)
+        elapsed = time.perf_counter() - start
+        status = 'identical' if result == expected else 'MISMATCH'
+        print(f"{workers:>3} workers  {elapsed:8.3f}s  speedup {serial / elapsed:5.2f}x  {status}")
+
+
+if __name__ == '__main__':
+    main()
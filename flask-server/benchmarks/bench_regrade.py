@@ -0,0 +1,71 @@
+"""
+Benchmark re-grading a class from stored raw scores: one vectorized
+grade_batch call versus grading the submissions one at a time, checking that
+both produce identical scores and labels.
+
+Usage (from flask-server/):
+    python -m benchmarks.bench_regrade --docs 1000 10000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from ml_models.grading import grade_batch
+
+SEVERITY_PENALTIES = [0.10, 0.25, 0.50]
+
+
+def make_scores(num_docs, seed=5):
+    """Raw scores shaped like a real class: some answers without a model answer, a few too short."""
+    rng = random.Random(seed)
+    similarity = [rng.random() if rng.random() < 0.9 else np.nan for _ in range(num_docs)]
+    quality = [rng.uniform(60, 100) if rng.random() < 0.97 else np.nan for _ in range(num_docs)]
+    words = [rng.randrange(20, 1200) for _ in range(num_docs)]
+    tfidf = [rng.random() for _ in range(num_docs)]
+    penalty = [rng.choice(SEVERITY_PENALTIES) for _ in range(num_docs)]
+    return (np.array(similarity), np.array(quality), np.array(words, dtype=np.float64),
+            np.array(tfidf), np.array(penalty))
+
+
+def bench_per_submission(similarity, quality, words, tfidf, penalty, threshold):
+    start = time.perf_counter()
+    results = [
+        grade_batch(similarity[i:i + 1], quality[i:i + 1], words[i:i + 1],
+                    tfidf[i:i + 1] >= threshold, penalty[i:i + 1])
+        for i in range(len(similarity))
+    ]
+    elapsed = time.perf_counter() - start
+    scores = np.concatenate([result[0] for result in results])
+    finals = np.concatenate([result[1] for result in results])
+    labels = [label for result in results for label in result[2]]
+    return elapsed, (scores, finals, labels)
+
+
+def bench_vectorized(similarity, quality, words, tfidf, penalty, threshold):
+    start = time.perf_counter()
+    result = grade_batch(similarity, quality, words, tfidf >= threshold, penalty)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--threshold', type=float, default=0.6)
+    args = parser.parse_args()
+
+    for num_docs in args.docs:
+        scores = make_scores(num_docs)
+        serial, expected = bench_per_submission(*scores, args.threshold)
+        vectorized, result = bench_vectorized(*scores, args.threshold)
+        identical = (np.array_equal(result[0], expected[0]) and np.array_equal(result[1], expected[1])
+                     and result[2] == expected[2])
+        print(f"{num_docs} submissions")
+        print(f"  {'one at a time':<14} {serial:8.4f}s")
+        print(f"  {'grade_batch':<14} {vectorized:8.4f}s  speedup {serial / vectorized:6.1f}x  "
+              f"{'identical' if identical else 'MISMATCH'}")
+
+
+if __name__ == '__main__':
+    main()
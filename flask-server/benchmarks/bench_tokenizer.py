@@ -0,0 +1,66 @@
+"""
+Benchmark text normalization and shingling: the old translate/split/join
+pipeline versus the streaming shared tokenizer, measuring time and memory
+allocated with tracemalloc.
+
+Usage (from flask-server/):
+    python -m benchmarks.bench_tokenizer --docs 200 --words 1500
+"""
+import argparse
+import string
+import time
+import tracemalloc
+
+from benchmarks.bench_minhash import make_corpus
+from ml_models.minhash_engine import BatchMinHasher
+from ml_models.tokenizer import STOPWORDS, tokenizer
+
+
+def legacy_shingle_hashes(minhasher, text, k=2):
+    text = text.lower()
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    words = [w for w in text.split() if w not in STOPWORDS]
+    words = ' '.join(words).split()
+    shingles = [' '.join(words[i:i+k]) for i in range(len(words)-k+1)]
+    return minhasher.hash_shingles(shingles)
+
+
+def streaming_shingle_hashes(minhasher, text, k=2):
+    return minhasher.hash_shingles(tokenizer.iter_shingles(tokenizer.iter_tokens(text), k))
+
+
+def measure(func, minhasher, texts):
+    start = time.perf_counter()
+    for text in texts:
+        func(minhasher, text)
+    elapsed = time.perf_counter() - start
+
+    # Peak traced memory is taken in a separate pass so tracing does not skew the timing
+    tracemalloc.start()
+    for text in texts:
+        func(minhasher, text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--words', type=int, default=1500)
+    args = parser.parse_args()
+
+    minhasher = BatchMinHasher()
+    texts = make_corpus(args.docs, args.words)
+    for text in texts[:1]:
+        assert (legacy_shingle_hashes(minhasher, text) == streaming_shingle_hashes(minhasher, text)).all()
+
+    print(f"{args.docs} documents, {args.words} words each")
+    for name, func in (('translate/split/join', legacy_shingle_hashes),
+                       ('streaming tokenizer', streaming_shingle_hashes)):
+        elapsed, peak = measure(func, minhasher, texts)
+        print(f"{name:<22} {elapsed:8.3f}s  peak {peak / 1024:10,.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,56 @@ class Config:
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
     
+    # Reference corpus (prior semesters, textbooks) built by ingest_reference_corpus.py
+    REFERENCE_CORPUS_PATH = os.environ.get('REFERENCE_CORPUS_PATH')
+    REFERENCE_MATCH_THRESHOLD = float(os.environ.get('REFERENCE_MATCH_THRESHOLD', '0.4'))
+    
+    # SimHash near-duplicate pre-filter: in classes with at least this many submissions,
+    # only submissions within SIMHASH_MAX_DISTANCE bits go on to the MinHash and TF-IDF stages
+    SIMHASH_PREFILTER_MIN_SUBMISSIONS = int(os.environ.get('SIMHASH_PREFILTER_MIN_SUBMISSIONS', '500'))
+    SIMHASH_MAX_DISTANCE = int(os.environ.get('SIMHASH_MAX_DISTANCE', '10'))
+    
+    # Cross-submission paraphrase detection on sentence embeddings: sentences at or above
+    # SEMANTIC_SIMILARITY_THRESHOLD cosine match, and a submission is flagged when at least
+    # SEMANTIC_MATCH_RATIO of its sentences match sentences of one other submission
+    SEMANTIC_SIMILARITY_THRESHOLD = float(os.environ.get('SEMANTIC_SIMILARITY_THRESHOLD', '0.85'))
+    SEMANTIC_MATCH_RATIO = float(os.environ.get('SEMANTIC_MATCH_RATIO', '0.5'))
+    
+    # Boilerplate suppression: once an assignment has BOILERPLATE_MIN_SUBMISSIONS submissions,
+    # shingles found in more than BOILERPLATE_MAX_DF of them are left out of MinHash signatures
+    BOILERPLATE_MAX_DF = float(os.environ.get('BOILERPLATE_MAX_DF', '0.5'))
+    BOILERPLATE_MIN_SUBMISSIONS = int(os.environ.get('BOILERPLATE_MIN_SUBMISSIONS', '20'))
+    # Newly frequent shingles are suppressed in batches, since each batch re-signs the whole class:
+    # once BOILERPLATE_RESIGN_BATCH of them are waiting, or the oldest waited this many seconds
+    BOILERPLATE_RESIGN_BATCH = int(os.environ.get('BOILERPLATE_RESIGN_BATCH', '50'))
+    BOILERPLATE_RESIGN_INTERVAL_SECONDS = int(os.environ.get('BOILERPLATE_RESIGN_INTERVAL_SECONDS', '600'))
+    
+    # Match edges (match_edges collection) kept per checked submission: every pair at or above the
+    # plagiarism threshold, plus the MATCH_EDGE_TOP_K most similar at or above MATCH_EDGE_MIN_SIMILARITY
+    MATCH_EDGE_MIN_SIMILARITY = float(os.environ.get('MATCH_EDGE_MIN_SIMILARITY', '0.3'))
+    MATCH_EDGE_TOP_K = int(os.environ.get('MATCH_EDGE_TOP_K', '10'))
+    
+    # Worker processes for a class-wide analysis (POST /api/assignments/<id>/analyze); 1 runs in the job thread
+    CLASS_ANALYSIS_WORKERS = int(os.environ.get('CLASS_ANALYSIS_WORKERS', '1'))
+    
+    # Durable job queue (jobs collection): jobs run per worker process at once, lease length
+    # (renewed by heartbeats), attempts before dead-lettering, first retry delay (doubled per
+    # attempt) and the pending-job limit above which uploads are refused (0 = unbounded)
+    JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '2'))
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '300'))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+    JOB_RETRY_BASE_SECONDS = int(os.environ.get('JOB_RETRY_BASE_SECONDS', '30'))
+    JOB_QUEUE_MAX_PENDING = int(os.environ.get('JOB_QUEUE_MAX_PENDING', '0'))
+    # Submissions of one assignment processed together (one encode batch, one bulk write) and
+    # the longest a submission waits for others to join its batch (1 disables batching)
+    SUBMISSION_BATCH_SIZE = int(os.environ.get('SUBMISSION_BATCH_SIZE', '32'))
+    SUBMISSION_BATCH_WINDOW_SECONDS = float(os.environ.get('SUBMISSION_BATCH_WINDOW_SECONDS', '2'))
+    # Reuse extracted text and sentence embeddings for byte-identical uploads (content_cache collection)
+    CONTENT_CACHE_ENABLED = os.environ.get('CONTENT_CACHE_ENABLED', 'true').lower() == 'true'
+    # Also drain the queue from inside each web server process (loads the OCR and embedding
+    # models into it); by default jobs run only in separate `python -m worker` processes
+    EMBEDDED_JOB_WORKER = os.environ.get('EMBEDDED_JOB_WORKER', 'false').lower() == 'true'
+    
     # CORS settings
     CORS_HEADERS = 'Content-Type'
     CORS_ORIGINS = ['http://localhost:3000', 'http://localhost:3001']
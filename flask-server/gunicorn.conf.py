@@ -24,3 +24,14 @@ wsgi_app = 'app:app'
 
 def on_starting(server):
     server.log.info("Starting Assignment Checker API server")
+
+def post_fork(server, worker):
+    # Jobs normally run in separate `python -m worker` processes. When embedded,
+    # threads do not survive the fork from the preloading master, so each
+    # worker process loads the processing models and starts its own consumers
+    from config import Config
+    if Config.EMBEDDED_JOB_WORKER:
+        from worker import register_handlers
+        from utils.job_queue import job_worker
+        register_handlers()
+        job_worker.start()
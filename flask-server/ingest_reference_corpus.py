@@ -0,0 +1,109 @@
+"""
+Stream a directory of reference documents (prior-semester submissions,
+textbooks, model solutions) into the on-disk reference corpus index.
+
+Usage (from flask-server/):
+    python ingest_reference_corpus.py /path/to/corpus --index-dir /data/reference-index --workers 8
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from ml_models.reference_index import ReferenceIndexWriter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
+MIN_TEXT_LENGTH = 50
+
+# Per-process state, created lazily inside each pool worker
+_detector = None
+_ocr = None
+
+
+def iter_documents(source_dir):
+    """Yield supported files below source_dir, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def _extract_text(path, use_ocr):
+    global _ocr
+    if path.lower().endswith('.txt'):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    if use_ocr:
+        if _ocr is None:
+            from ml_models.ocr_processor import OCRProcessor
+            _ocr = OCRProcessor()
+        return _ocr.extract_text_from_pdf(path)
+    import PyPDF2
+    with open(path, 'rb') as f:
+        return ''.join(page.extract_text() or '' for page in PyPDF2.PdfReader(f).pages)
+
+
+def _signature_for(job):
+    """Worker: extract one document and return (path, signature or None)."""
+    global _detector
+    path, num_perm, use_ocr = job
+    try:
+        text = _extract_text(path, use_ocr)
+        if not text or len(text.strip()) < MIN_TEXT_LENGTH:
+            return path, None
+        if _detector is None:
+            from ml_models.cheating_detector import CheatingDetector
+            _detector = CheatingDetector(num_perm=num_perm)
+        return path, _detector.create_signatures([text])[0]
+    except Exception as e:
+        logger.warning(f"Skipping {path}: {str(e)}")
+        return path, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source_dir', help='Directory of .pdf/.txt reference documents')
+    parser.add_argument('--index-dir', default=os.environ.get('REFERENCE_CORPUS_PATH'),
+                        help='Index directory (defaults to $REFERENCE_CORPUS_PATH)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--segment-size', type=int, default=10000)
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--threshold', type=float, default=0.4)
+    parser.add_argument('--ocr', action='store_true', help='OCR scanned PDFs (slow)')
+    args = parser.parse_args()
+
+    if not args.index_dir:
+        parser.error('--index-dir or REFERENCE_CORPUS_PATH is required')
+
+    started = time.perf_counter()
+    ingested = skipped = 0
+    # Feed the pool in bounded batches so huge corpora are streamed, not listed up front
+    batch_size = max(1, args.workers) * 64
+    jobs = ((path, args.num_perm, args.ocr) for path in iter_documents(args.source_dir))
+
+    with ReferenceIndexWriter(args.index_dir, num_perm=args.num_perm, threshold=args.threshold,
+                              segment_size=args.segment_size) as writer, \
+            ProcessPoolExecutor(max_workers=args.workers) as executor:
+        while True:
+            batch = list(islice(jobs, batch_size))
+            if not batch:
+                break
+            for path, signature in executor.map(_signature_for, batch, chunksize=16):
+                if signature is None:
+                    skipped += 1
+                    continue
+                writer.add(os.path.relpath(path, args.source_dir), signature)
+                ingested += 1
+            logger.info(f"Ingested {ingested} documents ({skipped} skipped)")
+
+    logger.info(f"Done: {ingested} documents ingested, {skipped} skipped in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,16 @@
-from datasketch import MinHash, MinHashLSH
+from datasketch import MinHash
+from ml_models.minhash_engine import BatchMinHasher, banded_pairs, signature_to_minhash
+from ml_models.similarity_join import sparse_similarity_join
+from ml_models.parallel_tfidf import build_tfidf_matrix
+from ml_models.clustering import build_clusters
+from ml_models.text_features import word_ngrams
+from ml_models.tokenizer import tokenizer
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-from typing import List, Dict, Set, Tuple
+from typing import Iterable, List, Dict, Set, Tuple
 import logging
-import string
-try:
-    from nltk.corpus import stopwords
-    STOPWORDS = set(stopwords.words('english'))
-except Exception:
-    STOPWORDS = set([
-        'the', 'and', 'is', 'in', 'it', 'of', 'to', 'a', 'an', 'for', 'on', 'with', 'as', 'by', 'at', 'from', 'that', 'this', 'be', 'or', 'are', 'was', 'were', 'but', 'not', 'have', 'has', 'had', 'they', 'you', 'we', 'he', 'she', 'him', 'her', 'his', 'their', 'them', 'our', 'us', 'can', 'will', 'would', 'should', 'could', 'may', 'might', 'do', 'does', 'did', 'so', 'if', 'then', 'than', 'which', 'who', 'whom', 'what', 'when', 'where', 'why', 'how', 'all', 'any', 'some', 'no', 'nor', 'more', 'most', 'such', 'only', 'own', 'same', 'too', 'very', 'just', 'over', 'under', 'again', 'further', 'here', 'there', 'because', 'about', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'up', 'down', 'out', 'off', 'over', 'under', 'once'
-    ])
 
 class CheatingDetector:
     def __init__(self, 
@@ -30,15 +29,15 @@ class CheatingDetector:
         self.exact_threshold = exact_threshold
         self.paraphrase_threshold = paraphrase_threshold
         
-        # Initialize LSH index
-        self.lsh = MinHashLSH(threshold=exact_threshold, num_perm=num_perm)
+        # Vectorized signature engine; signatures of the last analysis are kept
+        # apart from the LSH bands so a threshold change only re-bands them
+        self.minhasher = BatchMinHasher(num_perm=num_perm)
+        self.signatures = np.empty((0, num_perm), dtype=np.uint64)
+        self.signature_ids: List = []
         
-        # Initialize TF-IDF vectorizer
+        # Initialize TF-IDF vectorizer over normalized token streams
         self.tfidf = TfidfVectorizer(
-            strip_accents='unicode',
-            lowercase=True,
-            analyzer='word',
-            ngram_range=(1, 3),
+            analyzer=partial(word_ngrams, ngram_range=(1, 3)),
             max_features=5000
         )
         
@@ -48,17 +47,34 @@ class CheatingDetector:
 
     def _preprocess_text(self, text: str) -> str:
         """Lowercase, remove punctuation, and stopwords from text."""
-        text = text.lower()
-        text = text.translate(str.maketrans('', '', string.punctuation))
-        words = text.split()
-        words = [w for w in words if w not in STOPWORDS]
-        return ' '.join(words)
+        return ' '.join(tokenizer.iter_tokens(text))
 
     def _get_shingles(self, text: str, k: int = 5):
         """Generate k-word shingles from preprocessed text."""
-        preprocessed = self._preprocess_text(text)
-        words = preprocessed.split()
-        return [' '.join(words[i:i+k]) for i in range(len(words)-k+1)]
+        return list(tokenizer.iter_shingles(tokenizer.iter_tokens(text), k))
+
+    def tokenize(self, text: str) -> List[str]:
+        """Normalized token stream of a text (lowercased, no punctuation or stopwords)."""
+        return tokenizer.tokenize(text)
+
+    def shingle_hashes(self, tokens: Iterable[str], k: int = 2) -> np.ndarray:
+        """
+        Hash the k-word shingles of a token stream.
+        
+        Args:
+            tokens (Iterable[str]): Normalized tokens, as returned by :meth:`tokenize`
+                or streamed from ``tokenizer.iter_tokens``
+            k (int): Shingle length in words
+            
+        Returns:
+            np.ndarray: Unique 64-bit shingle hashes
+        """
+        return self.minhasher.hash_shingles(tokenizer.iter_shingles(tokens, k))
+
+    def _submission_tokens(self, submission: Dict) -> List[str]:
+        """Use a submission's stored token stream, tokenizing its text only when missing."""
+        tokens = submission.get('tokens')
+        return tokens if tokens is not None else self.tokenize(submission['text'])
 
     def _create_minhash(self, text: str) -> MinHash:
         """
@@ -70,129 +86,207 @@ class CheatingDetector:
         Returns:
             MinHash: MinHash object
         """
-        minhash = MinHash(num_perm=self.num_perm)
-        for shingle in self._get_shingles(text, k=2):
-            minhash.update(shingle.encode('utf-8'))
-        return minhash
+        return signature_to_minhash(self.create_signatures([text])[0], self.num_perm)
+
+    def create_signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        Compute MinHash signatures for many texts with one batched NumPy pass.
+        
+        Args:
+            texts (List[str]): Input texts
+            
+        Returns:
+            np.ndarray: uint64 array of shape (len(texts), num_perm)
+        """
+        # Tokens and shingles stream straight into the hasher, no lists in between
+        return self.signatures_from_hashes([
+            self.shingle_hashes(tokenizer.iter_tokens(text)) for text in texts
+        ])
+
+    def signatures_from_hashes(self, hash_arrays: List[np.ndarray]) -> np.ndarray:
+        """
+        Compute MinHash signatures from stored shingle hashes, skipping tokenization.
+        
+        Args:
+            hash_arrays (List[np.ndarray]): Shingle hashes for each document
+            
+        Returns:
+            np.ndarray: uint64 array of shape (len(hash_arrays), num_perm)
+        """
+        return self.minhasher.signatures(hash_arrays)
+
+    def submission_signatures(self, submissions: List[Dict], workers: int = None) -> np.ndarray:
+        """
+        Compute MinHash signatures for submissions, preferring stored shingle hashes.
+        
+        Args:
+            submissions (List[Dict]): Submission dictionaries with 'text' (or stored
+                'tokens' and 'shingle_hashes')
+            workers (int): Worker processes; None or 1 computes them in this process
+            
+        Returns:
+            np.ndarray: uint64 array of shape (len(submissions), num_perm)
+        """
+        if workers is not None and workers > 1 and len(submissions) > 1:
+            # Several chunks per worker keep the pool busy when documents vary in length;
+            # map() returns chunks in order, so stacking them preserves row order
+            chunk_size = -(-len(submissions) // (workers * 4))
+            jobs = [
+                (self.num_perm, [
+                    {key: sub.get(key) for key in ('text', 'tokens', 'shingle_hashes')}
+                    for sub in submissions[start:start + chunk_size]
+                ])
+                for start in range(0, len(submissions), chunk_size)
+            ]
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+                return np.vstack(list(executor.map(_signature_chunk, jobs)))
+        
+        return self.signatures_from_hashes([
+            sub['shingle_hashes'] if sub.get('shingle_hashes') is not None
+            else self.shingle_hashes(self._submission_tokens(sub))
+            for sub in submissions
+        ])
+
+    def _exact_copy_edges(self, submissions: List[Dict], signatures: np.ndarray = None) -> List[Tuple[str, str, float]]:
+        """
+        Collect MinHash LSH candidate pairs whose estimated Jaccard similarity
+        reaches ``exact_threshold``, keeping the signatures for later re-queries.
+        
+        Args:
+            submissions (List[Dict]): List of submission dictionaries with 'id' and 'text' keys
+                (optionally stored 'tokens' and 'shingle_hashes')
+            signatures (np.ndarray): Precomputed signatures, one row per submission
+            
+        Returns:
+            List[Tuple[str, str, float]]: (earlier_id, later_id, estimated_jaccard) edges
+        """
+        if signatures is None:
+            signatures = self.submission_signatures(submissions)
+        self.signature_ids = [sub['id'] for sub in submissions]
+        self.signatures = np.asarray(signatures, dtype=np.uint64)
+        return self._banded_edges()
+
+    def _banded_edges(self) -> List[Tuple[str, str, float]]:
+        """Band the stored signatures at the current threshold and score the candidates."""
+        ids = self.signature_ids
+        return [(ids[i], ids[j], score) for i, j, score in banded_pairs(self.signatures, self.exact_threshold)]
+
+    def _copy_groups(self, edges: List[Tuple[str, str, float]]) -> List[Dict]:
+        """Turn exact-copy edges into one group per connected component."""
+        return [
+            {
+                'type': 'exact_copy',
+                'submission_ids': cluster['submission_ids'],
+                'similarity_score': cluster['max_similarity'],
+                'avg_similarity': cluster['avg_similarity']
+            }
+            for cluster in build_clusters(edges)
+        ]
 
     def detect_exact_copies(self, submissions: List[Dict]) -> List[Dict]:
         """
         Detect exact copies among submissions using MinHash LSH.
         
+        Candidate pairs are merged with union-find, so every chain of copies
+        forms a single group independent of submission order.
+        
         Args:
             submissions (List[Dict]): List of submission dictionaries with 'id' and 'text' keys
+                (optionally stored 'tokens' and 'shingle_hashes')
             
         Returns:
             List[Dict]: List of detected exact copies with their details
         """
         try:
-            # Clear existing LSH index
-            self.lsh = MinHashLSH(threshold=self.exact_threshold, num_perm=self.num_perm)
-            
-            exact_copies = []
-            processed_ids = set()
-            
-            # Process each submission
-            for submission in submissions:
-                submission_id = submission['id']
-                text = submission['text']
-                
-                if submission_id in processed_ids:
-                    continue
-                
-                minhash = self._create_minhash(text)
-                
-                # Query similar items before inserting
-                similar_ids = self.lsh.query(minhash)
-                
-                if similar_ids:
-                    # Found exact copies
-                    copies_group = {submission_id}
-                    copies_group.update(similar_ids)
-                    
-                    exact_copies.append({
-                        'type': 'exact_copy',
-                        'submission_ids': list(copies_group),
-                        'similarity_score': 1.0
-                    })
-                    
-                    processed_ids.update(copies_group)
-                
-                # Insert the current submission
-                self.lsh.insert(submission_id, minhash)
-            
-            return exact_copies
+            return self._copy_groups(self._exact_copy_edges(submissions))
             
         except Exception as e:
             self.logger.error(f"Error detecting exact copies: {str(e)}")
             return []
 
-    def detect_paraphrases(self, submissions: List[Dict]) -> List[Dict]:
+    def detect_paraphrases(self, submissions: List[Dict], top_k: int = None,
+                           block_size: int = 256, workers: int = None) -> List[Dict]:
         """
         Detect paraphrased content using TF-IDF and cosine similarity.
         
+        Similarities are computed as a sparse, chunked similarity join, so only
+        pairs above ``paraphrase_threshold`` (optionally limited to each
+        submission's ``top_k`` nearest neighbours) are ever materialized.
+        
         Args:
             submissions (List[Dict]): List of submission dictionaries with 'id' and 'text' keys
+                (optionally stored 'tokens' and 'shingle_hashes')
+            top_k (int): Keep at most this many neighbours per submission
+            block_size (int): Number of submissions compared per sparse block
+            workers (int): Worker processes for term counting and the block products;
+                None or 1 runs serially
             
         Returns:
             List[Dict]: List of detected paraphrases with their details
         """
         try:
-            texts = [sub['text'] for sub in submissions]
+            token_streams = [self._submission_tokens(sub) for sub in submissions]
             submission_ids = [sub['id'] for sub in submissions]
             
-            # Create TF-IDF matrix
-            tfidf_matrix = self.tfidf.fit_transform(texts)
-            
-            # Compute pairwise similarities
-            similarities = cosine_similarity(tfidf_matrix)
-            
-            paraphrases = []
-            processed_pairs = set()
-            
-            # Find similar pairs
-            for i in range(len(submissions)):
-                for j in range(i + 1, len(submissions)):
-                    if (i, j) in processed_pairs:
-                        continue
-                        
-                    similarity = similarities[i][j]
-                    
-                    if similarity >= self.paraphrase_threshold:
-                        paraphrases.append({
-                            'type': 'paraphrase',
-                            'submission_ids': [submission_ids[i], submission_ids[j]],
-                            'similarity_score': float(similarity)
-                        })
-                        
-                        processed_pairs.add((i, j))
-                        processed_pairs.add((j, i))
-            
-            return paraphrases
+            # Create TF-IDF matrix (term counting is chunked, in parallel with workers)
+            tfidf_matrix = build_tfidf_matrix(token_streams, self.tfidf, workers=workers)
+            
+            # Sparse thresholded similarity join in bounded-size blocks
+            pairs = sparse_similarity_join(
+                tfidf_matrix,
+                threshold=self.paraphrase_threshold,
+                top_k=top_k,
+                block_size=block_size,
+                workers=workers
+            )
+            
+            return [
+                {
+                    'type': 'paraphrase',
+                    'submission_ids': [submission_ids[i], submission_ids[j]],
+                    'similarity_score': float(similarity)
+                }
+                for i, j, similarity in pairs
+            ]
             
         except Exception as e:
             self.logger.error(f"Error detecting paraphrases: {str(e)}")
             return []
 
-    def analyze_submissions(self, submissions: List[Dict]) -> Dict:
+    def analyze_submissions(self, submissions: List[Dict], workers: int = None) -> Dict:
         """
         Analyze submissions for both exact copies and paraphrases.
         
+        With ``workers``, signature generation, TF-IDF term counting and the
+        block similarity join are fanned out over process pools. Results are merged in input
+        order, so the output is identical to the serial path.
+        
         Args:
             submissions (List[Dict]): List of submission dictionaries with 'id' and 'text' keys
+                (optionally stored 'tokens' and 'shingle_hashes')
+            workers (int): Worker processes for a full class re-analysis; None or 1 runs serially
             
         Returns:
             Dict: Analysis results including detected copies and statistics
         """
         try:
             # Detect both types of copying
-            exact_copies = self.detect_exact_copies(submissions)
-            paraphrases = self.detect_paraphrases(submissions)
+            signatures = self.submission_signatures(submissions, workers=workers)
+            exact_edges = self._exact_copy_edges(submissions, signatures)
+            exact_copies = self._copy_groups(exact_edges)
+            paraphrases = self.detect_paraphrases(submissions, workers=workers)
+            
+            # Merge all edges into stable collusion clusters
+            paraphrase_edges = [
+                (case['submission_ids'][0], case['submission_ids'][1], case['similarity_score'])
+                for case in paraphrases
+            ]
+            clusters = build_clusters(exact_edges + paraphrase_edges)
             
             # Collect all suspicious submissions
             suspicious_ids = set()
-            for case in exact_copies + paraphrases:
-                suspicious_ids.update(case['submission_ids'])
+            for cluster in clusters:
+                suspicious_ids.update(cluster['submission_ids'])
             
             # Calculate statistics
             stats = {
@@ -200,14 +294,16 @@ class CheatingDetector:
                 'suspicious_submissions': len(suspicious_ids),
                 'exact_copy_cases': len(exact_copies),
                 'paraphrase_cases': len(paraphrases),
+                'collusion_clusters': len(clusters),
                 'suspicious_percentage': round(len(suspicious_ids) * 100 / len(submissions), 2)
             }
             
             return {
                 'exact_copies': exact_copies,
                 'paraphrases': paraphrases,
+                'clusters': clusters,
                 'statistics': stats,
-                'suspicious_ids': list(suspicious_ids)
+                'suspicious_ids': sorted(suspicious_ids)
             }
             
         except Exception as e:
@@ -216,21 +312,42 @@ class CheatingDetector:
                 'error': str(e),
                 'exact_copies': [],
                 'paraphrases': [],
+                'clusters': [],
                 'statistics': {},
                 'suspicious_ids': []
             }
 
-    def update_thresholds(self, exact: float = None, paraphrase: float = None):
+    def update_thresholds(self, exact: float = None, paraphrase: float = None) -> List[Dict]:
         """
         Update detection thresholds.
         
+        A new exact threshold only rebuilds the LSH bands from the signatures
+        kept from the last analysis; no text is tokenized or hashed again.
+        
         Args:
             exact (float): New threshold for exact copy detection
             paraphrase (float): New threshold for paraphrase detection
+            
+        Returns:
+            List[Dict]: Exact copy groups of the last analyzed submissions at the new threshold
         """
         if exact is not None:
             self.exact_threshold = max(0.0, min(1.0, exact))
-            self.lsh = MinHashLSH(threshold=self.exact_threshold, num_perm=self.num_perm)
             
         if paraphrase is not None:
-            self.paraphrase_threshold = max(0.0, min(1.0, paraphrase)) 
\ No newline at end of file
+            self.paraphrase_threshold = max(0.0, min(1.0, paraphrase))
+        
+        return self._copy_groups(self._banded_edges())
+
+
+# Detectors created lazily inside pool workers, one per signature length
+_worker_detectors = {}
+
+
+def _signature_chunk(job) -> np.ndarray:
+    """Worker: MinHash signatures for one chunk of submissions."""
+    num_perm, submissions = job
+    detector = _worker_detectors.get(num_perm)
+    if detector is None:
+        detector = _worker_detectors[num_perm] = CheatingDetector(num_perm=num_perm)
+    return detector.submission_signatures(submissions)
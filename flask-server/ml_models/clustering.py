@@ -0,0 +1,80 @@
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+class UnionFind:
+    """Disjoint-set forest with union by size and path halving."""
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.size: Dict[Hashable, int] = {}
+
+    def add(self, item: Hashable):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+
+    def find(self, item: Hashable) -> Hashable:
+        self.add(item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+
+
+def build_clusters(edges: Iterable[Tuple[Hashable, Hashable, float]]) -> List[Dict]:
+    """
+    Group similarity edges into connected components (collusion clusters).
+
+    Every submission reachable through a chain of edges ends up in the same
+    cluster, so transitive rings (A~B, B~C) form one group regardless of the
+    order in which submissions or edges arrive.
+
+    Args:
+        edges (Iterable[Tuple]): (submission_a, submission_b, similarity) edges
+
+    Returns:
+        List[Dict]: Clusters with sorted 'submission_ids', 'size', 'edge_count',
+        'max_similarity' and 'avg_similarity', ordered by max similarity and
+        then by first submission ID
+    """
+    forest = UnionFind()
+    edge_list = []
+    for a, b, score in edges:
+        if a == b:
+            continue
+        forest.union(a, b)
+        edge_list.append((a, b, float(score)))
+
+    members: Dict[Hashable, List[Hashable]] = {}
+    for item in forest.parent:
+        members.setdefault(forest.find(item), []).append(item)
+
+    scores: Dict[Hashable, List[float]] = {}
+    for a, _, score in edge_list:
+        scores.setdefault(forest.find(a), []).append(score)
+
+    clusters = []
+    for root, ids in members.items():
+        root_scores = sorted(scores[root])
+        clusters.append({
+            'submission_ids': sorted(ids, key=str),
+            'size': len(ids),
+            'edge_count': len(root_scores),
+            'max_similarity': max(root_scores),
+            'avg_similarity': sum(root_scores) / len(root_scores)
+        })
+
+    clusters.sort(key=lambda c: (-c['max_similarity'], str(c['submission_ids'][0])))
+    for cluster_id, cluster in enumerate(clusters):
+        cluster['cluster_id'] = cluster_id
+    return clusters
@@ -0,0 +1,136 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+# Answers with fewer characters are not graded ("Insufficient Content")
+MIN_ANSWER_LENGTH = 50
+
+# Share of the correctness score kept for plagiarized answers (a 60% penalty)
+PLAGIARISM_FACTOR = 0.4
+
+TECHNICAL_KEYWORDS = [
+    'software', 'engineering', 'development', 'system', 'design',
+    'architecture', 'database', 'algorithm', 'programming', 'testing',
+    'methodology', 'principles', 'framework', 'implementation', 'analysis'
+]
+
+# Score cut-offs of the labels, highest first
+MODEL_LABELS = [(85, "Excellent"), (70, "Good"), (55, "Satisfactory"), (40, "Needs Improvement")]
+MODEL_FALLBACK_LABEL = "Poor"
+PLAGIARIZED_LABELS = [
+    (80, "Plagiarized (High Similarity to Model: {:.1f}%)"),
+    (60, "Plagiarized (Good Similarity to Model: {:.1f}%)"),
+    (40, "Plagiarized (Fair Similarity to Model: {:.1f}%)")
+]
+PLAGIARIZED_FALLBACK_LABEL = "Plagiarized (Poor Answer: {:.1f}%)"
+CONTENT_LABELS = [
+    (90, "Good Content (No Model Answer Available)"),
+    (80, "Fair Content (No Model Answer Available)"),
+    (70, "Basic Content (No Model Answer Available)")
+]
+CONTENT_FALLBACK_LABEL = "Poor Content (No Model Answer Available)"
+
+
+def content_quality(text: Optional[str]) -> Optional[float]:
+    """
+    Content quality (0-100) of an answer, used to grade it when the assignment
+    has no model answer: length, structure and technical vocabulary.
+
+    Args:
+        text (str): Extracted answer text
+
+    Returns:
+        Optional[float]: Quality score, or None for answers too short to grade
+    """
+    if not text or len(text.strip()) < MIN_ANSWER_LENGTH:
+        return None
+    word_count = len(text.split())
+
+    # Basic content quality scoring: 60% for having content, plus word count
+    base_score = 60
+    if word_count >= 200:
+        word_score = min(25, (word_count / 400) * 25)
+    else:
+        word_score = (word_count / 200) * 15
+
+    # Structure scoring
+    structure_score = 0
+    text_lower = text.lower()
+    if 'assignment' in text_lower or 'name:' in text_lower:
+        structure_score += 3
+    if 'student id' in text_lower or 'id:' in text_lower:
+        structure_score += 2
+    if any(word in text_lower for word in ['introduction', 'fundamentals', 'principles']):
+        structure_score += 3
+    if any(word in text_lower for word in ['conclusion', 'summary']):
+        structure_score += 2
+
+    # Technical content scoring
+    technical_score = min(10, sum(1 for keyword in TECHNICAL_KEYWORDS if keyword in text_lower))
+
+    return min(100, round(base_score + word_score + structure_score + technical_score, 1))
+
+
+def _labels(scores: np.ndarray, cut_offs) -> np.ndarray:
+    """Index of each score's label in ``cut_offs`` (``len(cut_offs)`` below the lowest cut-off)."""
+    return np.select([scores >= cut_off for cut_off, _ in cut_offs], np.arange(len(cut_offs)), len(cut_offs))
+
+
+def grade_batch(answer_similarity: np.ndarray, content_quality: np.ndarray, word_count: np.ndarray,
+                plagiarized: np.ndarray, severity_penalty: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Grade a batch of answers from their stored raw scores, without any model inference.
+
+    Answers with a similarity to the model answer are scored from it (with a
+    completeness bonus or a short-answer penalty), the others from their content
+    quality; plagiarized answers keep PLAGIARISM_FACTOR of that score, and the
+    final score also takes off the professor's severity penalty.
+
+    Args:
+        answer_similarity (np.ndarray): Similarity to the model answer, NaN when there is none
+        content_quality (np.ndarray): Content quality, NaN for answers too short to grade
+        word_count (np.ndarray): Words per answer
+        plagiarized (np.ndarray): Whether each answer is plagiarized (bool)
+        severity_penalty (np.ndarray): Share of the score taken off plagiarized answers
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, List[str]]: Correctness scores, final scores and labels
+    """
+    similarity = np.asarray(answer_similarity, dtype=np.float64)
+    quality = np.asarray(content_quality, dtype=np.float64)
+    words = np.nan_to_num(np.asarray(word_count, dtype=np.float64))
+    plagiarized = np.asarray(plagiarized, dtype=bool)
+    gradable = ~np.isnan(quality)
+    by_model = gradable & ~np.isnan(similarity)
+
+    # Model answer comparison: similarity as a percentage, up to 5 points for long answers,
+    # scaled down for answers under 100 words, capped at 100
+    model_score = np.round(np.nan_to_num(similarity) * 100, 1)
+    model_score = np.where(words >= 300, model_score + np.minimum(5, (words - 300) / 100), model_score)
+    model_score = np.where(words < 100, model_score * (words / 100), model_score)
+    model_score = np.minimum(100, model_score)
+
+    base = np.where(by_model, model_score, np.nan_to_num(quality))
+    correctness = np.where(plagiarized, np.round(base * PLAGIARISM_FACTOR, 1), np.round(base, 1))
+    correctness = np.where(gradable, correctness, 0.0)
+    final = np.where(plagiarized, np.round(correctness * (1 - np.asarray(severity_penalty)), 1), correctness)
+
+    model_labels = _labels(model_score, MODEL_LABELS)
+    plagiarized_labels = _labels(model_score, PLAGIARIZED_LABELS)
+    content_labels = _labels(base, CONTENT_LABELS)
+    labels = []
+    for i in range(len(base)):
+        if not gradable[i]:
+            labels.append("Insufficient Content")
+        elif by_model[i] and plagiarized[i]:
+            template = (PLAGIARIZED_LABELS[plagiarized_labels[i]][1]
+                        if plagiarized_labels[i] < len(PLAGIARIZED_LABELS) else PLAGIARIZED_FALLBACK_LABEL)
+            labels.append(template.format(model_score[i]))
+        elif by_model[i]:
+            name = MODEL_LABELS[model_labels[i]][1] if model_labels[i] < len(MODEL_LABELS) else MODEL_FALLBACK_LABEL
+            labels.append(f"{name} (Similarity: {similarity[i]:.3f})")
+        elif plagiarized[i]:
+            labels.append(f"Plagiarized (Content Quality: {base[i]:.1f}%)")
+        else:
+            labels.append(CONTENT_LABELS[content_labels[i]][1]
+                          if content_labels[i] < len(CONTENT_LABELS) else CONTENT_FALLBACK_LABEL)
+    return correctness, final, labels
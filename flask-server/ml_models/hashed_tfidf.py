@@ -0,0 +1,128 @@
+import numpy as np
+from functools import partial
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from typing import Dict, List, Tuple
+
+from ml_models.text_features import word_ngrams
+
+# Bumped whenever hashing or term weighting changes, so stored term counts
+# and document frequencies are recomputed instead of mixed
+TFIDF_VERSION = 1
+
+# Hash buckets per assignment; a class vocabulary of tens of thousands of
+# terms rarely collides, and a dense DF array stays at 2 MB
+N_FEATURES = 2 ** 18
+
+# (bucket indices, term counts) of one document, indices sorted
+TermCounts = Tuple[np.ndarray, np.ndarray]
+
+
+def term_counts_to_bytes(term_counts: TermCounts) -> bytes:
+    """Serialize term counts as little-endian uint32 (bucket, count) pairs."""
+    indices, counts = term_counts
+    return np.column_stack((indices, counts)).astype('<u4').tobytes()
+
+
+def term_counts_from_bytes(data: bytes) -> TermCounts:
+    """Deserialize term counts written by :func:`term_counts_to_bytes`."""
+    pairs = np.frombuffer(data or b'', dtype='<u4').reshape(-1, 2)
+    return pairs[:, 0].astype(np.int64), pairs[:, 1].astype(np.float64)
+
+
+def frequencies_to_dict(indices: np.ndarray, delta: int = 1) -> Dict[str, int]:
+    """Per-bucket document frequency changes, keyed the way they are stored in MongoDB."""
+    return {str(bucket): delta for bucket in indices.tolist()}
+
+
+class HashedTfidf:
+    def __init__(self, n_features: int = N_FEATURES, ngram_range=(1, 1)):
+        """
+        Incremental TF-IDF over hashed terms.
+
+        Terms are hashed into a fixed number of buckets, so there is no
+        vocabulary to refit: a document is transformed once into sparse term
+        counts, and the IDF weights come from document frequencies that are
+        updated as documents are added or removed.
+
+        Args:
+            n_features (int): Number of hash buckets
+            ngram_range (tuple): Word n-gram range applied to token streams
+        """
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(
+            analyzer=partial(word_ngrams, ngram_range=ngram_range),
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None
+        )
+
+    def term_counts(self, tokens: List[str]) -> TermCounts:
+        """
+        Transform one token stream into hashed term counts.
+
+        Args:
+            tokens (List[str]): Normalized tokens
+
+        Returns:
+            TermCounts: Sorted bucket indices and their counts
+        """
+        row = self.vectorizer.transform([tokens]).tocsr()
+        row.sort_indices()
+        return row.indices.astype(np.int64), row.data.astype(np.float64)
+
+    def matrix(self, rows: List[TermCounts]) -> sparse.csr_matrix:
+        """Stack stored term counts into a (documents x buckets) CSR matrix."""
+        if not rows:
+            return sparse.csr_matrix((0, self.n_features), dtype=np.float64)
+        lengths = [len(indices) for indices, _ in rows]
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        return sparse.csr_matrix(
+            (np.concatenate([counts for _, counts in rows]),
+             np.concatenate([indices for indices, _ in rows]),
+             indptr),
+            shape=(len(rows), self.n_features)
+        )
+
+    @staticmethod
+    def idf(document_frequencies: np.ndarray, document_count: int) -> np.ndarray:
+        """Smoothed IDF weights, the same formula TfidfVectorizer uses by default."""
+        return np.log((1 + document_count) / (1 + document_frequencies)) + 1
+
+    def similarities(self, query: TermCounts, matrix: sparse.csr_matrix, idf: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarities between one document and every stored row.
+
+        Stored rows keep raw counts, so changing IDF weights never rewrites
+        them; the weighting is applied here with one sparse mat-vec product
+        and one pass over the stored non-zeros for the row norms.
+
+        Args:
+            query (TermCounts): Term counts of the document being checked
+            matrix (sparse.csr_matrix): Stored term counts, one row per document
+            idf (np.ndarray): IDF weight of every bucket
+
+        Returns:
+            np.ndarray: One cosine similarity per row of ``matrix``
+        """
+        if matrix.shape[0] == 0:
+            return np.zeros(0)
+        indices, counts = query
+        weights = counts * idf[indices]
+        query_norm = np.linalg.norm(weights)
+        if query_norm == 0:
+            return np.zeros(matrix.shape[0])
+
+        # Dot products with the query weighted twice (once per side)
+        vector = sparse.csr_matrix((weights * idf[indices], indices, [0, len(indices)]),
+                                   shape=(1, self.n_features))
+        dots = np.asarray((matrix @ vector.T).todense()).ravel()
+
+        rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        weighted = matrix.data * idf[matrix.indices]
+        row_norms = np.sqrt(np.bincount(rows, weights=weighted ** 2, minlength=matrix.shape[0]))
+
+        scores = np.zeros(matrix.shape[0])
+        nonzero = row_norms > 0
+        scores[nonzero] = dots[nonzero] / (row_norms[nonzero] * query_norm)
+        return np.minimum(scores, 1.0)
@@ -0,0 +1,212 @@
+import hashlib
+import numpy as np
+from functools import lru_cache
+from itertools import combinations
+from typing import Iterable, List, Sequence, Tuple
+from datasketch import MinHash, MinHashLSH
+
+# Same universal-hashing constants as datasketch's 'legacy' MinHash scheme (the only
+# one before datasketch 2.0), so the signatures produced here are interchangeable with
+# MinHash(scheme='legacy').update() output; the default 'affine32' scheme differs.
+# The datasketch version is pinned in requirements.txt.
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Bumped whenever the way signatures are computed changes, so stored
+# signatures from an older engine are recomputed instead of compared.
+SIGNATURE_VERSION = 1
+
+# Odd 64-bit multipliers used to fold the rows of a band into one key
+_BAND_MIX = np.random.RandomState(7).randint(1, 1 << 62, size=512, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def hash_shingle(shingle: bytes) -> int:
+    """
+    64-bit SHA1 hash of a shingle.
+
+    The low 32 bits equal datasketch's ``sha1_hash32``, which is what the
+    permutations consume, so signatures match legacy ``MinHash.update`` output.
+    """
+    return int.from_bytes(hashlib.sha1(shingle).digest()[:8], 'little')
+
+
+def signature_to_bytes(hashvalues) -> bytes:
+    """Serialize MinHash hash values as little-endian uint64 bytes."""
+    return np.asarray(hashvalues, dtype='<u8').tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    """Deserialize hash values written by :func:`signature_to_bytes`."""
+    return np.frombuffer(data, dtype='<u8').astype(np.uint64)
+
+
+def signature_to_minhash(hashvalues, num_perm: int) -> MinHash:
+    """Wrap a signature array in a legacy-scheme MinHash object that MinHashLSH accepts."""
+    return MinHash(num_perm=num_perm, hashvalues=np.asarray(hashvalues, dtype=np.uint64), scheme='legacy')
+
+
+def band_keys(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """Fold every band of every signature into a uint64 key, shape (bands, n)."""
+    signatures = np.atleast_2d(signatures)
+    keys = np.empty((bands, signatures.shape[0]), dtype=np.uint64)
+    for band in range(bands):
+        block = signatures[:, band * rows:(band + 1) * rows]
+        keys[band] = np.bitwise_xor.reduce(block * _BAND_MIX[:rows], axis=1)
+    return keys
+
+
+@lru_cache(maxsize=64)
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows) that MinHashLSH picks for a threshold, cached per threshold."""
+    lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+    return lsh.b, lsh.r
+
+
+def banded_pairs(signatures: np.ndarray, threshold: float,
+                 chunk_size: int = 65536) -> List[Tuple[int, int, float]]:
+    """
+    Find all signature pairs that share an LSH bucket and whose estimated
+    Jaccard similarity reaches ``threshold``.
+
+    The bands are rebuilt from the signature matrix with a sort per band,
+    so changing the threshold is pure in-memory work and never rehashes text.
+
+    Args:
+        signatures (np.ndarray): uint64 signatures, shape (n, num_perm)
+        threshold (float): Jaccard threshold that sets the banding and the score cut-off
+        chunk_size (int): Candidate pairs scored per vectorized step
+
+    Returns:
+        List[Tuple[int, int, float]]: (i, j, estimated_jaccard) row pairs with i < j, sorted by (i, j)
+    """
+    signatures = np.atleast_2d(signatures)
+    if signatures.shape[0] < 2:
+        return []
+    bands, rows = lsh_params(threshold, signatures.shape[1])
+
+    candidates = set()
+    for keys in band_keys(signatures, bands, rows):
+        order = np.argsort(keys, kind='stable')
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        for bucket in np.split(order, bounds):
+            if len(bucket) > 1:
+                candidates.update(combinations(np.sort(bucket).tolist(), 2))
+    if not candidates:
+        return []
+
+    pairs = np.array(sorted(candidates), dtype=np.int64)
+    result = []
+    for start in range(0, len(pairs), chunk_size):
+        left, right = pairs[start:start + chunk_size].T
+        scores = np.mean(signatures[left] == signatures[right], axis=1)
+        keep = scores >= threshold
+        result.extend(zip(left[keep].tolist(), right[keep].tolist(), scores[keep].tolist()))
+    return result
+
+
+class BatchMinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 1, block_size: int = 8192):
+        """
+        Vectorized MinHash signature engine.
+
+        Args:
+            num_perm (int): Number of permutations per signature
+            seed (int): Seed for the permutation parameters
+            block_size (int): Maximum shingles permuted at once, bounds memory
+                to roughly ``num_perm * block_size * 8`` bytes
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        self.block_size = block_size
+
+        gen = np.random.RandomState(seed)
+        permutations = np.array([
+            (gen.randint(1, MERSENNE_PRIME, dtype=np.uint64),
+             gen.randint(0, MERSENNE_PRIME, dtype=np.uint64))
+            for _ in range(num_perm)
+        ], dtype=np.uint64).T
+        self.a = permutations[0][:, np.newaxis]
+        self.b = permutations[1][:, np.newaxis]
+
+    def hash_shingles(self, shingles: Iterable) -> np.ndarray:
+        """
+        Hash shingles into one deduplicated uint64 array.
+
+        Args:
+            shingles (Iterable): Shingles as ``str`` or ``bytes``
+
+        Returns:
+            np.ndarray: Unique 64-bit shingle hashes
+        """
+        hashes = np.fromiter(
+            (hash_shingle(s.encode('utf-8') if isinstance(s, str) else s) for s in shingles),
+            dtype=np.uint64
+        )
+        return np.unique(hashes)
+
+    def _permute(self, hashes: np.ndarray) -> np.ndarray:
+        """Apply every permutation to a block of hashes, shape (num_perm, len(hashes))."""
+        hashes = np.bitwise_and(hashes, MAX_HASH)
+        return np.bitwise_and((self.a * hashes[np.newaxis, :] + self.b) % MERSENNE_PRIME, MAX_HASH)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Compute the MinHash signature of one document.
+
+        Args:
+            hashes (np.ndarray): Shingle hashes of the document (only the low 32 bits are used)
+
+        Returns:
+            np.ndarray: uint64 array of length ``num_perm``
+        """
+        return self.signatures([hashes])[0]
+
+    def signatures(self, hash_arrays: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        Compute MinHash signatures for many documents at once.
+
+        Documents are packed into blocks of up to ``block_size`` shingles; each
+        block is permuted in a single NumPy expression and reduced per document
+        with ``np.minimum.reduceat``.
+
+        Args:
+            hash_arrays (Sequence[np.ndarray]): Shingle hashes for each document
+
+        Returns:
+            np.ndarray: uint64 array of shape (len(hash_arrays), num_perm)
+        """
+        result = np.full((len(hash_arrays), self.num_perm), MAX_HASH, dtype=np.uint64)
+
+        batch_docs: List[int] = []
+        batch_hashes: List[np.ndarray] = []
+        batch_size = 0
+
+        def flush():
+            if not batch_docs:
+                return
+            lengths = np.array([len(h) for h in batch_hashes])
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            permuted = self._permute(np.concatenate(batch_hashes))
+            result[batch_docs] = np.minimum.reduceat(permuted, starts, axis=1).T
+            batch_docs.clear()
+            batch_hashes.clear()
+
+        for doc, hashes in enumerate(hash_arrays):
+            hashes = np.asarray(hashes, dtype=np.uint64)
+            if len(hashes) == 0:
+                continue
+            if len(hashes) > self.block_size:
+                # Large document: reduce it on its own, block by block
+                for start in range(0, len(hashes), self.block_size):
+                    block = self._permute(hashes[start:start + self.block_size])
+                    np.minimum(result[doc], block.min(axis=1), out=result[doc])
+                continue
+            if batch_size + len(hashes) > self.block_size:
+                flush()
+                batch_size = 0
+            batch_docs.append(doc)
+            batch_hashes.append(hashes)
+            batch_size += len(hashes)
+        flush()
+
+        return result
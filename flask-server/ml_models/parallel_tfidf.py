@@ -0,0 +1,101 @@
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from numbers import Integral
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+from typing import Callable, List, Optional, Tuple
+
+
+def _count_chunk(job) -> Tuple[List[str], sparse.csr_matrix]:
+    """
+    Worker: count the analyzer's terms for a chunk of documents.
+
+    Returns the chunk's sorted term list and a count matrix whose columns
+    follow that order, with sorted column indices in every row.
+    """
+    analyzer, documents = job
+    counters = [Counter(analyzer(document)) for document in documents]
+    terms = sorted(set().union(*counters))
+    column = {term: i for i, term in enumerate(terms)}
+
+    indptr = [0]
+    indices = []
+    data = []
+    for counts in counters:
+        row = sorted((column[term], count) for term, count in counts.items())
+        indices.extend(i for i, _ in row)
+        data.extend(count for _, count in row)
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.asarray(data, dtype=np.float64), indices, indptr),
+                               shape=(len(documents), len(terms)))
+    return terms, matrix
+
+
+def _document_limits(vectorizer: TfidfVectorizer, n_docs: int) -> Tuple[float, float]:
+    """Translate min_df/max_df into document counts, as scikit-learn does."""
+    max_df, min_df = vectorizer.max_df, vectorizer.min_df
+    high = max_df if isinstance(max_df, Integral) else max_df * n_docs
+    low = min_df if isinstance(min_df, Integral) else min_df * n_docs
+    return high, low
+
+
+def build_tfidf_matrix(documents: List, vectorizer: TfidfVectorizer,
+                       workers: Optional[int] = None) -> sparse.csr_matrix:
+    """
+    Build the TF-IDF matrix of a corpus, optionally counting terms in a process pool.
+
+    The vectorizer only supplies configuration (a callable ``analyzer``,
+    ``max_features``, ``min_df``/``max_df`` and the IDF options); it is not
+    fitted. Chunks are counted independently, merged into one alphabetically
+    ordered vocabulary and pruned like ``TfidfVectorizer.fit_transform``, so
+    the matrix is identical for any number of workers.
+
+    Args:
+        documents (List): Inputs accepted by the vectorizer's analyzer (e.g. token streams)
+        vectorizer (TfidfVectorizer): Vectorizer whose settings are applied
+        workers (int): Worker processes for term counting; None or 1 counts in this process
+
+    Returns:
+        sparse.csr_matrix: L2-normalized (by default) TF-IDF matrix, one row per document
+    """
+    analyzer: Callable = vectorizer.analyzer
+    if not callable(analyzer):
+        raise ValueError("build_tfidf_matrix needs a vectorizer with a callable analyzer")
+
+    if workers is not None and workers > 1 and len(documents) > 1:
+        chunk_size = -(-len(documents) // (workers * 4))
+        jobs = [(analyzer, documents[start:start + chunk_size])
+                for start in range(0, len(documents), chunk_size)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            chunks = list(executor.map(_count_chunk, jobs))
+    else:
+        chunks = [_count_chunk((analyzer, documents))]
+
+    # Chunk vocabularies are sorted, so remapping onto the sorted union keeps rows sorted
+    vocabulary = sorted(set().union(*(terms for terms, _ in chunks)))
+    position = {term: i for i, term in enumerate(vocabulary)}
+    blocks = []
+    for terms, matrix in chunks:
+        lookup = np.fromiter((position[term] for term in terms), dtype=np.int64, count=len(terms))
+        blocks.append(sparse.csr_matrix((matrix.data, lookup[matrix.indices], matrix.indptr),
+                                        shape=(matrix.shape[0], len(vocabulary))))
+    counts = sparse.vstack(blocks, format='csr')
+
+    # Same pruning rules as CountVectorizer._limit_features
+    high, low = _document_limits(vectorizer, counts.shape[0])
+    dfs = np.bincount(counts.indices, minlength=counts.shape[1])
+    mask = (dfs <= high) & (dfs >= low)
+    limit = vectorizer.max_features
+    if limit is not None and mask.sum() > limit:
+        tfs = np.asarray(counts.sum(axis=0)).ravel()
+        best = (-tfs[mask]).argsort()[:limit]
+        limited = np.zeros(len(dfs), dtype=bool)
+        limited[np.where(mask)[0][best]] = True
+        mask = limited
+    counts = counts[:, np.where(mask)[0]]
+    counts.sort_indices()
+
+    transformer = TfidfTransformer(norm=vectorizer.norm, use_idf=vectorizer.use_idf,
+                                   smooth_idf=vectorizer.smooth_idf, sublinear_tf=vectorizer.sublinear_tf)
+    return transformer.fit_transform(counts).tocsr()
@@ -0,0 +1,188 @@
+import json
+import os
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from ml_models.minhash_engine import SIGNATURE_VERSION, band_keys, lsh_params
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class _Segment:
+    """One immutable, memory-mapped shard of the reference index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.signatures = np.load(os.path.join(path, 'signatures.npy'), mmap_mode='r')
+        self.band_keys = np.load(os.path.join(path, 'band_keys.npy'), mmap_mode='r')
+        self.band_docs = np.load(os.path.join(path, 'band_docs.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'documents.json'), 'r') as f:
+            self.documents = json.load(f)
+
+    def candidates(self, keys: np.ndarray) -> np.ndarray:
+        """Positions of documents sharing at least one band key with the query."""
+        hits = []
+        for band, key in enumerate(keys):
+            sorted_keys = self.band_keys[band]
+            left = np.searchsorted(sorted_keys, key, side='left')
+            right = np.searchsorted(sorted_keys, key, side='right')
+            if right > left:
+                hits.append(np.asarray(self.band_docs[band, left:right]))
+        if not hits:
+            return np.empty(0, dtype=np.uint32)
+        return np.unique(np.concatenate(hits))
+
+
+class ReferenceIndex:
+    """
+    Read side of the on-disk reference corpus index (prior semesters, textbooks).
+
+    The index is a directory of immutable segments. Each segment stores the
+    MinHash signatures of its documents plus, per LSH band, a sorted array of
+    band keys, so a lookup is one binary search per band and segment and never
+    loads the corpus into memory.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.logger = logging.getLogger(__name__)
+        self.segments: List[_Segment] = []
+        self.manifest: Dict = {}
+        self._manifest_mtime: Optional[float] = None
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def refresh(self) -> bool:
+        """(Re)load the manifest if it changed on disk. Returns True when usable."""
+        try:
+            mtime = os.stat(self._manifest_path()).st_mtime
+        except OSError:
+            self.segments = []
+            return False
+        if mtime != self._manifest_mtime:
+            with open(self._manifest_path(), 'r') as f:
+                self.manifest = json.load(f)
+            if self.manifest.get('signature_version') != SIGNATURE_VERSION:
+                self.logger.warning(f"Reference index at {self.root} was built with an older signature engine; re-ingest it")
+                self.segments = []
+            else:
+                self.segments = [_Segment(os.path.join(self.root, name)) for name in self.manifest['segments']]
+                self.logger.info(f"Loaded reference index with {self.manifest.get('documents', 0)} documents in {len(self.segments)} segments")
+            self._manifest_mtime = mtime
+        return bool(self.segments)
+
+    def query(self, signature: np.ndarray, threshold: Optional[float] = None, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Find reference documents similar to a MinHash signature.
+
+        Args:
+            signature (np.ndarray): MinHash hash values of the query document
+            threshold (float): Minimum estimated Jaccard similarity (defaults to the index threshold)
+            limit (int): Maximum number of matches returned
+
+        Returns:
+            List[Tuple[str, float]]: (document, estimated_jaccard) pairs, best first
+        """
+        if not self.refresh():
+            return []
+        if len(signature) != self.manifest['num_perm']:
+            raise ValueError(f"Expected a signature of length {self.manifest['num_perm']}, got {len(signature)}")
+
+        threshold = self.manifest['threshold'] if threshold is None else threshold
+        keys = band_keys(signature, self.manifest['bands'], self.manifest['rows'])[:, 0]
+
+        matches = []
+        for segment in self.segments:
+            positions = segment.candidates(keys)
+            if len(positions) == 0:
+                continue
+            scores = np.mean(segment.signatures[positions] == signature, axis=1)
+            for position, score in zip(positions.tolist(), scores.tolist()):
+                if score >= threshold:
+                    matches.append((segment.documents[position], float(score)))
+
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit]
+
+
+class ReferenceIndexWriter:
+    def __init__(self, root: str, num_perm: int = 128, threshold: float = 0.4, segment_size: int = 10000):
+        """
+        Append documents to an on-disk reference index in fixed-size segments.
+
+        Args:
+            root (str): Index directory (created if missing, appended to if present)
+            num_perm (int): Signature length, must match the existing index
+            threshold (float): Jaccard threshold used to choose the LSH banding
+            segment_size (int): Documents buffered in memory before a segment is written
+        """
+        self.root = root
+        self.segment_size = segment_size
+        os.makedirs(root, exist_ok=True)
+
+        manifest_path = os.path.join(root, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+            if self.manifest['num_perm'] != num_perm or self.manifest.get('signature_version') != SIGNATURE_VERSION:
+                raise ValueError("Existing reference index uses different signature parameters; use a new directory")
+        else:
+            bands, rows = lsh_params(threshold, num_perm)
+            self.manifest = {
+                'num_perm': num_perm,
+                'threshold': threshold,
+                'bands': bands,
+                'rows': rows,
+                'signature_version': SIGNATURE_VERSION,
+                'documents': 0,
+                'segments': []
+            }
+
+        self._names: List[str] = []
+        self._signatures: List[np.ndarray] = []
+
+    def add(self, name: str, signature: np.ndarray):
+        """Buffer one document, writing a segment once the buffer is full."""
+        self._names.append(name)
+        self._signatures.append(np.asarray(signature, dtype=np.uint64))
+        if len(self._names) >= self.segment_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered documents as a new segment and publish it in the manifest."""
+        if not self._names:
+            return
+        signatures = np.vstack(self._signatures)
+        keys = band_keys(signatures, self.manifest['bands'], self.manifest['rows'])
+        order = np.argsort(keys, axis=1, kind='stable')
+
+        name = f"segment-{len(self.manifest['segments']):05d}"
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'signatures.npy'), signatures)
+        np.save(os.path.join(path, 'band_keys.npy'), np.take_along_axis(keys, order, axis=1))
+        np.save(os.path.join(path, 'band_docs.npy'), order.astype(np.uint32))
+        with open(os.path.join(path, 'documents.json'), 'w') as f:
+            json.dump(self._names, f)
+
+        self.manifest['segments'].append(name)
+        self.manifest['documents'] += len(self._names)
+        self._write_manifest()
+        self._names, self._signatures = [], []
+
+    def _write_manifest(self):
+        tmp_path = os.path.join(self.root, MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST_NAME))
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
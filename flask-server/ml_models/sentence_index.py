@@ -0,0 +1,154 @@
+import re
+import numpy as np
+from typing import Dict, Hashable, List, Tuple
+
+# Bumped whenever sentence splitting or embedding storage changes, so stored
+# sentence embeddings are recomputed
+SEMANTIC_VERSION = 1
+
+# A sentence ends at ., ! or ? followed by whitespace, or at a blank line
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+_WORD_RE = re.compile(r'\w+')
+
+# (start, end) character offsets of a sentence in the submission text
+Span = Tuple[int, int]
+
+
+def split_sentences(text: str, min_words: int = 6) -> List[Span]:
+    """
+    Split text into sentences worth comparing.
+
+    Args:
+        text (str): Raw text
+        min_words (int): Sentences with fewer words (headings, "Answer:", ...) are skipped
+
+    Returns:
+        List[Span]: (start, end) character offsets of every kept sentence
+    """
+    spans = []
+    start = 0
+    text = text or ""
+    for boundary in _SENTENCE_END_RE.finditer(text):
+        spans.append((start, boundary.start()))
+        start = boundary.end()
+    spans.append((start, len(text)))
+    return [
+        (start, end) for start, end in spans
+        if len(_WORD_RE.findall(text[start:end])) >= min_words
+    ]
+
+
+def embeddings_to_bytes(embeddings: np.ndarray) -> bytes:
+    """Serialize sentence embeddings as little-endian float16 rows."""
+    return np.asarray(embeddings, dtype='<f2').tobytes()
+
+
+def embeddings_from_bytes(data: bytes, dim: int) -> np.ndarray:
+    """Deserialize embeddings written by :func:`embeddings_to_bytes`."""
+    return np.frombuffer(data or b'', dtype='<f2').reshape(-1, dim)
+
+
+def spans_to_bytes(spans: List[Span]) -> bytes:
+    """Serialize sentence spans as little-endian uint32 (start, end) pairs."""
+    return np.asarray(spans, dtype='<u4').reshape(-1, 2).tobytes()
+
+
+def spans_from_bytes(data: bytes) -> List[Span]:
+    """Deserialize spans written by :func:`spans_to_bytes`."""
+    return [tuple(row) for row in np.frombuffer(data or b'', dtype='<u4').reshape(-1, 2).tolist()]
+
+
+class SentenceIndex:
+    def __init__(self, dim: int, bits: int = 10, tables: int = 20, seed: int = 13):
+        """
+        Approximate nearest-neighbour index over sentence embeddings using
+        random-projection (SimHash) LSH.
+
+        Each table hashes a sentence to the sign pattern of ``bits`` random
+        hyperplanes; sentences at a small angle share a bucket in at least
+        one table with high probability. With the defaults, a pair at cosine
+        0.85 shares a bucket with probability of about 0.95, while each
+        table only holds about 1/1024 of the sentences per bucket.
+
+        Args:
+            dim (int): Embedding dimension
+            bits (int): Hyperplanes (code bits) per table
+            tables (int): Number of hash tables
+            seed (int): Seed for the hyperplanes
+        """
+        self.dim = dim
+        self.bits = bits
+        self.planes = np.random.RandomState(seed).standard_normal((tables, dim, bits)).astype(np.float32)
+        self._weights = (1 << np.arange(bits)).astype(np.int64)
+        self.buckets: List[Dict[int, List[Tuple[Hashable, int]]]] = [{} for _ in range(tables)]
+        self.vectors: Dict[Hashable, np.ndarray] = {}
+        self._codes: Dict[Hashable, np.ndarray] = {}
+
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """Bucket codes of every vector in every table, shape (tables, n)."""
+        projections = np.einsum('nd,tdb->tnb', vectors.astype(np.float32), self.planes)
+        return (projections > 0).astype(np.int64) @ self._weights
+
+    def add(self, doc_id: Hashable, vectors: np.ndarray):
+        """Index a document's sentence embeddings (float16), replacing any previous version."""
+        self.remove(doc_id)
+        if len(vectors) == 0:
+            return
+        codes = self._hash(vectors)
+        self.vectors[doc_id] = vectors
+        self._codes[doc_id] = codes
+        for table, table_codes in zip(self.buckets, codes):
+            for row, code in enumerate(table_codes.tolist()):
+                table.setdefault(code, []).append((doc_id, row))
+
+    def remove(self, doc_id: Hashable):
+        """Remove a document from the index if present."""
+        codes = self._codes.pop(doc_id, None)
+        self.vectors.pop(doc_id, None)
+        if codes is None:
+            return
+        for table, table_codes in zip(self.buckets, codes):
+            for code in set(table_codes.tolist()):
+                entries = [entry for entry in table.get(code, []) if entry[0] != doc_id]
+                if entries:
+                    table[code] = entries
+                else:
+                    table.pop(code, None)
+
+    def query(self, vectors: np.ndarray, threshold: float = 0.85,
+              exclude: Hashable = None) -> List[Tuple[int, Hashable, int, float]]:
+        """
+        Find, for every query sentence, the most similar sentence of each other document.
+
+        Candidates come from the LSH buckets only, and each is verified with
+        one dot product, so the cost grows with the bucket sizes rather than
+        with the square of the number of sentences.
+
+        Args:
+            vectors (np.ndarray): L2-normalized embeddings of the query sentences
+            threshold (float): Minimum cosine similarity of a reported pair
+            exclude: Document ID to leave out (the query document itself)
+
+        Returns:
+            List[Tuple[int, Hashable, int, float]]: (query_sentence, doc_id,
+            doc_sentence, cosine) matches, best per query sentence and document
+        """
+        if len(vectors) == 0:
+            return []
+        queries = vectors.astype(np.float32)
+        codes = self._hash(queries)
+
+        matches = []
+        for position in range(len(queries)):
+            candidates: Dict[Hashable, set] = {}
+            for table, code in zip(self.buckets, codes[:, position].tolist()):
+                for doc_id, row in table.get(code, ()):
+                    if doc_id != exclude:
+                        candidates.setdefault(doc_id, set()).add(row)
+            for doc_id, rows in candidates.items():
+                rows = sorted(rows)
+                scores = self.vectors[doc_id][rows].astype(np.float32) @ queries[position]
+                best = int(np.argmax(scores))
+                if scores[best] >= threshold:
+                    matches.append((position, doc_id, rows[best], float(scores[best])))
+        return matches
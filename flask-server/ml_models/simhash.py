@@ -0,0 +1,119 @@
+import numpy as np
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+from ml_models.minhash_engine import hash_shingle
+
+# Bumped whenever SimHash fingerprinting changes, so stored fingerprints are recomputed
+SIMHASH_VERSION = 1
+
+_BITS = np.arange(64, dtype=np.uint64)
+
+
+def simhash(tokens: Iterable[str]) -> int:
+    """
+    64-bit SimHash of a document from its normalized tokens.
+
+    Every distinct token votes on each bit of its 64-bit hash, weighted by
+    how often it occurs; the fingerprint keeps the bits with a positive
+    total. Documents that share most of their words end up with fingerprints
+    that differ in only a few bits.
+
+    Args:
+        tokens (Iterable[str]): Normalized token stream
+
+    Returns:
+        int: Unsigned 64-bit fingerprint (0 for an empty document)
+    """
+    counts = Counter(tokens)
+    if not counts:
+        return 0
+    hashes = np.fromiter((hash_shingle(token.encode('utf-8')) for token in counts),
+                         dtype=np.uint64, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    ones = ((hashes[:, np.newaxis] >> _BITS) & np.uint64(1)).astype(np.int64)
+    votes = weights @ (2 * ones - 1)
+    return int(np.bitwise_or.reduce((votes > 0).astype(np.uint64) << _BITS))
+
+
+def simhash_to_bytes(value: int) -> bytes:
+    """Serialize a fingerprint as 8 little-endian bytes."""
+    return int(value).to_bytes(8, 'little')
+
+
+def simhash_from_bytes(data: bytes) -> int:
+    """Deserialize a fingerprint written by :func:`simhash_to_bytes`."""
+    return int.from_bytes(data, 'little')
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints."""
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex:
+    def __init__(self, max_distance: int = 10):
+        """
+        Multi-table Hamming-distance index over 64-bit SimHash fingerprints.
+
+        The 64 bits are split into ``max_distance + 1`` blocks with one hash
+        table per block. Two fingerprints within ``max_distance`` bits must
+        agree exactly on at least one block (pigeonhole), so a lookup is one
+        table probe per block followed by an XOR and popcount per candidate.
+
+        Args:
+            max_distance (int): Largest Hamming distance reported as a near duplicate
+        """
+        self.max_distance = max_distance
+        bounds = np.linspace(0, 64, max_distance + 2).astype(int)
+        self.blocks: List[Tuple[int, int]] = [
+            (int(start), (1 << int(end - start)) - 1) for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        self.tables: List[Dict[int, Set[Hashable]]] = [{} for _ in self.blocks]
+        self.fingerprints: Dict[Hashable, int] = {}
+
+    def _keys(self, value: int) -> List[int]:
+        return [(value >> shift) & mask for shift, mask in self.blocks]
+
+    def add(self, doc_id: Hashable, value: int):
+        """Index a document's fingerprint, replacing any previous one."""
+        self.remove(doc_id)
+        self.fingerprints[doc_id] = value
+        for table, key in zip(self.tables, self._keys(value)):
+            table.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: Hashable):
+        """Remove a document from the index if present."""
+        value = self.fingerprints.pop(doc_id, None)
+        if value is None:
+            return
+        for table, key in zip(self.tables, self._keys(value)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del table[key]
+
+    def query(self, value: int, exclude: Hashable = None) -> List[Tuple[Hashable, int]]:
+        """
+        Find indexed documents within ``max_distance`` bits of a fingerprint.
+
+        Args:
+            value (int): Fingerprint of the query document
+            exclude: Document ID to leave out of the results
+
+        Returns:
+            List[Tuple[Hashable, int]]: (doc_id, hamming_distance) pairs, closest first
+        """
+        candidates = set()
+        for table, key in zip(self.tables, self._keys(value)):
+            candidates.update(table.get(key, ()))
+        candidates.discard(exclude)
+
+        matches = []
+        for doc_id in candidates:
+            distance = hamming_distance(self.fingerprints[doc_id], value)
+            if distance <= self.max_distance:
+                matches.append((doc_id, distance))
+        matches.sort(key=lambda match: (match[1], str(match[0])))
+        return matches
@@ -12,6 +12,7 @@ class SimilarityChecker:
         Args:
             model_name (str): Name of the pre-trained model to use
         """
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.model.to(self.device)
@@ -50,6 +51,27 @@ class SimilarityChecker:
             self.logger.error(f"Error computing similarity: {str(e)}")
             raise
 
+    def encode_sentences(self, sentences: List[str], batch_size: int = 256) -> np.ndarray:
+        """
+        Encode many sentences in large batches for cross-submission comparison.
+        
+        Args:
+            sentences (List[str]): Sentences from one or more submissions
+            batch_size (int): Sentences encoded per forward pass
+            
+        Returns:
+            np.ndarray: L2-normalized float16 embeddings, one row per sentence
+        """
+        if not sentences:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float16)
+        embeddings = self.model.encode(
+            sentences,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        return embeddings.astype(np.float16)
+
     def check_answer_correctness(self, student_answer: str, correct_answer: str) -> Dict:
         """
         Check how correct a student's answer is compared to the professor's answer.
@@ -126,6 +148,54 @@ class SimilarityChecker:
             self.logger.error(f"Error in batch checking answers: {str(e)}")
             return [{'error': str(e)}] * len(student_answers)
 
+    def check_answers_against(self, student_answers: List[str], correct_answer: str,
+                              batch_size: int = 64) -> List[Dict]:
+        """
+        Check many answers against one model answer with a single encode batch.
+        
+        The model answer is encoded once instead of once per student answer.
+        
+        Args:
+            student_answers (List[str]): Student answers to the same question
+            correct_answer (str): Professor's correct answer
+            batch_size (int): Answers encoded per forward pass
+            
+        Returns:
+            List[Dict]: Assessment results in the format of check_answer_correctness
+        """
+        if not student_answers:
+            return []
+        try:
+            embeddings = self.model.encode(
+                [correct_answer] + list(student_answers),
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            scores = embeddings[1:] @ embeddings[0]
+            
+            results = []
+            for score in scores:
+                score = float(score)
+                if score >= self.thresholds['correct']:
+                    correctness = 'Correct'
+                elif score >= self.thresholds['partially_correct']:
+                    correctness = 'Partially Correct'
+                else:
+                    correctness = 'Incorrect'
+                
+                results.append({
+                    'similarity_score': score,
+                    'correctness': correctness,
+                    'confidence': self._calculate_confidence(score)
+                })
+            
+            return results
+        except Exception as e:
+            self.logger.error(f"Error in batch checking answers: {str(e)}")
+            return [{'error': str(e), 'similarity_score': 0.0, 'correctness': 'Error', 'confidence': 0.0}
+                    for _ in student_answers]
+
     def _calculate_confidence(self, similarity_score: float) -> float:
         """
         Calculate confidence level based on similarity score.
@@ -0,0 +1,90 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from typing import Iterator, List, Optional, Tuple
+
+# Matrices and limits shared with pool workers once, through the initializer
+_worker_state = {}
+
+
+def _block_pairs(block: sparse.csr_matrix, row_offset: int,
+                 threshold: Optional[float], top_k: Optional[int]) -> Iterator[Tuple[int, int, float]]:
+    """Extract (i, j, score) pairs from one block of the similarity matrix."""
+    for local_row in range(block.shape[0]):
+        i = row_offset + local_row
+        start, end = block.indptr[local_row], block.indptr[local_row + 1]
+        cols = block.indices[start:end]
+        scores = block.data[start:end]
+
+        keep = cols != i
+        if threshold is not None:
+            keep &= scores >= threshold
+        cols, scores = cols[keep], scores[keep]
+
+        if top_k is not None and len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            cols, scores = cols[best], scores[best]
+
+        for j, score in zip(cols.tolist(), scores.tolist()):
+            yield i, j, score
+
+
+def _init_worker(matrix, transposed, threshold, top_k, block_size):
+    _worker_state.update(matrix=matrix, transposed=transposed, threshold=threshold,
+                         top_k=top_k, block_size=block_size)
+
+
+def _join_block(row_offset: int) -> List[Tuple[int, int, float]]:
+    """Worker: pairs of one row block of the similarity matrix."""
+    state = _worker_state
+    block = (state['matrix'][row_offset:row_offset + state['block_size']] @ state['transposed']).tocsr()
+    return list(_block_pairs(block, row_offset, state['threshold'], state['top_k']))
+
+
+def sparse_similarity_join(matrix, threshold: Optional[float] = None,
+                           top_k: Optional[int] = None,
+                           block_size: int = 256,
+                           workers: Optional[int] = None) -> List[Tuple[int, int, float]]:
+    """
+    Find similar row pairs of a sparse matrix without materializing the N x N
+    cosine similarity matrix.
+
+    Rows are multiplied against the whole matrix in blocks of ``block_size``,
+    so peak memory is bounded by one ``block_size x N`` sparse block per process.
+    With ``workers`` the blocks are spread over a process pool and merged in
+    block order, so the result is identical to the serial join.
+
+    Args:
+        matrix: Sparse (or dense) document-term matrix, one row per document
+        threshold (float): Only keep pairs with cosine similarity >= threshold
+        top_k (int): Only keep each row's ``top_k`` most similar neighbours
+        block_size (int): Number of rows multiplied per block
+        workers (int): Worker processes for the block products; None or 1 runs serially
+
+    Returns:
+        List[Tuple[int, int, float]]: Unique (i, j, similarity) pairs with i < j,
+        sorted by (i, j)
+    """
+    if threshold is None and top_k is None:
+        raise ValueError("Either threshold or top_k must be given")
+
+    matrix = normalize(sparse.csr_matrix(matrix, dtype=np.float64))
+    transposed = matrix.T.tocsc()
+    offsets = range(0, matrix.shape[0], block_size)
+    pairs = {}
+
+    if workers is not None and workers > 1 and len(offsets) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(offsets)), initializer=_init_worker,
+                                 initargs=(matrix, transposed, threshold, top_k, block_size)) as executor:
+            # map() yields in submission order, so later blocks overwrite exactly as below
+            for block_pairs in executor.map(_join_block, offsets):
+                for i, j, score in block_pairs:
+                    pairs[(min(i, j), max(i, j))] = score
+    else:
+        for row_offset in offsets:
+            block = (matrix[row_offset:row_offset + block_size] @ transposed).tocsr()
+            for i, j, score in _block_pairs(block, row_offset, threshold, top_k):
+                pairs[(min(i, j), max(i, j))] = score
+
+    return [(i, j, score) for (i, j), score in sorted(pairs.items())]
@@ -0,0 +1,38 @@
+import zlib
+import numpy as np
+from typing import List
+
+# Bumped whenever tokenization or shingling changes, so stored token
+# streams and shingle hashes are recomputed instead of reused.
+TOKEN_VERSION = 1
+
+
+def encode_tokens(tokens: List[str]) -> bytes:
+    """Pack a normalized token stream into a compact zlib-compressed blob."""
+    return zlib.compress(' '.join(tokens).encode('utf-8'))
+
+
+def decode_tokens(data: bytes) -> List[str]:
+    """Unpack a token stream written by :func:`encode_tokens`."""
+    if not data:
+        return []
+    return zlib.decompress(data).decode('utf-8').split()
+
+
+def hashes_to_bytes(hashes) -> bytes:
+    """Serialize 64-bit hashes as little-endian uint64 bytes."""
+    return np.asarray(hashes, dtype='<u8').tobytes()
+
+
+def hashes_from_bytes(data: bytes) -> np.ndarray:
+    """Deserialize hashes written by :func:`hashes_to_bytes`."""
+    return np.frombuffer(data or b'', dtype='<u8').astype(np.uint64)
+
+
+def word_ngrams(tokens: List[str], ngram_range=(1, 1)) -> List[str]:
+    """TF-IDF analyzer over an already normalized token stream."""
+    low, high = ngram_range
+    grams = []
+    for n in range(low, high + 1):
+        grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return grams
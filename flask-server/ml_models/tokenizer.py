@@ -0,0 +1,72 @@
+import re
+import string
+from collections import deque
+from typing import FrozenSet, Iterable, Iterator, List
+
+try:
+    from nltk.corpus import stopwords
+    STOPWORDS = frozenset(stopwords.words('english'))
+except Exception:
+    STOPWORDS = frozenset([
+        'the', 'and', 'is', 'in', 'it', 'of', 'to', 'a', 'an', 'for', 'on', 'with', 'as', 'by', 'at', 'from', 'that', 'this', 'be', 'or', 'are', 'was', 'were', 'but', 'not', 'have', 'has', 'had', 'they', 'you', 'we', 'he', 'she', 'him', 'her', 'his', 'their', 'them', 'our', 'us', 'can', 'will', 'would', 'should', 'could', 'may', 'might', 'do', 'does', 'did', 'so', 'if', 'then', 'than', 'which', 'who', 'whom', 'what', 'when', 'where', 'why', 'how', 'all', 'any', 'some', 'no', 'nor', 'more', 'most', 'such', 'only', 'own', 'same', 'too', 'very', 'just', 'over', 'under', 'again', 'further', 'here', 'there', 'because', 'about', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'up', 'down', 'out', 'off', 'over', 'under', 'once'
+    ])
+
+# Punctuation is deleted rather than treated as a separator, so "don't"
+# becomes "dont" exactly as the old translate/split pipeline did
+_PUNCTUATION_RE = re.compile('[' + re.escape(string.punctuation) + ']+')
+
+
+class Tokenizer:
+    def __init__(self, stopwords: FrozenSet[str] = STOPWORDS):
+        """
+        Streaming tokenizer shared by every similarity engine.
+
+        Args:
+            stopwords (FrozenSet[str]): Words dropped from the token stream
+        """
+        self.stopwords = frozenset(stopwords)
+
+    def iter_tokens(self, text: str) -> Iterator[str]:
+        """
+        Yield the normalized tokens of a text one at a time.
+
+        Punctuation is stripped with one compiled regex pass and stopwords
+        are filtered lazily, so no filtered word list, re-joined string or
+        shingle list is ever built.
+
+        Args:
+            text (str): Raw text
+
+        Yields:
+            str: Lowercased tokens without punctuation or stopwords
+        """
+        stopwords = self.stopwords
+        for token in _PUNCTUATION_RE.sub('', (text or "").lower()).split():
+            if token not in stopwords:
+                yield token
+
+    def tokenize(self, text: str) -> List[str]:
+        """Normalized token stream of a text as a list."""
+        return list(self.iter_tokens(text))
+
+    @staticmethod
+    def iter_shingles(tokens: Iterable[str], k: int = 2) -> Iterator[str]:
+        """
+        Yield k-word shingles from a token stream using a sliding window.
+
+        Args:
+            tokens (Iterable[str]): Normalized tokens (list or generator)
+            k (int): Shingle length in words
+
+        Yields:
+            str: Space-joined shingles
+        """
+        window = deque(maxlen=k)
+        for token in tokens:
+            window.append(token)
+            if len(window) == k:
+                yield ' '.join(window)
+
+
+# Shared instance used by the detectors, the assignment index and TF-IDF
+tokenizer = Tokenizer()
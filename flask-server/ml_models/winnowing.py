@@ -0,0 +1,188 @@
+from collections import deque
+import numpy as np
+from typing import Dict, Hashable, List, Tuple
+
+# Karp-Rabin rolling hash parameters
+HASH_BASE = 257
+HASH_MOD = (1 << 61) - 1
+
+# Bumped whenever fingerprinting changes, so stored fingerprints are recomputed
+FINGERPRINT_VERSION = 1
+
+# (hash, start, end) with character offsets into the original text
+Fingerprint = Tuple[int, int, int]
+
+
+def normalize_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """
+    Lowercase text and drop everything but letters and digits, keeping the
+    original character offset of every retained character.
+
+    Args:
+        text (str): Raw text
+
+    Returns:
+        Tuple[str, List[int]]: Normalized text and its offsets into ``text``
+    """
+    chars = []
+    offsets = []
+    for position, char in enumerate(text):
+        if char.isalnum():
+            chars.append(char.lower())
+            offsets.append(position)
+    return ''.join(chars), offsets
+
+
+def fingerprints_to_bytes(fingerprints: List[Fingerprint]) -> bytes:
+    """Serialize fingerprints as little-endian uint64 (hash, start, end) triples."""
+    return np.asarray(fingerprints, dtype='<u8').reshape(-1, 3).tobytes()
+
+
+def fingerprints_from_bytes(data: bytes) -> List[Fingerprint]:
+    """Deserialize fingerprints written by :func:`fingerprints_to_bytes`."""
+    return [tuple(row) for row in np.frombuffer(data, dtype='<u8').reshape(-1, 3).tolist()]
+
+
+class Winnower:
+    def __init__(self, k: int = 25, window: int = 20):
+        """
+        MOSS-style winnowing fingerprinter.
+
+        Any shared passage of at least ``k + window - 1`` normalized characters
+        is guaranteed to produce at least one shared fingerprint, while passages
+        shorter than ``k`` never match.
+
+        Args:
+            k (int): Length of the hashed character k-grams
+            window (int): Number of consecutive k-gram hashes per winnowing window
+        """
+        self.k = k
+        self.window = window
+        self._high_power = pow(HASH_BASE, k - 1, HASH_MOD)
+
+    def _kgram_hashes(self, normalized: str) -> List[int]:
+        """Rolling Karp-Rabin hashes of every k-gram."""
+        if len(normalized) < self.k:
+            return []
+        codes = [ord(c) for c in normalized]
+        value = 0
+        for code in codes[:self.k]:
+            value = (value * HASH_BASE + code) % HASH_MOD
+        hashes = [value]
+        for i in range(self.k, len(codes)):
+            value = ((value - codes[i - self.k] * self._high_power) * HASH_BASE + codes[i]) % HASH_MOD
+            hashes.append(value)
+        return hashes
+
+    def _winnow(self, hashes: List[int]) -> List[int]:
+        """Select the rightmost minimal hash of every window (monotonic deque, O(n))."""
+        if not hashes:
+            return []
+        window = min(self.window, len(hashes))
+        selected = []
+        candidates = deque()
+        for i, value in enumerate(hashes):
+            while candidates and hashes[candidates[-1]] >= value:
+                candidates.pop()
+            candidates.append(i)
+            if candidates[0] <= i - window:
+                candidates.popleft()
+            if i >= window - 1 and (not selected or selected[-1] != candidates[0]):
+                selected.append(candidates[0])
+        return selected
+
+    def fingerprints(self, text: str) -> List[Fingerprint]:
+        """
+        Fingerprint a text.
+
+        Args:
+            text (str): Raw text
+
+        Returns:
+            List[Fingerprint]: (hash, start, end) triples, where ``text[start:end]``
+            covers the fingerprinted k-gram
+        """
+        normalized, offsets = normalize_with_offsets(text or "")
+        hashes = self._kgram_hashes(normalized)
+        return [
+            (hashes[i], offsets[i], offsets[i + self.k - 1] + 1)
+            for i in self._winnow(hashes)
+        ]
+
+
+class FingerprintIndex:
+    """Inverted index from fingerprint hash to (submission, offset) postings."""
+
+    def __init__(self):
+        self.postings: Dict[int, Dict[Hashable, List[Tuple[int, int]]]] = {}
+        self.documents: Dict[Hashable, List[Fingerprint]] = {}
+
+    def add(self, doc_id: Hashable, fingerprints: List[Fingerprint]):
+        """Index a document's fingerprints, replacing any previous version."""
+        self.remove(doc_id)
+        self.documents[doc_id] = fingerprints
+        for value, start, end in fingerprints:
+            self.postings.setdefault(value, {}).setdefault(doc_id, []).append((start, end))
+
+    def remove(self, doc_id: Hashable):
+        """Remove a document from the index if present."""
+        for value, _, _ in self.documents.pop(doc_id, []):
+            docs = self.postings.get(value)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[value]
+
+    def overlaps(self, doc_id: Hashable) -> Dict[Hashable, int]:
+        """Count fingerprints that every other document shares with ``doc_id``."""
+        counts: Dict[Hashable, int] = {}
+        for value, _, _ in self.documents.get(doc_id, []):
+            for other in self.postings.get(value, {}):
+                if other != doc_id:
+                    counts[other] = counts.get(other, 0) + 1
+        return counts
+
+    def matching_passages(self, source_id: Hashable, target_id: Hashable, gap: int = 0) -> List[Dict]:
+        """
+        Find passages of ``source_id`` that also appear in ``target_id``.
+
+        Each source fingerprint costs one dictionary lookup, so the work is
+        proportional to the source's fingerprints plus the matches found,
+        independent of the number of indexed documents.
+
+        Args:
+            source_id: Document whose passages are reported
+            target_id: Document searched for those passages
+            gap (int): Merge matches whose source ranges are at most this many
+                characters apart
+
+        Returns:
+            List[Dict]: Contiguous passages with 'source_start', 'source_end', 'target_start',
+            'target_end' character offsets and the number of 'fingerprints' merged
+        """
+        matches = []
+        for value, start, end in self.documents.get(source_id, []):
+            for target_start, target_end in self.postings.get(value, {}).get(target_id, []):
+                matches.append((start, end, target_start, target_end))
+        matches.sort()
+
+        passages = []
+        for start, end, target_start, target_end in matches:
+            passage = passages[-1] if passages else None
+            if (passage is not None
+                    and start <= passage['source_end'] + gap
+                    and target_start <= passage['target_end'] + gap
+                    and target_end >= passage['target_start'] - gap):
+                passage['source_end'] = max(passage['source_end'], end)
+                passage['target_start'] = min(passage['target_start'], target_start)
+                passage['target_end'] = max(passage['target_end'], target_end)
+                passage['fingerprints'] += 1
+            else:
+                passages.append({
+                    'source_start': start,
+                    'source_end': end,
+                    'target_start': target_start,
+                    'target_end': target_end,
+                    'fingerprints': 1
+                })
+        return passages
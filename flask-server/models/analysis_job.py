@@ -0,0 +1,54 @@
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, IntField, DictField, ListField, BooleanField, CASCADE
+from datetime import datetime
+from .user import User
+from .assignment import Assignment
+
+class AnalysisJob(Document):
+    """A class-wide plagiarism analysis of one assignment, run in the background."""
+    assignment = ReferenceField(Assignment, required=True, reverse_delete_rule=CASCADE)
+    requested_by = ReferenceField(User)
+    status = StringField(default='Queued', choices=['Queued', 'Running', 'Completed', 'Failed'])
+    active = BooleanField()  # True while queued or running (unset once finished); one per assignment
+    stage = StringField()  # Current step while running (loading, analyzing, saving)
+    progress = IntField(default=0)  # Percent complete
+    error = StringField()
+
+    # Results of a completed analysis
+    submission_count = IntField()
+    flagged_count = IntField()
+    statistics = DictField()
+    clusters = ListField(DictField())
+
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        'collection': 'analysis_jobs',
+        'indexes': [
+            ('assignment', '-created_at'),
+            'status',
+            {
+                'fields': ('assignment',),
+                'unique': True,
+                'partialFilterExpression': {'active': True}
+            }
+        ]
+    }
+
+    def to_json(self):
+        return {
+            "job_id": str(self.id),
+            "assignment_id": str(self.assignment.id),
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "submission_count": self.submission_count,
+            "flagged_count": self.flagged_count,
+            "statistics": self.statistics,
+            "clusters": self.clusters,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
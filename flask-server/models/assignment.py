@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, DateTimeField, ReferenceField, FileField, BooleanField, ValidationError, ListField
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, FileField, BooleanField, ValidationError, ListField, FloatField
 from datetime import datetime
 from .user import User
 
@@ -8,8 +8,10 @@ class Assignment(Document):
     description = StringField(required=True, min_length=10)
     due_date = DateTimeField(required=True)
     question_file = FileField(required=True)
+    question_text = StringField()  # Extracted text from question PDF, suppressed in plagiarism checks
     model_answer_file = FileField(required=False)  # PDF file for model answer
     model_answer_text = StringField()  # Extracted text from model answer PDF
+    tfidf_threshold = FloatField()  # TF-IDF plagiarism threshold of this assignment (None: the default)
     sections = ListField(StringField(), required=True)  # List of section IDs
     status = StringField(default='Active', choices=['Active', 'Archived'])
     professor = ReferenceField(User, required=True)  # Reference to the professor who created it
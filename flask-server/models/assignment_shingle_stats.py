@@ -0,0 +1,27 @@
+from mongoengine import Document, DateTimeField, ReferenceField, DictField, IntField, ListField, LongField, CASCADE
+from datetime import datetime
+from .assignment import Assignment
+
+class AssignmentShingleStats(Document):
+    """Count-min sketch of shingle document frequencies per assignment, for boilerplate suppression."""
+    assignment = ReferenceField(Assignment, required=True, unique=True, reverse_delete_rule=CASCADE)
+
+    # Number of submissions counted and the sketch counters (flat cell index as a string key),
+    # only ever changed with $inc so concurrent workers never lose an update
+    document_count = IntField(default=0)
+    sketch = DictField()
+    sketch_width = IntField()
+    sketch_depth = IntField()
+
+    # Shingle hashes (uint64 stored as int64) whose estimated document frequency crossed the
+    # cut-off; only ever extended with $addToSet
+    frequent_shingles = ListField(LongField())
+    # Frequent shingles waiting to be suppressed together (each batch re-signs the class once),
+    # and when the oldest of them was found
+    pending_shingles = ListField(LongField())
+    pending_since = DateTimeField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'assignment_shingle_stats'
+    }
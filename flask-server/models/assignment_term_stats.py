@@ -0,0 +1,21 @@
+from mongoengine import Document, DateTimeField, ReferenceField, DictField, IntField, CASCADE
+from datetime import datetime
+from .assignment import Assignment
+
+class AssignmentTermStats(Document):
+    """Document frequencies of hashed terms across an assignment's submissions, for incremental TF-IDF."""
+    assignment = ReferenceField(Assignment, required=True, unique=True, reverse_delete_rule=CASCADE)
+
+    # Number of submissions counted and, per hash bucket (as a string key), how many contain it.
+    # Both are only ever changed with $inc so concurrent workers never lose an update.
+    document_count = IntField(default=0)
+    document_frequencies = DictField()
+    n_features = IntField()
+    tfidf_version = IntField()
+    # Incremented by every change, so a process reloads the frequencies only when another one changed them
+    version = IntField(default=0)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'assignment_term_stats'
+    }
@@ -0,0 +1,26 @@
+from mongoengine import Document, StringField, DateTimeField, BinaryField, IntField
+from datetime import datetime
+
+class ContentCacheEntry(Document):
+    """Text and derived features extracted from one uploaded file, keyed by the SHA-256 of its bytes."""
+    sha256 = StringField(required=True, unique=True)
+    text = StringField()  # Extracted (OCR) text
+
+    # Sentence spans and float16 sentence embeddings of the text (see ml_models/sentence_index.py)
+    sentence_spans = BinaryField()
+    sentence_embeddings = BinaryField()
+    embedding_model = StringField()
+    embedding_dim = IntField()
+    semantic_version = IntField()
+
+    # Lookups answered by this entry (misses are counted in ContentCacheStats)
+    hits = IntField(default=0)
+    created_at = DateTimeField(default=datetime.utcnow)
+    last_hit_at = DateTimeField()
+
+    meta = {
+        'collection': 'content_cache',
+        'indexes': [
+            'last_hit_at'
+        ]
+    }
@@ -0,0 +1,12 @@
+from mongoengine import Document, StringField, DateTimeField, IntField
+
+class ContentCacheStats(Document):
+    """Content cache lookups that found no entry, counted across all worker processes."""
+    # One document ('global'); its counter only ever changes with $inc
+    key = StringField(required=True, unique=True)
+    misses = IntField(default=0)
+    last_miss_at = DateTimeField()
+
+    meta = {
+        'collection': 'content_cache_stats'
+    }
@@ -0,0 +1,57 @@
+from mongoengine import Document, StringField, DateTimeField, DictField, IntField
+from datetime import datetime
+
+class Job(Document):
+    """A unit of background work (e.g. processing one submission) in the durable job queue."""
+    kind = StringField(required=True)  # Handler name, e.g. 'process_submission'
+    payload = DictField()
+    # At most one Queued job per key (e.g. one processing job per submission), enforced by a
+    # unique partial index; a running job can have one queued successor that redoes the work
+    dedupe_key = StringField()
+    # Jobs with the same key (e.g. submissions of one assignment) can be claimed as one batch
+    group_key = StringField()
+
+    # Queued -> Running -> Completed, back to Queued after a retryable failure,
+    # or Dead once max_attempts is used up (kept for inspection)
+    status = StringField(default='Queued', choices=['Queued', 'Running', 'Completed', 'Dead'])
+    attempts = IntField(default=0)
+    max_attempts = IntField(default=3)
+    available_at = DateTimeField(default=datetime.utcnow)  # Not claimed before this (retry backoff)
+    last_error = StringField()
+
+    # Lease held by the worker running the job; an expired lease makes it claimable again
+    lease_owner = StringField()
+    lease_expires_at = DateTimeField()
+    heartbeat_at = DateTimeField()
+
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        'collection': 'jobs',
+        'indexes': [
+            ('status', 'kind', 'available_at'),
+            ('status', 'kind', 'group_key', 'available_at'),
+            ('status', 'lease_expires_at'),
+            {
+                'fields': ('dedupe_key', 'status'),
+                'unique': True,
+                'partialFilterExpression': {'status': 'Queued', 'dedupe_key': {'$exists': True}}
+            }
+        ]
+    }
+
+    def to_json(self):
+        return {
+            "job_id": str(self.id),
+            "kind": self.kind,
+            "payload": self.payload,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "available_at": self.available_at.isoformat() if self.available_at else None,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,32 @@
+from mongoengine import Document, DateTimeField, ReferenceField, FloatField, BooleanField, CASCADE
+from datetime import datetime
+from .assignment import Assignment
+from .submission import Submission
+
+class MatchEdge(Document):
+    """TF-IDF similarity of a checked submission (source) to another submission of its class (target)."""
+    assignment = ReferenceField(Assignment, required=True, reverse_delete_rule=CASCADE)
+    source = ReferenceField(Submission, required=True, reverse_delete_rule=CASCADE)
+    target = ReferenceField(Submission, required=True, reverse_delete_rule=CASCADE)
+    similarity = FloatField(required=True)
+    flagged = BooleanField(default=False)  # At or above the plagiarism threshold
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'match_edges',
+        'indexes': [
+            {'fields': ('source', 'target'), 'unique': True},
+            ('source', '-similarity'),
+            ('target', '-similarity'),
+            ('assignment', '-similarity')
+        ]
+    }
+
+    def to_json(self):
+        return {
+            "source_id": str(self.source.id),
+            "target_id": str(self.target.id),
+            "similarity": self.similarity,
+            "flagged": self.flagged,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -1,4 +1,4 @@
-from mongoengine import Document, StringField, DateTimeField, ReferenceField, FloatField, FileField, DictField
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, FloatField, FileField, DictField, IntField, BooleanField, ListField
 from datetime import datetime
 from .user import User
 from .assignment import Assignment
@@ -7,6 +7,7 @@ class Submission(Document):
     student = ReferenceField(User, required=True)
     assignment = ReferenceField(Assignment, required=True)
     answer_file = FileField(required=True)  # Using FileField to store files in GridFS
+    content_sha256 = StringField()  # SHA-256 of the uploaded file, the key of the content cache
     status = StringField(default='Submitted', choices=['Submitted', 'Processing', 'Graded', 'Late'])
     grade = FloatField()
     feedback = StringField()
@@ -25,6 +26,16 @@ class Submission(Document):
     final_score = FloatField()  # Score after plagiarism penalty
     plagiarism_severity = StringField(choices=['easy', 'medium', 'hard'], default='medium')
 
+    # Persisted stage inputs and version stamps of the processing pipeline (extract,
+    # plagiarism, similarity, grade), so a changed input reruns only the stages after it
+    answer_similarity = FloatField()  # Semantic similarity to the model answer (None: content analysis)
+    word_count = IntField()
+    content_quality = FloatField()  # Content-analysis score (None: too short to grade)
+    plagiarism_signals = ListField(StringField())  # Detectors that found plagiarism: minhash, tfidf, semantic, reference
+    tfidf_max_similarity = FloatField()  # Highest TF-IDF similarity to another submission
+    stage_stamps = DictField()
+    flagged_by_peer = BooleanField(default=False)  # Matched by another submission's check; kept until the file changes
+
     meta = {
         'collection': 'submissions',
         'indexes': [
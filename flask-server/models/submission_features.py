@@ -0,0 +1,51 @@
+from mongoengine import Document, DateTimeField, ReferenceField, BinaryField, IntField, StringField
+from datetime import datetime
+from .assignment import Assignment
+from .submission import Submission
+
+class SubmissionFeatures(Document):
+    """Derived similarity features, computed once per submission at extraction time."""
+    # Removed by the index removal job of a deleted submission, which first takes it out of the term statistics
+    submission = ReferenceField(Submission, required=True, unique=True)
+    assignment = ReferenceField(Assignment, required=True)
+
+    # Normalized token stream (zlib-compressed) and unique 64-bit 2-word shingle hashes
+    tokens = BinaryField()
+    shingle_hashes = BinaryField()
+    token_version = IntField()
+
+    # MinHash signature stored as little-endian uint64 bytes
+    minhash = BinaryField()
+    num_perm = IntField()
+    signature_version = IntField()
+    # Boilerplate suppression set the signature was built without (see ml_models/boilerplate.py)
+    suppression_key = IntField()
+
+    # Hashed term counts (uint32 bucket, count pairs) for incremental TF-IDF
+    term_counts = BinaryField()
+    tfidf_version = IntField()
+
+    # 64-bit SimHash fingerprint as 8 little-endian bytes
+    simhash = BinaryField()
+    simhash_version = IntField()
+
+    # Sentence spans (uint32 start, end pairs) and their float16 sentence embeddings
+    sentence_spans = BinaryField()
+    sentence_embeddings = BinaryField()
+    embedding_model = StringField()
+    embedding_dim = IntField()
+    semantic_version = IntField()
+
+    # Winnowing fingerprints as little-endian uint64 (hash, start, end) triples
+    fingerprints = BinaryField()
+    fingerprint_version = IntField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'submission_features',
+        'indexes': [
+            ('assignment', 'updated_at'),
+            # Covers the distinct submission IDs the index sync reconciles deletes with
+            ('assignment', 'submission')
+        ]
+    }
@@ -3,7 +3,12 @@ from werkzeug.utils import secure_filename
 from models.user import User
 from models.assignment import Assignment
 from models.submission import Submission
-from utils.document_processor import document_processor
+from models.analysis_job import AnalysisJob
+from utils.job_queue import (
+    job_queue, enqueue_assignment_text, enqueue_regrade, enqueue_removal, enqueue_submission, start_class_analysis
+)
+from utils.content_cache import content_hash
+from utils.match_edges import match_edges
 import os
 import uuid
 import datetime
@@ -11,8 +16,6 @@ import logging
 from functools import wraps
 import io
 from mongoengine.errors import ValidationError
-from ml_models.ocr_processor import OCRProcessor
-import tempfile
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -198,16 +201,6 @@ def create_assignment():
             logger.error(f"Model answer file validation error: {model_answer_error}")
             return jsonify({'error': model_answer_error}), 400
 
-        # Extract text from model answer PDF
-        ocr = OCRProcessor()
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            model_answer_file.save(tmp_file)
-            tmp_file_path = tmp_file.name
-        try:
-            model_answer_text = ocr.extract_text_from_pdf(tmp_file_path)
-        finally:
-            os.remove(tmp_file_path)
-
         # Get current user
         try:
             current_user = User.objects.get(id=session['user_id'])
@@ -225,8 +218,7 @@ def create_assignment():
                 description=description,
                 due_date=due_date,
                 sections=sections,
-                professor=current_user,
-                model_answer_text=model_answer_text
+                professor=current_user
             )
 
             # Save the files
@@ -249,6 +241,9 @@ def create_assignment():
             logger.info("Saving assignment...")
             new_assignment.save()
 
+            # The workers extract the question and model answer text (OCR) in the background
+            enqueue_assignment_text(new_assignment.id)
+
             logger.info(f"Assignment created successfully with ID: {new_assignment.id}")
             return jsonify(new_assignment.to_json()), 201
 
@@ -281,9 +276,28 @@ def submit_assignment(assignment_id):
         file, error = validate_file(request.files['answerFile'])
         if error:
             return jsonify({'error': error}), 400
+        content_sha256 = content_hash(file.read())
+        file.seek(0)
+
+        # Backpressure: refuse uploads while the processing queue is saturated
+        if job_queue.is_full():
+            logger.warning("Processing queue is full, refusing submission")
+            response = jsonify({'error': 'The grading queue is busy, please try again in a few minutes'})
+            response.headers['Retry-After'] = '60'
+            return response, 503
 
         # Check if submission already exists
         submission = Submission.objects(student=student, assignment=assignment).first()
+        if submission and submission.content_sha256 == content_sha256 and submission.processing_status != 'Failed':
+            # Re-upload of the same file: keep its results instead of processing it again
+            submission.submitted_at = datetime.datetime.utcnow()
+            submission.status = 'Submitted'
+            submission.save()
+            logger.info(f"Submission {submission.id} re-uploaded unchanged, keeping previous results")
+            return jsonify({
+                **submission.to_json(),
+                "message": "Assignment submitted successfully. The file is unchanged, so previous results were kept."
+            }), 201
         if submission:
             # Update existing submission
             try:
@@ -293,6 +307,7 @@ def submit_assignment(assignment_id):
                     filename=filename,
                     content_type=file.content_type
                 )
+                submission.content_sha256 = content_sha256
                 submission.submitted_at = datetime.datetime.utcnow()
                 submission.status = 'Submitted'
                 submission.processing_status = 'Pending'  # Reset processing status
@@ -311,7 +326,8 @@ def submit_assignment(assignment_id):
                     student=student,
                     assignment=assignment,
                     status='Submitted',
-                    processing_status='Pending'
+                    processing_status='Pending',
+                    content_sha256=content_sha256
                 )
                 filename = secure_filename(file.filename)
                 submission.answer_file.put(
@@ -324,10 +340,10 @@ def submit_assignment(assignment_id):
                 logger.error(f"Error creating submission: {str(e)}")
                 return jsonify({'error': 'Failed to create submission'}), 500
 
-        # Start asynchronous processing
+        # Queue asynchronous processing
         try:
-            document_processor.process_submission_async(submission.id)
-            logger.info(f"Started processing for submission {submission.id}")
+            enqueue_submission(submission.id, assignment.id)
+            logger.info(f"Queued processing for submission {submission.id}")
         except Exception as e:
             logger.error(f"Error starting document processing: {str(e)}")
             # Don't return an error here, as the submission was successful
@@ -464,6 +480,207 @@ def get_assignment_submissions(assignment_id):
         print(f"Error fetching submissions: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@assignments_bp.route('/api/assignments/<assignment_id>/clusters', methods=['GET'])
+@login_required
+@professor_required
+def get_plagiarism_clusters(assignment_id):
+    """Return the collusion clusters for an assignment as one list.
+
+    Clusters are built from the stored match edges. An optional ``threshold``
+    query parameter clusters at that similarity instead of the assignment's
+    plagiarism threshold, so professors can tune it without re-checking.
+    """
+    try:
+        assignment = Assignment.objects(id=assignment_id).first()
+        if not assignment:
+            return jsonify({'error': 'Assignment not found'}), 404
+        if str(assignment.professor.id) != session['user_id']:
+            return jsonify({'error': 'Not authorized'}), 403
+
+        threshold = request.args.get('threshold', type=float)
+        if threshold is not None and not 0 < threshold < 1:
+            return jsonify({'error': 'threshold must be between 0 and 1'}), 400
+
+        clusters = match_edges.clusters(assignment.id, threshold=threshold)
+        return jsonify({
+            'assignment_id': str(assignment.id),
+            'threshold': threshold if threshold is not None else assignment.tfidf_threshold,
+            'clusters': clusters,
+            'suspicious_submissions': sum(cluster['size'] for cluster in clusters)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error building plagiarism clusters: {str(e)}")
+        return jsonify({'error': 'Failed to build plagiarism clusters'}), 500
+
+@assignments_bp.route('/api/assignments/<assignment_id>/analyze', methods=['POST'])
+@login_required
+@professor_required
+def analyze_assignment(assignment_id):
+    """Start a class-wide plagiarism analysis of every completed submission.
+
+    The analysis runs in the background; poll the returned job for progress,
+    clusters and statistics.
+    """
+    try:
+        assignment = Assignment.objects(id=assignment_id).first()
+        if not assignment:
+            return jsonify({'error': 'Assignment not found'}), 404
+        if str(assignment.professor.id) != session['user_id']:
+            return jsonify({'error': 'Not authorized'}), 403
+
+        job = start_class_analysis(assignment, User.objects(id=session['user_id']).first())
+        return jsonify(job.to_json()), 202
+
+    except Exception as e:
+        logger.error(f"Error starting class analysis: {str(e)}")
+        return jsonify({'error': 'Failed to start analysis'}), 500
+
+@assignments_bp.route('/api/assignments/<assignment_id>/regrade', methods=['POST'])
+@login_required
+@professor_required
+def regrade_assignment(assignment_id):
+    """Change an assignment's plagiarism threshold or severity and re-grade every submission.
+
+    Optional JSON fields: ``tfidf_threshold`` (null restores the default) and
+    ``plagiarism_severity`` (applied to every submission). The re-grade runs in
+    the background from the stored scores, without re-checking any submission.
+    """
+    try:
+        assignment = Assignment.objects(id=assignment_id).first()
+        if not assignment:
+            return jsonify({'error': 'Assignment not found'}), 404
+        if str(assignment.professor.id) != session['user_id']:
+            return jsonify({'error': 'Not authorized'}), 403
+
+        data = request.get_json(silent=True) or {}
+        if 'tfidf_threshold' in data:
+            threshold = data['tfidf_threshold']
+            if threshold is not None and (isinstance(threshold, bool) or not isinstance(threshold, (int, float))
+                                          or not 0 < threshold < 1):
+                return jsonify({'error': 'tfidf_threshold must be between 0 and 1'}), 400
+            # update_one: saving would re-validate the due date of past assignments
+            if threshold is None:
+                Assignment.objects(id=assignment.id).update_one(unset__tfidf_threshold=True)
+            else:
+                Assignment.objects(id=assignment.id).update_one(set__tfidf_threshold=float(threshold))
+        if 'plagiarism_severity' in data:
+            if data['plagiarism_severity'] not in ('easy', 'medium', 'hard'):
+                return jsonify({'error': 'plagiarism_severity must be easy, medium or hard'}), 400
+            Submission.objects(assignment=assignment.id).update(set__plagiarism_severity=data['plagiarism_severity'])
+
+        job = enqueue_regrade(assignment.id)
+        return jsonify(job.to_json()), 202
+
+    except Exception as e:
+        logger.error(f"Error starting re-grade: {str(e)}")
+        return jsonify({'error': 'Failed to start re-grade'}), 500
+
+@assignments_bp.route('/api/analysis-jobs/<job_id>', methods=['GET'])
+@login_required
+@professor_required
+def get_analysis_job(job_id):
+    """Progress of a class-wide analysis, with clusters and statistics once completed."""
+    try:
+        job = AnalysisJob.objects(id=job_id).first()
+        if not job:
+            return jsonify({'error': 'Analysis job not found'}), 404
+        if str(job.assignment.professor.id) != session['user_id']:
+            return jsonify({'error': 'Not authorized'}), 403
+
+        return jsonify(job.to_json()), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching analysis job: {str(e)}")
+        return jsonify({'error': 'Failed to fetch analysis job'}), 500
+
+@assignments_bp.route('/api/submissions/<submission_id>/passages/<other_id>', methods=['GET'])
+@login_required
+@professor_required
+def get_matching_passages(submission_id, other_id):
+    """Show which passages of one submission also appear in another."""
+    try:
+        submission = Submission.objects(id=submission_id).first()
+        other = Submission.objects(id=other_id).first()
+        if not submission or not other:
+            return jsonify({'error': 'Submission not found'}), 404
+        if submission.assignment.id != other.assignment.id:
+            return jsonify({'error': 'Submissions belong to different assignments'}), 400
+        if str(submission.assignment.professor.id) != session['user_id']:
+            return jsonify({'error': 'Not authorized'}), 403
+
+        source_text = submission.ocr_text or ""
+        target_text = other.ocr_text or ""
+        passages = match_edges.passages(submission.id, other.id)
+        for passage in passages:
+            passage['source_text'] = source_text[passage['source_start']:passage['source_end']]
+            passage['target_text'] = target_text[passage['target_start']:passage['target_end']]
+
+        return jsonify({
+            'submission_id': str(submission.id),
+            'other_submission_id': str(other.id),
+            'matched_characters': sum(p['source_end'] - p['source_start'] for p in passages),
+            'passages': passages
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error finding matching passages: {str(e)}")
+        return jsonify({'error': 'Failed to find matching passages'}), 500
+
+@assignments_bp.route('/api/submissions/<submission_id>/matches', methods=['GET'])
+@login_required
+@professor_required
+def get_submission_matches(submission_id):
+    """The submissions a submission matched, and those that matched it, most similar first."""
+    try:
+        submission = Submission.objects(id=submission_id).first()
+        if not submission:
+            return jsonify({'error': 'Submission not found'}), 404
+        if str(submission.assignment.professor.id) != session['user_id']:
+            return jsonify({'error': 'Not authorized'}), 403
+
+        limit = request.args.get('limit', type=int)
+        return jsonify({
+            'submission_id': str(submission.id),
+            'matches': match_edges.for_submission(submission.id, limit=limit)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching submission matches: {str(e)}")
+        return jsonify({'error': 'Failed to fetch matches'}), 500
+
+@assignments_bp.route('/api/assignments/<assignment_id>/matches', methods=['GET'])
+@login_required
+@professor_required
+def get_assignment_matches(assignment_id):
+    """Match edges of an assignment, most similar first.
+
+    Optional ``min_similarity`` (default 0, every stored edge) and ``limit``
+    query parameters; both are answered from the match_edges indexes.
+    """
+    try:
+        assignment = Assignment.objects(id=assignment_id).first()
+        if not assignment:
+            return jsonify({'error': 'Assignment not found'}), 404
+        if str(assignment.professor.id) != session['user_id']:
+            return jsonify({'error': 'Not authorized'}), 403
+
+        min_similarity = request.args.get('min_similarity', default=0.0, type=float)
+        if not 0 <= min_similarity <= 1:
+            return jsonify({'error': 'min_similarity must be between 0 and 1'}), 400
+        limit = request.args.get('limit', type=int)
+
+        edges = match_edges.for_assignment(assignment.id, min_similarity=min_similarity, limit=limit)
+        return jsonify({
+            'assignment_id': str(assignment.id),
+            'min_similarity': min_similarity,
+            'edges': edges
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching assignment matches: {str(e)}")
+        return jsonify({'error': 'Failed to fetch matches'}), 500
+
 @assignments_bp.route('/api/submissions/<submission_id>', methods=['DELETE'])
 @login_required
 @professor_required
@@ -482,7 +699,10 @@ def delete_submission(submission_id):
                 submission.answer_file.delete()
             except Exception:
                 pass
+        assignment_id = submission.assignment.id
         submission.delete()
+        # The worker removes its stored features, term statistics and index entries
+        enqueue_removal(assignment_id, submission_id)
         return jsonify({'success': True, 'message': 'Submission deleted'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -504,10 +724,9 @@ def update_submission(submission_id):
             submission.plagiarism_severity = data['plagiarism_severity']
             updated = True
         if updated:
-            # Re-run processing to update final_score and related fields
-            from utils.document_processor import document_processor
-            document_processor._process_submission(str(submission.id))
-            submission.reload()
+            # The workers re-derive final_score; OCR and plagiarism results are reused
+            submission.save()
+            enqueue_submission(submission.id, submission.assignment.id)
         return jsonify(submission.to_json()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify
 from models.user import User
+from utils.content_cache import content_cache
 import logging
 
 debug_bp = Blueprint('debug', __name__)
@@ -56,6 +57,22 @@ def get_database_status():
         
     except Exception as e:
         logging.error(f"Error checking database status: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@debug_bp.route('/api/debug/content-cache', methods=['GET'])
+def get_content_cache_metrics():
+    """Content cache size and hit rate (OCR skipped for byte-identical uploads)"""
+    try:
+        return jsonify({
+            'success': True,
+            'contentCache': content_cache.metrics()
+        }), 200
+
+    except Exception as e:
+        logging.error(f"Error reading content cache metrics: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -0,0 +1,1034 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+from datasketch import MinHashLSH
+from pymongo import UpdateOne
+
+from config import Config
+from models.assignment import Assignment
+from models.submission import Submission
+from models.submission_features import SubmissionFeatures
+from models.assignment_term_stats import AssignmentTermStats
+from models.assignment_shingle_stats import AssignmentShingleStats
+from ml_models.boilerplate import HEADER_PHRASES, CountMinSketch, remove_suppressed, suppression_key
+from ml_models.cheating_detector import CheatingDetector
+from ml_models.clustering import build_clusters
+from ml_models.winnowing import (
+    FINGERPRINT_VERSION, FingerprintIndex, Winnower, fingerprints_from_bytes, fingerprints_to_bytes
+)
+from ml_models.text_features import (
+    TOKEN_VERSION, decode_tokens, encode_tokens, hashes_from_bytes, hashes_to_bytes
+)
+from ml_models.sentence_index import (
+    SEMANTIC_VERSION, SentenceIndex, embeddings_from_bytes, embeddings_to_bytes,
+    spans_from_bytes, spans_to_bytes, split_sentences
+)
+from ml_models.simhash import SIMHASH_VERSION, SimHashIndex, simhash, simhash_from_bytes, simhash_to_bytes
+from ml_models.hashed_tfidf import (
+    TFIDF_VERSION, HashedTfidf, TermCounts, frequencies_to_dict, term_counts_from_bytes, term_counts_to_bytes
+)
+from ml_models.minhash_engine import (
+    MAX_HASH, SIGNATURE_VERSION, banded_pairs, signature_from_bytes, signature_to_bytes, signature_to_minhash
+)
+from utils.lean_reads import iter_projected
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Overlap applied when pulling signatures written by other workers, so that
+# small clock differences between processes never drop an update.
+SYNC_OVERLAP = timedelta(seconds=30)
+MIN_TEXT_LENGTH = 50
+
+
+def is_empty_signature(signature: np.ndarray) -> bool:
+    """Whether a signature was built from no shingles (e.g. a submission that is all boilerplate)."""
+    return bool(np.all(signature == MAX_HASH))
+
+
+class AssignmentIndex:
+    """In-memory MinHash LSH, fingerprint and term-count indexes for one assignment, mirrored from SubmissionFeatures."""
+
+    def __init__(self, assignment_id: str, threshold: float, num_perm: int, simhash_distance: int = 10):
+        self.assignment_id = assignment_id
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.fingerprints = FingerprintIndex()
+        self.simhashes = SimHashIndex(simhash_distance)
+        self.sentences: Optional[SentenceIndex] = None
+        self.sentence_spans: Dict[str, List[Tuple[int, int]]] = {}
+        self.term_counts: Dict[str, TermCounts] = {}
+        self._term_matrix = None
+        # Submissions put in the index whose features are not stored yet
+        self.unstored: Set[str] = set()
+        # Boilerplate shingles left out of signatures, and the key stamped on signatures built without them
+        self.suppressed = np.empty(0, dtype=np.uint64)
+        self.suppression_key = suppression_key(self.suppressed)
+        self.template_source: Optional[Tuple[str, str]] = None
+        self.template_hashes = np.empty(0, dtype=np.uint64)
+        self.document_frequencies: Optional[np.ndarray] = None
+        self.document_count = 0
+        self.stats_version: Optional[int] = None
+        self.synced_at: Optional[datetime] = None
+        self.lock = threading.RLock()
+
+    def put(self, submission_id: str, signature: np.ndarray, fingerprints: List[Tuple[int, int, int]],
+            term_counts: Optional[TermCounts] = None, simhash_value: Optional[int] = None):
+        """Insert or replace the signature, fingerprints, term counts and SimHash stored for a submission."""
+        self.fingerprints.add(submission_id, fingerprints)
+        if simhash_value is not None:
+            self.simhashes.add(submission_id, simhash_value)
+        if term_counts is not None:
+            self.term_counts[submission_id] = term_counts
+            self._term_matrix = None
+        existing = self.signatures.get(submission_id)
+        if existing is not None:
+            if np.array_equal(existing, signature):
+                return
+            self.lsh.remove(submission_id)
+            del self.signatures[submission_id]
+        if is_empty_signature(signature):
+            # Nothing but boilerplate: every such submission would share all LSH buckets
+            return
+        self.lsh.insert(submission_id, signature_to_minhash(signature, self.num_perm))
+        self.signatures[submission_id] = signature
+
+    def put_sentences(self, submission_id: str, spans: List[Tuple[int, int]], embeddings: np.ndarray):
+        """Insert or replace the sentence embeddings stored for a submission."""
+        if self.sentences is None:
+            if len(embeddings) == 0:
+                return
+            self.sentences = SentenceIndex(embeddings.shape[1])
+        self.sentences.add(submission_id, embeddings)
+        self.sentence_spans[submission_id] = spans
+
+    def rethreshold(self, threshold: float):
+        """Rebuild the LSH bands for a new threshold from the signatures already in memory."""
+        self.threshold = threshold
+        self.lsh = MinHashLSH(threshold=threshold, num_perm=self.num_perm)
+        with self.lsh.insertion_session() as session:
+            for submission_id, signature in self.signatures.items():
+                session.insert(submission_id, signature_to_minhash(signature, self.num_perm))
+
+    def signature_matrix(self) -> Tuple[List[str], np.ndarray]:
+        """Submission IDs in sorted order and their signatures stacked row by row."""
+        ids = sorted(self.signatures)
+        if not ids:
+            return ids, np.empty((0, self.num_perm), dtype=np.uint64)
+        return ids, np.vstack([self.signatures[submission_id] for submission_id in ids])
+
+    def discard(self, submission_id: str):
+        """Remove a submission from the index if present."""
+        self.fingerprints.remove(submission_id)
+        self.simhashes.remove(submission_id)
+        if self.sentences is not None:
+            self.sentences.remove(submission_id)
+        self.sentence_spans.pop(submission_id, None)
+        if self.term_counts.pop(submission_id, None) is not None:
+            self._term_matrix = None
+        if self.signatures.pop(submission_id, None) is not None:
+            self.lsh.remove(submission_id)
+
+    def submission_ids(self) -> Set[str]:
+        """IDs of every submission with anything in the index."""
+        return set(self.fingerprints.documents) | set(self.signatures) | set(self.term_counts) | set(self.sentence_spans)
+
+    def term_matrix(self, tfidf: HashedTfidf):
+        """Submission IDs and their stored term counts as one CSR matrix, cached until the next change."""
+        if self._term_matrix is None:
+            ids = sorted(self.term_counts)
+            self._term_matrix = (ids, tfidf.matrix([self.term_counts[submission_id] for submission_id in ids]))
+        return self._term_matrix
+
+    def query(self, signature: np.ndarray, exclude: Optional[str] = None,
+              candidates: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Find indexed submissions whose estimated Jaccard similarity reaches the threshold.
+
+        Args:
+            signature (np.ndarray): MinHash hash values of the query document
+            exclude (str): Submission ID to leave out of the results
+            candidates (List[str]): Only verify these submissions (e.g. SimHash near
+                duplicates) instead of probing the LSH buckets
+
+        Returns:
+            List[Tuple[str, float]]: (submission_id, estimated_jaccard) sorted by score
+        """
+        if is_empty_signature(signature):
+            return []
+        if candidates is None:
+            candidates = self.lsh.query(signature_to_minhash(signature, self.num_perm))
+        matches = []
+        for candidate in candidates:
+            if candidate == exclude or candidate not in self.signatures:
+                continue
+            score = float(np.mean(self.signatures[candidate] == signature))
+            if score >= self.threshold:
+                matches.append((candidate, score))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+
+
+class AssignmentIndexRegistry:
+    """
+    Process-wide registry of per-assignment LSH indexes.
+
+    Signatures and winnowing fingerprints are persisted in the
+    ``submission_features`` collection, so each submission is hashed exactly once and every worker process can rebuild its
+    indexes from MongoDB after a restart instead of rehashing raw text.
+    """
+
+    def __init__(self, threshold: float = 0.4, num_perm: int = 128,
+                 simhash_distance: int = 10, prefilter_min_submissions: int = 500,
+                 semantic_threshold: float = 0.85, boilerplate_max_df: float = 0.5,
+                 boilerplate_min_submissions: int = 20, resign_batch: int = 50, resign_interval_seconds: int = 600):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.simhash_distance = simhash_distance
+        self.prefilter_min_submissions = prefilter_min_submissions
+        self.semantic_threshold = semantic_threshold
+        # Sentence encoder (e.g. SimilarityChecker.encode_sentences), set by processes that load the model
+        self.sentence_encoder: Optional[Callable[[List[str]], np.ndarray]] = None
+        self.embedding_model: Optional[str] = None
+        self.detector = CheatingDetector(num_perm=num_perm, exact_threshold=threshold)
+        self.winnower = Winnower()
+        self.tfidf = HashedTfidf()
+        self.sketch = CountMinSketch()
+        self.boilerplate_max_df = boilerplate_max_df
+        self.boilerplate_min_submissions = boilerplate_min_submissions
+        # New frequent shingles re-sign the whole class, so they are suppressed in batches
+        self.resign_batch = resign_batch
+        self.resign_interval = timedelta(seconds=resign_interval_seconds)
+        self.header_hashes = self._shingle_union(HEADER_PHRASES)
+        self._indexes: Dict[str, AssignmentIndex] = {}
+        self._lock = threading.Lock()
+
+    def set_sentence_encoder(self, encoder: Callable[[List[str]], np.ndarray], model_name: str):
+        """
+        Enable cross-submission sentence matching with a batch sentence encoder.
+
+        Args:
+            encoder (Callable): Maps a list of sentences to L2-normalized float16 embeddings
+            model_name (str): Model identifier stored with the embeddings
+        """
+        self.sentence_encoder = encoder
+        self.embedding_model = model_name
+
+    def get(self, assignment_id, sync: bool = True) -> AssignmentIndex:
+        """
+        Return the synced index for an assignment, building it on first use.
+
+        ``sync=False`` skips loading writes made since the last sync, for
+        callers that just synced the index (e.g. within one batch).
+        """
+        assignment_id = str(assignment_id)
+        with self._lock:
+            index = self._indexes.get(assignment_id)
+            if index is None:
+                index = AssignmentIndex(assignment_id, self.threshold, self.num_perm, self.simhash_distance)
+                self._indexes[assignment_id] = index
+        if sync or index.synced_at is None:
+            with index.lock:
+                self._sync(index)
+        return index
+
+    def _sync(self, index: AssignmentIndex):
+        """Load signatures stored since the last sync (all of them on first use)."""
+        started_at = datetime.utcnow()
+        # A changed suppression set invalidates every signature, so reload them all
+        suppression_changed = self._sync_suppression(index)
+        query = {'assignment': ObjectId(index.assignment_id)}
+        if index.synced_at is not None and not suppression_changed:
+            query['updated_at'] = {'$gte': index.synced_at - SYNC_OVERLAP}
+
+        loaded = 0
+        stale = []
+        resign = []
+        unembedded = []
+        fields = ('submission', 'minhash', 'num_perm', 'signature_version',
+                  'shingle_hashes', 'suppression_key',
+                  'fingerprints', 'fingerprint_version', 'token_version',
+                  'term_counts', 'tfidf_version', 'simhash', 'simhash_version',
+                  'sentence_spans', 'sentence_embeddings', 'embedding_model', 'embedding_dim',
+                  'semantic_version', 'updated_at')
+        for features in iter_projected(SubmissionFeatures, query, fields):
+            submission_id = str(features['submission'])
+            if not features.get('minhash'):
+                index.discard(submission_id)
+            elif (features.get('num_perm') != self.num_perm
+                  or features.get('signature_version') != SIGNATURE_VERSION
+                  or features.get('fingerprint_version') != FINGERPRINT_VERSION
+                  or features.get('token_version') != TOKEN_VERSION
+                  or features.get('tfidf_version') != TFIDF_VERSION
+                  or features.get('simhash_version') != SIMHASH_VERSION):
+                stale.append(submission_id)
+            else:
+                if features.get('suppression_key') == index.suppression_key:
+                    index.put(
+                        submission_id,
+                        signature_from_bytes(features['minhash']),
+                        fingerprints_from_bytes(features.get('fingerprints') or b''),
+                        term_counts_from_bytes(features['term_counts']),
+                        simhash_from_bytes(features['simhash'])
+                    )
+                else:
+                    resign.append(features)
+                if self._embeddings_current(features):
+                    index.put_sentences(
+                        submission_id,
+                        spans_from_bytes(features['sentence_spans']),
+                        embeddings_from_bytes(features['sentence_embeddings'], features['embedding_dim'])
+                    )
+                elif self.sentence_encoder is not None:
+                    unembedded.append(submission_id)
+                loaded += 1
+
+        if index.synced_at is not None:
+            self._drop_removed(index)
+        if resign:
+            self._resign(index, resign)
+        if stale:
+            loaded += self._rehash(index, stale)
+        if unembedded:
+            self._embed(index, unembedded)
+        self._sync_term_stats(index)
+
+        if index.synced_at is None:
+            logger.info(f"Rebuilt LSH index for assignment {index.assignment_id} from {loaded} stored signatures")
+        index.synced_at = started_at
+
+    @staticmethod
+    def _drop_removed(index: AssignmentIndex):
+        """
+        Discard submissions whose stored features were deleted since they were loaded.
+
+        Deletes leave nothing for the incremental sync to read, so the indexed IDs
+        are reconciled with the stored ones (an index-covered distinct) instead.
+        """
+        stored = SubmissionFeatures._get_collection().distinct(
+            'submission', {'assignment': ObjectId(index.assignment_id)})
+        removed = index.submission_ids() - index.unstored - {str(submission_id) for submission_id in stored}
+        for submission_id in removed:
+            index.discard(submission_id)
+        if removed:
+            logger.info(f"Dropped {len(removed)} deleted submissions from the index of assignment {index.assignment_id}")
+
+    def _shingle_union(self, texts) -> np.ndarray:
+        """Sorted unique shingle hashes of several texts, each shingled on its own."""
+        arrays = [self.detector.shingle_hashes(self.detector.tokenize(text)) for text in texts if text]
+        return np.unique(np.concatenate(arrays)) if arrays else np.empty(0, dtype=np.uint64)
+
+    def _sync_suppression(self, index: AssignmentIndex) -> bool:
+        """
+        Refresh the assignment's boilerplate suppression set.
+
+        The set is the shingles of the question text, the model answer and
+        the standard header fields, plus the shingles whose document frequency
+        crossed the cut-off (recorded in AssignmentShingleStats).
+
+        Returns:
+            bool: True if the set changed, so stored signatures must be rebuilt
+        """
+        assignment = Assignment.objects(id=index.assignment_id).only('question_text', 'model_answer_text').first()
+        source = (assignment.question_text or "", assignment.model_answer_text or "") if assignment else ("", "")
+        if source != index.template_source:
+            index.template_source = source
+            index.template_hashes = self._shingle_union(source)
+
+        stats = AssignmentShingleStats.objects(assignment=index.assignment_id).only(
+            'frequent_shingles', 'sketch_width', 'sketch_depth').first()
+        if index.synced_at is None and (stats is None or stats.sketch_width != self.sketch.width
+                                        or stats.sketch_depth != self.sketch.depth):
+            stats = self._rebuild_shingle_stats(index)
+        frequent = np.asarray(stats.frequent_shingles if stats else [], dtype=np.int64).view(np.uint64)
+
+        suppressed = np.unique(np.concatenate((index.template_hashes, self.header_hashes, frequent)))
+        key = suppression_key(suppressed)
+        if key == index.suppression_key:
+            return False
+        index.suppressed = suppressed
+        index.suppression_key = key
+        return index.synced_at is not None
+
+    def _rebuild_shingle_stats(self, index: AssignmentIndex) -> Optional[AssignmentShingleStats]:
+        """Recount the shingle sketch from stored shingle hashes (missing or resized sketch)."""
+        query = {'assignment': ObjectId(index.assignment_id), 'minhash': {'$exists': True},
+                 'token_version': TOKEN_VERSION}
+        hash_arrays = [
+            hashes_from_bytes(features['shingle_hashes'])
+            for features in iter_projected(SubmissionFeatures, query, ['shingle_hashes'])
+        ]
+        if not hash_arrays:
+            return None
+        size = self.sketch.width * self.sketch.depth
+        counts = np.zeros(size, dtype=np.int64)
+        for hashes in hash_arrays:
+            counts += np.bincount(np.unique(self.sketch.cells(hashes)), minlength=size)
+        cells = np.flatnonzero(counts)
+        sketch = {str(c): int(n) for c, n in zip(cells.tolist(), counts[cells].tolist())}
+
+        # Every shingle of the class is a candidate here; later ones are checked as they arrive
+        candidates = np.unique(np.concatenate(hash_arrays))
+        frequent = self._frequent(candidates, self.sketch.estimate(sketch, candidates), len(hash_arrays))
+
+        AssignmentShingleStats.objects(assignment=index.assignment_id).update_one(
+            upsert=True,
+            set__document_count=len(hash_arrays),
+            set__sketch=sketch,
+            set__sketch_width=self.sketch.width,
+            set__sketch_depth=self.sketch.depth,
+            set__frequent_shingles=frequent.view(np.int64).tolist(),
+            set__updated_at=datetime.utcnow()
+        )
+        logger.info(f"Rebuilt shingle sketch for assignment {index.assignment_id} from {len(hash_arrays)} submissions, "
+                    f"{len(frequent)} frequent shingles")
+        return AssignmentShingleStats.objects(assignment=index.assignment_id).only(
+            'frequent_shingles', 'sketch_width', 'sketch_depth').first()
+
+    def _frequent(self, hashes: np.ndarray, estimates: np.ndarray, document_count: int) -> np.ndarray:
+        """Hashes whose estimated document frequency is above the boilerplate cut-off."""
+        if document_count < self.boilerplate_min_submissions:
+            return np.empty(0, dtype=np.uint64)
+        return hashes[estimates > self.boilerplate_max_df * document_count]
+
+    def _update_shingle_stats(self, assignment_id, added: Optional[np.ndarray], removed: Optional[np.ndarray],
+                              suppressed: Optional[np.ndarray] = None):
+        """
+        Apply one submission's insert/replace/delete to the shingle sketch and
+        record any of its shingles that became frequent enough to suppress
+        (besides those already in ``suppressed``).
+
+        Suppressing a shingle re-signs every submission of the class, so new frequent
+        shingles wait in ``pending_shingles`` until ``resign_batch`` of them accumulated
+        or the oldest waited ``resign_interval``; then they are suppressed together.
+        """
+        if added is None and removed is None:
+            return
+        changes = {}
+        if added is not None:
+            changes.update(self.sketch.increments(added, 1))
+        if removed is not None:
+            for cell, delta in self.sketch.increments(removed, -1).items():
+                changes[cell] = changes.get(cell, 0) + delta
+        increments = {f'inc__sketch__{cell}': delta for cell, delta in changes.items() if delta}
+
+        # Read back only the counters of the added shingles for the heavy-hitter check
+        fields = ['document_count', 'pending_shingles', 'pending_since']
+        if added is not None:
+            fields.extend(f'sketch.{cell}' for cell in self.sketch.increments(added))
+        stats = AssignmentShingleStats.objects(assignment=assignment_id).only(*fields).modify(
+            upsert=True,
+            new=True,
+            inc__document_count=(added is not None) - (removed is not None),
+            set_on_insert__sketch_width=self.sketch.width,
+            set_on_insert__sketch_depth=self.sketch.depth,
+            set__updated_at=datetime.utcnow(),
+            **increments
+        )
+        if stats is None:
+            return
+
+        now = datetime.utcnow()
+        pending = set(stats.pending_shingles or [])
+        pending_since = stats.pending_since
+        if added is not None:
+            frequent = self._frequent(added, self.sketch.estimate(stats.sketch or {}, added), stats.document_count)
+            if suppressed is not None:
+                frequent = frequent[~np.isin(frequent, suppressed)]
+            frequent = set(frequent.view(np.int64).tolist()) - pending
+            if frequent:
+                AssignmentShingleStats.objects(assignment=assignment_id).update_one(
+                    add_to_set__pending_shingles=sorted(frequent),
+                    min__pending_since=now,
+                    set__updated_at=now
+                )
+                pending |= frequent
+                pending_since = pending_since or now
+        # Shingles left pending without a date were added while an earlier batch was promoted
+        if pending and (len(pending) >= self.resign_batch or pending_since is None
+                        or now - pending_since >= self.resign_interval):
+            self._suppress_pending(assignment_id, sorted(pending))
+
+    @staticmethod
+    def _suppress_pending(assignment_id, shingles: List[int]):
+        """Move pending frequent shingles (as int64) into the suppression set, which re-signs the class once."""
+        AssignmentShingleStats.objects(assignment=assignment_id).update_one(
+            add_to_set__frequent_shingles=shingles,
+            pull_all__pending_shingles=shingles,
+            unset__pending_since=True,
+            set__updated_at=datetime.utcnow()
+        )
+        logger.info(f"Suppressing {len(shingles)} more boilerplate shingles in assignment {assignment_id}")
+
+    @staticmethod
+    def _previous_shingle_hashes(previous: Optional[SubmissionFeatures]) -> Optional[np.ndarray]:
+        """Shingle hashes a features document contributed to the sketch, if any."""
+        if previous is None or not previous.shingle_hashes or previous.token_version != TOKEN_VERSION:
+            return None
+        return hashes_from_bytes(previous.shingle_hashes)
+
+    def _resign(self, index: AssignmentIndex, stored: List[Dict]):
+        """
+        Rebuild signatures from stored shingle hashes (raw features documents) after the suppression
+        set changed, in one batch, and store them with one unordered bulk write. Each write is guarded
+        on the features being unchanged since they were read, and bumps ``updated_at`` so the other
+        processes' syncs load the new signatures.
+        """
+        hash_arrays = remove_suppressed([hashes_from_bytes(f['shingle_hashes']) for f in stored], index.suppressed)
+        signatures = self.detector.signatures_from_hashes(hash_arrays)
+        now = datetime.utcnow()
+        operations = []
+        for features, signature in zip(stored, signatures):
+            index.put(
+                str(features['submission']),
+                signature,
+                fingerprints_from_bytes(features.get('fingerprints') or b''),
+                term_counts_from_bytes(features['term_counts']),
+                simhash_from_bytes(features['simhash'])
+            )
+            operations.append(UpdateOne(
+                {'submission': features['submission'], 'updated_at': features.get('updated_at')},
+                {'$set': {'minhash': signature_to_bytes(signature), 'suppression_key': index.suppression_key,
+                          'updated_at': now}}
+            ))
+        SubmissionFeatures._get_collection().bulk_write(operations, ordered=False)
+        logger.info(f"Rebuilt {len(stored)} signatures for assignment {index.assignment_id} without boilerplate")
+
+    @staticmethod
+    def _read_term_stats(assignment_id, fields) -> Optional[Dict]:
+        """The assignment's raw term statistics document with only the given fields (lean read)."""
+        return next(iter(iter_projected(AssignmentTermStats, {'assignment': ObjectId(str(assignment_id))}, fields)), None)
+
+    def _sync_term_stats(self, index: AssignmentIndex):
+        """
+        Reload the assignment's document frequencies if another process changed them. Only the
+        stats version is read otherwise: this process applies its own changes to its copy.
+        """
+        latest = self._read_term_stats(index.assignment_id, ['version', 'tfidf_version', 'n_features'])
+        if (latest is not None and index.document_frequencies is not None
+                and latest.get('version') == index.stats_version):
+            return
+
+        if (latest is None or latest.get('tfidf_version') != TFIDF_VERSION
+                or latest.get('n_features') != self.tfidf.n_features):
+            if latest is None and not index.term_counts:
+                index.document_frequencies = np.zeros(self.tfidf.n_features)
+                index.document_count = 0
+                return
+            self._rebuild_term_stats(index)
+        stats = self._read_term_stats(index.assignment_id, ['version', 'document_count', 'document_frequencies'])
+
+        frequencies = np.zeros(self.tfidf.n_features)
+        stored = stats.get('document_frequencies') or {}
+        if stored:
+            buckets = np.fromiter((int(b) for b in stored), dtype=np.int64, count=len(stored))
+            frequencies[buckets] = list(stored.values())
+        index.document_frequencies = frequencies
+        index.document_count = stats.get('document_count', 0)
+        index.stats_version = stats.get('version')
+
+    def _rebuild_term_stats(self, index: AssignmentIndex):
+        """Recount document frequencies from the loaded term counts (missing or outdated statistics)."""
+        counts = np.zeros(self.tfidf.n_features, dtype=np.int64)
+        for indices, _ in index.term_counts.values():
+            counts[indices] += 1
+        buckets = np.flatnonzero(counts)
+        AssignmentTermStats.objects(assignment=index.assignment_id).update_one(
+            upsert=True,
+            set__document_count=len(index.term_counts),
+            set__document_frequencies={str(b): int(c) for b, c in zip(buckets.tolist(), counts[buckets].tolist())},
+            set__n_features=self.tfidf.n_features,
+            set__tfidf_version=TFIDF_VERSION,
+            inc__version=1,
+            set__updated_at=datetime.utcnow()
+        )
+        logger.info(f"Rebuilt term statistics for assignment {index.assignment_id} from {len(index.term_counts)} submissions")
+
+    def _update_term_stats(self, assignment_id, added: Optional[TermCounts], removed: Optional[TermCounts]):
+        """
+        Apply one submission's insert/replace/delete to the persisted document frequencies, and
+        to this process's copy when no other process changed them since it was loaded.
+        """
+        if added is None and removed is None:
+            return
+        changes = {}
+        if added is not None:
+            changes.update(frequencies_to_dict(added[0], 1))
+        if removed is not None:
+            for bucket, delta in frequencies_to_dict(removed[0], -1).items():
+                changes[bucket] = changes.get(bucket, 0) + delta
+        changes = {bucket: delta for bucket, delta in changes.items() if delta}
+        document_delta = (added is not None) - (removed is not None)
+        increments = {f'inc__document_frequencies__{bucket}': delta for bucket, delta in changes.items()}
+        stats = AssignmentTermStats.objects(assignment=assignment_id).only('version').modify(
+            upsert=True,
+            new=True,
+            inc__document_count=document_delta,
+            inc__version=1,
+            set_on_insert__n_features=self.tfidf.n_features,
+            set_on_insert__tfidf_version=TFIDF_VERSION,
+            set__updated_at=datetime.utcnow(),
+            **increments
+        )
+
+        index = self._indexes.get(str(assignment_id))
+        if index is None:
+            return
+        with index.lock:
+            if index.document_frequencies is None or index.stats_version != stats.version - 1:
+                return
+            for bucket, delta in changes.items():
+                index.document_frequencies[int(bucket)] += delta
+            index.document_count += document_delta
+            index.stats_version = stats.version
+
+    @staticmethod
+    def _previous_term_counts(previous: Optional[SubmissionFeatures]) -> Optional[TermCounts]:
+        """Term counts a features document contributed to the statistics, if any."""
+        if previous is None or not previous.term_counts or previous.tfidf_version != TFIDF_VERSION:
+            return None
+        return term_counts_from_bytes(previous.term_counts)
+
+    def _embeddings_current(self, features: Dict) -> bool:
+        """Whether stored sentence embeddings (of a raw features document) can be used by this process."""
+        return (features.get('sentence_embeddings') is not None
+                and features.get('semantic_version') == SEMANTIC_VERSION
+                and (self.embedding_model is None or features.get('embedding_model') == self.embedding_model))
+
+    def _sentence_features(self, texts: List[str]) -> List[Dict]:
+        """Split texts into sentences and encode all of them in one batch."""
+        spans = [split_sentences(text) for text in texts]
+        sentences = [text[start:end] for text, text_spans in zip(texts, spans) for start, end in text_spans]
+        embeddings = self.sentence_encoder(sentences)
+        results = []
+        offset = 0
+        for text_spans in spans:
+            results.append({
+                'sentence_spans': text_spans,
+                'sentence_embeddings': embeddings[offset:offset + len(text_spans)]
+            })
+            offset += len(text_spans)
+        return results
+
+    def _embed(self, index: AssignmentIndex, submission_ids: List[str]):
+        """Encode the sentences of submissions that have no current embeddings, in one batch."""
+        submissions = self._submission_texts(submission_ids)
+        if not submissions:
+            return
+        computed = self._sentence_features([s.get('ocr_text') or "" for s in submissions])
+        for submission, features in zip(submissions, computed):
+            index.put_sentences(str(submission['_id']), features['sentence_spans'], features['sentence_embeddings'])
+            SubmissionFeatures.objects(submission=submission['_id']).update_one(
+                set__updated_at=datetime.utcnow(), **self._sentence_updates(features)
+            )
+        logger.info(f"Encoded sentences of {len(submissions)} submissions for assignment {index.assignment_id}")
+
+    def _sentence_updates(self, features: Dict) -> Dict:
+        """Update arguments that persist a submission's sentence embeddings."""
+        embeddings = features['sentence_embeddings']
+        return {
+            'set__sentence_spans': spans_to_bytes(features['sentence_spans']),
+            'set__sentence_embeddings': embeddings_to_bytes(embeddings),
+            'set__embedding_model': self.embedding_model,
+            'set__embedding_dim': int(embeddings.shape[1]),
+            'set__semantic_version': SEMANTIC_VERSION
+        }
+
+    def compute_features(self, texts: List[str], suppressed: Optional[np.ndarray] = None,
+                         sentence_features: Optional[List[Optional[Dict]]] = None) -> List[Dict]:
+        """
+        Tokenize, shingle, hash and fingerprint texts exactly once.
+
+        Args:
+            texts (List[str]): Extracted submission texts
+            suppressed (np.ndarray): Sorted boilerplate shingle hashes left out of the signatures
+            sentence_features (List[Dict]): Already computed sentence spans and embeddings per
+                text (e.g. from the content cache), None for texts that still need encoding
+
+        Returns:
+            List[Dict]: 'tokens', 'shingle_hashes' (all of them), 'signature', 'fingerprints',
+            'term_counts' and 'simhash' per text, plus 'sentence_spans' and
+            'sentence_embeddings' when a sentence encoder is set
+        """
+        if suppressed is None:
+            suppressed = np.empty(0, dtype=np.uint64)
+        token_streams = [self.detector.tokenize(text) for text in texts]
+        hash_arrays = [self.detector.shingle_hashes(tokens) for tokens in token_streams]
+        signatures = self.detector.signatures_from_hashes(remove_suppressed(hash_arrays, suppressed))
+        results = [
+            {
+                'tokens': tokens,
+                'shingle_hashes': hashes,
+                'signature': signature,
+                'fingerprints': self.winnower.fingerprints(text),
+                'term_counts': self.tfidf.term_counts(tokens),
+                'simhash': simhash(tokens)
+            }
+            for text, tokens, hashes, signature in zip(texts, token_streams, hash_arrays, signatures)
+        ]
+        if self.sentence_encoder is not None:
+            cached = sentence_features or [None] * len(texts)
+            missing = [text for text, known in zip(texts, cached) if known is None]
+            encoded = iter(self._sentence_features(missing) if missing else [])
+            for features, known in zip(results, cached):
+                features.update(known if known is not None else next(encoded))
+        return results
+
+    @staticmethod
+    def _submission_texts(submission_ids: List[str]) -> List[Dict]:
+        """Raw ``_id``/``ocr_text`` documents of submissions (lean read)."""
+        query = {'_id': {'$in': [ObjectId(sid) for sid in submission_ids]}}
+        return list(iter_projected(Submission, query, ['ocr_text']))
+
+    def _rehash(self, index: AssignmentIndex, submission_ids: List[str]) -> int:
+        """Recompute features written by an older engine in one batch."""
+        submissions = self._submission_texts(submission_ids)
+        if not submissions:
+            return 0
+        computed = self.compute_features([s.get('ocr_text') or "" for s in submissions], index.suppressed)
+        for submission, features in zip(submissions, computed):
+            index.put(str(submission['_id']), features['signature'], features['fingerprints'],
+                      features['term_counts'], features['simhash'])
+            if 'sentence_embeddings' in features:
+                index.put_sentences(str(submission['_id']), features['sentence_spans'], features['sentence_embeddings'])
+            self._store(submission['_id'], index, features)
+        logger.info(f"Rehashed {len(submissions)} outdated signatures for assignment {index.assignment_id}")
+        return len(submissions)
+
+    def _store(self, submission_id, index: AssignmentIndex, features: Dict):
+        """Persist the features of a submission (upsert) and update the term and shingle statistics."""
+        sentence_updates = self._sentence_updates(features) if 'sentence_embeddings' in features else {}
+        previous = SubmissionFeatures.objects(submission=submission_id).modify(
+            upsert=True,
+            new=False,
+            **sentence_updates,
+            set__assignment=ObjectId(index.assignment_id),
+            set__tokens=encode_tokens(features['tokens']),
+            set__shingle_hashes=hashes_to_bytes(features['shingle_hashes']),
+            set__token_version=TOKEN_VERSION,
+            set__minhash=signature_to_bytes(features['signature']),
+            set__num_perm=self.num_perm,
+            set__signature_version=SIGNATURE_VERSION,
+            set__suppression_key=index.suppression_key,
+            set__fingerprints=fingerprints_to_bytes(features['fingerprints']),
+            set__fingerprint_version=FINGERPRINT_VERSION,
+            set__term_counts=term_counts_to_bytes(features['term_counts']),
+            set__tfidf_version=TFIDF_VERSION,
+            set__simhash=simhash_to_bytes(features['simhash']),
+            set__simhash_version=SIMHASH_VERSION,
+            set__updated_at=datetime.utcnow()
+        )
+        self._update_term_stats(index.assignment_id, features['term_counts'], self._previous_term_counts(previous))
+        self._update_shingle_stats(index.assignment_id, features['shingle_hashes'],
+                                   self._previous_shingle_hashes(previous), index.suppressed)
+
+    def add_submission(self, submission) -> Dict:
+        """
+        Compute a submission's features once at extraction time, persist them,
+        query the index and insert the submission.
+
+        Args:
+            submission (Submission): Submission with extracted ``ocr_text``
+
+        Returns:
+            Dict: The computed features plus 'matches', the matching
+            (submission_id, estimated_jaccard) pairs, and 'candidates', the SimHash
+            near duplicates the later stages are limited to (None in small classes);
+            'matches' is empty for texts too short to index. With a sentence encoder,
+            'semantic_matches' lists paraphrased sentence pairs with character offsets
+        """
+        return self.add_submissions([submission])[0]
+
+    def add_submissions(self, submissions, sentence_features: Optional[List[Optional[Dict]]] = None,
+                        unchanged: Optional[List[bool]] = None) -> List[Dict]:
+        """
+        Add several submissions of one assignment with a single index sync and
+        one feature computation (so one sentence-encoder batch).
+
+        Submissions are queried and inserted in order, so each one is compared
+        with the earlier submissions of the batch exactly as if they had been
+        added one at a time. Submissions whose text is unchanged (e.g. re-checked
+        after a later one matched them) are queried with their stored features
+        when those are current, so they are not tokenized, hashed or encoded again.
+
+        Args:
+            submissions (List[Submission]): Submissions of the same assignment with extracted ``ocr_text``
+            sentence_features (List[Dict]): Cached sentence features per submission (see compute_features)
+            unchanged (List[bool]): Whether each submission still has the text its stored features were computed from
+
+        Returns:
+            List[Dict]: One result per submission, as returned by :meth:`add_submission`
+        """
+        if not submissions:
+            return []
+        assignment_id = submissions[0].assignment.id
+        index = self.get(assignment_id)
+        texts = [submission.ocr_text or "" for submission in submissions]
+        indexed = [len(text.strip()) >= MIN_TEXT_LENGTH for text in texts]
+        cached = sentence_features or [None] * len(submissions)
+        unchanged = unchanged or [False] * len(submissions)
+
+        results = []
+        with index.lock:
+            stored = self._stored_features(index, [
+                submission.id for submission, ok, same in zip(submissions, indexed, unchanged) if ok and same
+            ])
+            compute = [ok and str(submission.id) not in stored for submission, ok in zip(submissions, indexed)]
+            computed = iter(self.compute_features(
+                [t for t, needed in zip(texts, compute) if needed],
+                index.suppressed,
+                [c for c, needed in zip(cached, compute) if needed]
+            ))
+            for submission, ok in zip(submissions, indexed):
+                submission_id = str(submission.id)
+                if not ok:
+                    index.discard(submission_id)
+                    previous = SubmissionFeatures.objects(submission=submission.id).modify(
+                        new=False,
+                        unset__tokens=True,
+                        unset__shingle_hashes=True,
+                        unset__minhash=True,
+                        unset__fingerprints=True,
+                        unset__term_counts=True,
+                        unset__simhash=True,
+                        unset__sentence_spans=True,
+                        unset__sentence_embeddings=True,
+                        set__updated_at=datetime.utcnow()
+                    )
+                    self._update_term_stats(assignment_id, None, self._previous_term_counts(previous))
+                    self._update_shingle_stats(assignment_id, None, self._previous_shingle_hashes(previous))
+                    results.append({'matches': []})
+                    continue
+
+                features = stored.get(submission_id) or next(computed)
+                features['candidates'] = self._prefilter(index, submission_id, features['simhash'])
+                features['matches'] = index.query(features['signature'], exclude=submission_id,
+                                                  candidates=features['candidates'])
+                index.put(submission_id, features['signature'], features['fingerprints'],
+                          features['term_counts'], features['simhash'])
+                index.unstored.add(submission_id)
+                if 'sentence_embeddings' in features:
+                    features['semantic_matches'] = self._semantic_matches(index, submission_id, features)
+                    index.put_sentences(submission_id, features['sentence_spans'], features['sentence_embeddings'])
+                results.append(features)
+
+        for submission, features in zip(submissions, results):
+            if 'signature' in features and str(submission.id) not in stored:
+                self._store(submission.id, index, features)
+        # Pick up the document frequencies the batch just wrote
+        with index.lock:
+            index.unstored.difference_update(str(submission.id) for submission in submissions)
+            self._sync_term_stats(index)
+        return results
+
+    def _stored_features(self, index: AssignmentIndex, submission_ids: List) -> Dict[str, Dict]:
+        """
+        Stored features of submissions decoded as compute_features returns them, by submission ID.
+        Features written by an older engine, for other suppressed shingles or without current
+        sentence embeddings are left out, so they are computed again.
+        """
+        if not submission_ids:
+            return {}
+        fields = ('submission', 'tokens', 'token_version', 'shingle_hashes', 'minhash', 'num_perm',
+                  'signature_version', 'suppression_key', 'fingerprints', 'fingerprint_version',
+                  'term_counts', 'tfidf_version', 'simhash', 'simhash_version',
+                  'sentence_spans', 'sentence_embeddings', 'embedding_model', 'embedding_dim', 'semantic_version')
+        query = {'submission': {'$in': [ObjectId(str(sid)) for sid in submission_ids]}, 'minhash': {'$exists': True}}
+        results = {}
+        for features in iter_projected(SubmissionFeatures, query, fields):
+            if (features.get('num_perm') != self.num_perm
+                    or features.get('signature_version') != SIGNATURE_VERSION
+                    or features.get('token_version') != TOKEN_VERSION
+                    or features.get('fingerprint_version') != FINGERPRINT_VERSION
+                    or features.get('tfidf_version') != TFIDF_VERSION
+                    or features.get('simhash_version') != SIMHASH_VERSION
+                    or features.get('suppression_key') != index.suppression_key):
+                continue
+            decoded = {
+                'tokens': decode_tokens(features['tokens']),
+                'shingle_hashes': hashes_from_bytes(features['shingle_hashes']),
+                'signature': signature_from_bytes(features['minhash']),
+                'fingerprints': fingerprints_from_bytes(features.get('fingerprints') or b''),
+                'term_counts': term_counts_from_bytes(features['term_counts']),
+                'simhash': simhash_from_bytes(features['simhash'])
+            }
+            if self.sentence_encoder is not None:
+                if not self._embeddings_current(features):
+                    continue
+                decoded['sentence_spans'] = spans_from_bytes(features['sentence_spans'])
+                decoded['sentence_embeddings'] = embeddings_from_bytes(features['sentence_embeddings'],
+                                                                       features['embedding_dim'])
+            results[str(features['submission'])] = decoded
+        return results
+
+    def _semantic_matches(self, index: AssignmentIndex, submission_id: str, features: Dict) -> List[Dict]:
+        """Sentence pairs between a submission and the rest of the class that are paraphrases of each other."""
+        if index.sentences is None:
+            return []
+        spans = features['sentence_spans']
+        return [
+            {
+                'submission_id': other_id,
+                'sentence': position,
+                'similarity': round(score, 4),
+                'source_start': spans[position][0],
+                'source_end': spans[position][1],
+                'target_start': index.sentence_spans[other_id][row][0],
+                'target_end': index.sentence_spans[other_id][row][1]
+            }
+            for position, other_id, row, score in index.sentences.query(
+                features['sentence_embeddings'], threshold=self.semantic_threshold, exclude=submission_id
+            )
+        ]
+
+    def _prefilter(self, index: AssignmentIndex, submission_id: str, simhash_value: int) -> Optional[List[str]]:
+        """
+        SimHash near duplicates of a submission in a large class.
+
+        Returns None for classes below ``prefilter_min_submissions``, where
+        every stage compares against the whole class.
+        """
+        if len(index.signatures) < self.prefilter_min_submissions:
+            return None
+        return [sid for sid, _ in index.simhashes.query(simhash_value, exclude=submission_id)]
+
+    def stored_tokens(self, assignment_id, exclude=None) -> List[Tuple[str, List[str]]]:
+        """
+        Read the stored token streams of an assignment's submissions.
+
+        Args:
+            assignment_id: Assignment to read
+            exclude: Submission ID to leave out
+
+        Returns:
+            List[Tuple[str, List[str]]]: (submission_id, tokens) pairs
+        """
+        self.get(assignment_id)  # brings outdated token streams up to date
+        query = {'assignment': ObjectId(str(assignment_id)), 'tokens': {'$exists': True}}
+        if exclude is not None:
+            query['submission'] = {'$ne': ObjectId(str(exclude))}
+        return [
+            (str(features['submission']), decode_tokens(features['tokens']))
+            for features in iter_projected(SubmissionFeatures, query, ['submission', 'tokens'])
+        ]
+
+    def clusters(self, assignment_id, threshold: Optional[float] = None) -> List[Dict]:
+        """
+        Group an assignment's stored signatures into collusion clusters.
+
+        The LSH bands are rebuilt from the in-memory signature matrix for the
+        requested threshold, so trying another threshold never rehashes text.
+        The resulting edges are merged with union-find.
+
+        Args:
+            assignment_id: Assignment to cluster
+            threshold (float): Jaccard threshold to cluster at (defaults to the index threshold)
+
+        Returns:
+            List[Dict]: Clusters as returned by :func:`build_clusters`
+        """
+        index = self.get(assignment_id)
+        with index.lock:
+            ids, signatures = index.signature_matrix()
+            threshold = index.threshold if threshold is None else threshold
+        edges = [(ids[i], ids[j], score) for i, j, score in banded_pairs(signatures, threshold)]
+        return build_clusters(edges)
+
+    def set_threshold(self, threshold: float):
+        """
+        Change the copy-detection threshold for new and already loaded assignments.
+
+        Loaded indexes re-band their in-memory signatures; nothing is rehashed.
+        """
+        with self._lock:
+            self.threshold = threshold
+            self.detector.update_thresholds(exact=threshold)
+            indexes = list(self._indexes.values())
+        for index in indexes:
+            with index.lock:
+                index.rethreshold(threshold)
+
+    def matching_passages(self, assignment_id, source_id, target_id, sync: bool = True) -> List[Dict]:
+        """
+        Locate the passages of one submission that also appear in another.
+
+        Args:
+            assignment_id: Assignment both submissions belong to
+            source_id: Submission whose passages are reported
+            target_id: Submission searched for those passages
+            sync (bool): Load other processes' writes first
+
+        Returns:
+            List[Dict]: Passages with character offsets into both texts
+        """
+        index = self.get(assignment_id, sync=sync)
+        with index.lock:
+            return index.fingerprints.matching_passages(str(source_id), str(target_id))
+
+    def tfidf_similarities(self, assignment_id, submission_id, term_counts: TermCounts,
+                           candidates: Optional[List[str]] = None, exclude: Optional[Set[str]] = None,
+                           sync: bool = True) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        TF-IDF cosine similarity of one submission against every other stored submission.
+
+        The stored term counts are kept as one sparse matrix and weighted with
+        the assignment's current IDF, so a check is one sparse mat-vec product
+        rather than a vectorizer refit over the whole assignment.
+
+        Args:
+            assignment_id: Assignment to compare within
+            submission_id: Submission being checked (left out of the results)
+            term_counts (TermCounts): Its hashed term counts
+            candidates (List[str]): Only score these submissions (None scores all)
+            exclude (Set[str]): Submissions left out of the results
+            sync (bool): Load other processes' writes first
+
+        Returns:
+            Tuple[List[Tuple[str, float]], int]: (submission_id, similarity) pairs ordered
+            by submission ID, and the number of distinct hashed terms in the assignment
+        """
+        index = self.get(assignment_id, sync=sync)
+        with index.lock:
+            ids, matrix = index.term_matrix(self.tfidf)
+            if candidates is not None:
+                wanted = set(candidates)
+                rows = [row for row, sid in enumerate(ids) if sid in wanted]
+                ids, matrix = [ids[row] for row in rows], matrix[rows]
+            idf = self.tfidf.idf(index.document_frequencies, index.document_count)
+            vocabulary_size = int(np.count_nonzero(index.document_frequencies))
+        scores = self.tfidf.similarities(term_counts, matrix, idf)
+        exclude = {str(submission_id)} | set(exclude or ())
+        return [(sid, float(score)) for sid, score in zip(ids, scores) if sid not in exclude], vocabulary_size
+
+    def run_removal(self, payload):
+        """Job handler: remove a deleted submission (see remove_submission)."""
+        self.remove_submission(payload['assignment_id'], payload['submission_id'])
+
+    def remove_submission(self, assignment_id, submission_id):
+        """Delete a submission's stored features and drop it from the local index."""
+        previous = SubmissionFeatures.objects(submission=submission_id).modify(remove=True)
+        self._update_term_stats(assignment_id, None, self._previous_term_counts(previous))
+        self._update_shingle_stats(assignment_id, None, self._previous_shingle_hashes(previous))
+        index = self._indexes.get(str(assignment_id))
+        if index is not None:
+            with index.lock:
+                index.discard(str(submission_id))
+
+
+# Create a global instance
+assignment_indexes = AssignmentIndexRegistry(
+    simhash_distance=Config.SIMHASH_MAX_DISTANCE,
+    prefilter_min_submissions=Config.SIMHASH_PREFILTER_MIN_SUBMISSIONS,
+    semantic_threshold=Config.SEMANTIC_SIMILARITY_THRESHOLD,
+    boilerplate_max_df=Config.BOILERPLATE_MAX_DF,
+    boilerplate_min_submissions=Config.BOILERPLATE_MIN_SUBMISSIONS,
+    resign_batch=Config.BOILERPLATE_RESIGN_BATCH,
+    resign_interval_seconds=Config.BOILERPLATE_RESIGN_INTERVAL_SECONDS
+)
@@ -0,0 +1,179 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config import Config
+from models.analysis_job import AnalysisJob
+from models.submission import Submission
+from models.submission_features import SubmissionFeatures
+from ml_models.boilerplate import remove_suppressed
+from ml_models.cheating_detector import CheatingDetector
+from ml_models.text_features import TOKEN_VERSION, decode_tokens, hashes_from_bytes
+from utils.assignment_index import assignment_indexes
+from utils.job_queue import enqueue_propagation, start_class_analysis
+from utils.lean_reads import iter_projected
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ClassAnalyzer:
+    """
+    Runs CheatingDetector.analyze_submissions over every completed submission
+    of an assignment as a background job.
+
+    The analysis reuses the token streams and shingle hashes stored at
+    extraction time, so no text is tokenized again, and all resulting
+    plagiarism flags are written with one guarded bulk operation.
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = workers
+
+    def start(self, assignment, user=None) -> AnalysisJob:
+        """Queue an analysis of an assignment (see utils.job_queue.start_class_analysis)."""
+        return start_class_analysis(assignment, user)
+
+    def run_job(self, payload):
+        """Job handler: run a queued analysis (failures are recorded on the AnalysisJob)."""
+        self._run(payload['analysis_job_id'])
+
+    def _progress(self, job_id, stage: str, progress: int):
+        AnalysisJob.objects(id=job_id).update_one(set__stage=stage, set__progress=progress)
+
+    def _load_submissions(self, assignment_id) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """
+        Completed submissions with their stored tokens and (boilerplate-free) shingle hashes,
+        and the write guard of each one: its file, stage stamps and plagiarism result as read.
+        """
+        guards = {
+            str(doc['_id']): {
+                '_id': doc['_id'],
+                'content_sha256': doc.get('content_sha256'),
+                'stage_stamps': doc.get('stage_stamps'),
+                'plagiarism_result': doc.get('plagiarism_result')
+            }
+            for doc in iter_projected(
+                Submission, {'assignment': ObjectId(str(assignment_id)), 'processing_status': 'Completed'},
+                ['content_sha256', 'stage_stamps', 'plagiarism_result']
+            )
+        }
+        submission_ids = [guard['_id'] for guard in guards.values()]
+        suppressed = assignment_indexes.get(assignment_id).suppressed
+
+        submissions = []
+        outdated = []
+        stored = iter_projected(
+            SubmissionFeatures,
+            {'submission': {'$in': submission_ids}, 'minhash': {'$exists': True}},
+            ['submission', 'tokens', 'shingle_hashes', 'token_version']
+        )
+        for features in stored:
+            if features.get('token_version') != TOKEN_VERSION:
+                outdated.append(features['submission'])
+                continue
+            submissions.append({
+                'id': str(features['submission']),
+                'tokens': decode_tokens(features['tokens']),
+                'shingle_hashes': remove_suppressed([hashes_from_bytes(features['shingle_hashes'])], suppressed)[0]
+            })
+        # Submissions hashed by an older tokenizer are analyzed from their text
+        for submission in iter_projected(Submission, {'_id': {'$in': outdated}}, ['ocr_text']):
+            submissions.append({'id': str(submission['_id']), 'text': submission.get('ocr_text') or ""})
+
+        submissions.sort(key=lambda sub: sub['id'])
+        return submissions, guards
+
+    def _save_flags(self, job_id, result: Dict, guards: Dict[str, Dict]) -> int:
+        """
+        Flag every submission in a cluster with one unordered bulk write, as a 'class_analysis'
+        plagiarism signal that later re-grades keep. Each write is guarded on the state the
+        analysis read, so a submission re-uploaded or re-processed since is left to its own job.
+        Submissions that were not plagiarized before are queued for re-grading.
+
+        Returns:
+            int: Number of submissions flagged
+        """
+        operations = []
+        changed = []
+        for cluster in result['clusters']:
+            for submission_id in cluster['submission_ids']:
+                guard = guards[submission_id]
+                if guard['plagiarism_result'] != 'found':
+                    changed.append(submission_id)
+                operations.append(UpdateOne(
+                    guard,
+                    {'$set': {
+                        'plagiarism_result': 'found',
+                        'flagged_by_peer': True,
+                        'plagiarism_details.class_analysis': {
+                            'job_id': str(job_id),
+                            'cluster_id': cluster['cluster_id'],
+                            'cluster_size': cluster['size'],
+                            'max_similarity': cluster['max_similarity'],
+                            'peers': [sid for sid in cluster['submission_ids'] if sid != submission_id]
+                        }
+                    }, '$addToSet': {'plagiarism_signals': 'class_analysis'}}
+                ))
+        if not operations:
+            return 0
+        flagged = Submission._get_collection().bulk_write(operations, ordered=False).matched_count
+        if flagged < len(operations):
+            logger.info(f"Class analysis {job_id}: {len(operations) - flagged} submissions changed "
+                        f"since they were analyzed and were not flagged")
+        # Their grade stamp no longer matches the plagiarism result, so only the grade stage reruns
+        if changed:
+            enqueue_propagation(changed)
+        return flagged
+
+    def _run(self, job_id):
+        """Load, analyze and flag, recording progress on the job."""
+        job = AnalysisJob.objects(id=job_id).first()
+        if job is None:
+            return
+        try:
+            AnalysisJob.objects(id=job_id).update_one(
+                set__status='Running', set__started_at=datetime.utcnow(), set__stage='loading', set__progress=0
+            )
+            assignment_id = job.assignment.id
+            submissions, guards = self._load_submissions(assignment_id)
+
+            self._progress(job_id, 'analyzing', 20)
+            detector = CheatingDetector(num_perm=assignment_indexes.num_perm,
+                                        exact_threshold=assignment_indexes.threshold)
+            result = detector.analyze_submissions(submissions, workers=self.workers) if submissions else {
+                'clusters': [], 'statistics': {'total_submissions': 0}
+            }
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+
+            self._progress(job_id, 'saving', 80)
+            flagged = self._save_flags(job_id, result, guards)
+
+            AnalysisJob.objects(id=job_id).update_one(
+                set__status='Completed',
+                unset__active=True,
+                set__stage=None,
+                set__progress=100,
+                set__submission_count=len(submissions),
+                set__flagged_count=flagged,
+                set__statistics=result['statistics'],
+                set__clusters=result['clusters'],
+                set__finished_at=datetime.utcnow()
+            )
+            logger.info(f"Class analysis {job_id} of assignment {assignment_id}: "
+                        f"{len(submissions)} submissions, {flagged} flagged")
+
+        except Exception as e:
+            logger.error(f"Error in class analysis {job_id}: {str(e)}")
+            AnalysisJob.objects(id=job_id).update_one(
+                set__status='Failed', unset__active=True, set__error=str(e), set__finished_at=datetime.utcnow()
+            )
+
+
+# Create a global instance
+class_analyzer = ClassAnalyzer(workers=Config.CLASS_ANALYSIS_WORKERS)
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from mongoengine.errors import NotUniqueError
+
+from config import Config
+from models.content_cache_entry import ContentCacheEntry
+from models.content_cache_stats import ContentCacheStats
+from ml_models.sentence_index import (
+    SEMANTIC_VERSION, embeddings_from_bytes, embeddings_to_bytes, spans_from_bytes, spans_to_bytes
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    """Hex SHA-256 of an uploaded file's bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ContentCache:
+    """
+    Content-addressed cache of extracted text and sentence embeddings.
+
+    A byte-identical upload (a student re-uploading the same PDF, or the same
+    file submitted twice) is looked up by its SHA-256 and skips OCR and
+    sentence encoding entirely. Hits are counted on the entries and misses on
+    one counter document, so the hit rate is shared by every worker process.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def get_many(self, hashes: List[str]) -> Dict[str, ContentCacheEntry]:
+        """
+        Look several hashes up with one query, counting a hit per lookup answered
+        and a miss per lookup that found no entry.
+
+        Args:
+            hashes (List[str]): SHA-256 hex digests (empty values are skipped)
+
+        Returns:
+            Dict[str, ContentCacheEntry]: Entries by hash
+        """
+        wanted = Counter(h for h in hashes if h)
+        if not self.enabled or not wanted:
+            return {}
+        entries = {entry.sha256: entry for entry in ContentCacheEntry.objects(sha256__in=list(wanted))}
+        # One update per distinct lookup count (normally just one)
+        by_count = {}
+        for sha256 in entries:
+            by_count.setdefault(wanted[sha256], []).append(sha256)
+        for count, found in by_count.items():
+            ContentCacheEntry.objects(sha256__in=found).update(
+                inc__hits=count, set__last_hit_at=datetime.utcnow()
+            )
+        misses = sum(count for sha256, count in wanted.items() if sha256 not in entries)
+        if misses:
+            ContentCacheStats.objects(key='global').update_one(
+                upsert=True, inc__misses=misses, set__last_miss_at=datetime.utcnow()
+            )
+        return entries
+
+    def put(self, sha256: str, text: str):
+        """Cache the text extracted from a file (the first writer wins)."""
+        if not self.enabled or not sha256:
+            return
+        try:
+            ContentCacheEntry(sha256=sha256, text=text).save()
+        except NotUniqueError:
+            pass
+
+    def put_sentences(self, sha256: str, features: Dict, model_name: str):
+        """Cache the sentence spans and embeddings computed for a file's text."""
+        if not self.enabled or not sha256 or 'sentence_embeddings' not in features:
+            return
+        embeddings = features['sentence_embeddings']
+        ContentCacheEntry.objects(sha256=sha256).update_one(
+            set__sentence_spans=spans_to_bytes(features['sentence_spans']),
+            set__sentence_embeddings=embeddings_to_bytes(embeddings),
+            set__embedding_model=model_name,
+            set__embedding_dim=int(embeddings.shape[1]),
+            set__semantic_version=SEMANTIC_VERSION
+        )
+
+    @staticmethod
+    def sentence_features(entry: Optional[ContentCacheEntry], model_name: Optional[str]) -> Optional[Dict]:
+        """Cached sentence features of an entry, if they were made by this model and engine version."""
+        if (entry is None or entry.sentence_embeddings is None or model_name is None
+                or entry.embedding_model != model_name or entry.semantic_version != SEMANTIC_VERSION):
+            return None
+        return {
+            'sentence_spans': spans_from_bytes(entry.sentence_spans),
+            'sentence_embeddings': embeddings_from_bytes(entry.sentence_embeddings, entry.embedding_dim)
+        }
+
+    def metrics(self) -> Dict:
+        """Hit and miss counts across all worker processes."""
+        totals = list(ContentCacheEntry.objects.aggregate([
+            {'$group': {'_id': None, 'entries': {'$sum': 1}, 'hits': {'$sum': '$hits'}}}
+        ]))
+        entries = totals[0]['entries'] if totals else 0
+        hits = totals[0]['hits'] if totals else 0
+        stats = ContentCacheStats.objects(key='global').only('misses').first()
+        misses = stats.misses if stats else 0
+        lookups = hits + misses
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Create a global instance
+content_cache = ContentCache(enabled=Config.CONTENT_CACHE_ENABLED)
@@ -2,78 +2,502 @@ import os
 import io
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
-import threading
+from bson import ObjectId
+from pymongo import UpdateOne
 from models.submission import Submission
 from ml_models.ocr_processor import OCRProcessor
 from ml_models.similarity_checker import SimilarityChecker
+from ml_models.grading import content_quality, grade_batch
 import tempfile
 from ml_models.similarity_checker import SimilarityChecker
-from ml_models.cheating_detector import CheatingDetector
+from utils.assignment_index import assignment_indexes
+from utils.content_cache import content_cache, content_hash
+from utils.reference_corpus import reference_corpus
+from ml_models.tokenizer import tokenizer
+from config import Config
+from models.assignment import Assignment
+from utils.job_queue import enqueue_propagation, enqueue_submission
+from utils.lean_reads import iter_projected
+from utils.match_edges import match_edges
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pipeline stage versions; bumping one recomputes that stage (and the stages after it)
+# for every submission the next time it is processed
+EXTRACT_VERSION = 1
+PLAGIARISM_VERSION = 2  # 2: stores plagiarism_signals and tfidf_max_similarity
+SIMILARITY_VERSION = 2  # 2: stores content_quality
+GRADE_VERSION = 1
+
+# TF-IDF cosine similarity at which two submissions are plagiarized (lowered from 70% to catch more
+# cases); an assignment's tfidf_threshold overrides it
+TFIDF_THRESHOLD = 0.6
+
+# Share of the correctness score taken off plagiarized answers, per professor-chosen severity
+SEVERITY_PENALTIES = {'easy': 0.10, 'medium': 0.25, 'hard': 0.50}
+
+
+def stage_stamp(version, *inputs):
+    """Stamp identifying a stage's output: its version plus a digest of its inputs."""
+    return f"{version}:{content_hash(repr(inputs).encode())[:16]}"
+
+
+def plagiarism_threshold(assignment):
+    """TF-IDF plagiarism threshold of an assignment."""
+    threshold = assignment.tfidf_threshold if assignment else None
+    return threshold if threshold is not None else TFIDF_THRESHOLD
+
+
+def severity_penalty(severity):
+    """Share of the score taken off a plagiarized answer at a severity (medium when unset)."""
+    return SEVERITY_PENALTIES.get(severity or 'medium', SEVERITY_PENALTIES['medium'])
+
+
+def write_guard(submission):
+    """
+    Filter that matches a submission only while it still holds the file, stage stamps and
+    plagiarism result it was loaded with, so a write based on that state never overwrites
+    a newer upload, a concurrent job's results or a flag set by a peer in the meantime.
+    """
+    stamps = submission.stage_stamps or {}
+    return {
+        '_id': submission.id,
+        'content_sha256': submission.content_sha256,
+        # A submission that was never processed may store no stamps at all
+        'stage_stamps': stamps if stamps else {'$in': [None, {}]},
+        'plagiarism_result': submission.plagiarism_result
+    }
+
+
+def flag_operation(submission_id, newly_flagged=False):
+    """
+    Bulk-write operation flagging a submission matched by a later one (idempotent:
+    replaying it changes nothing). A newly flagged submission also loses its
+    plagiarism stamp, so its propagation re-check runs that stage again.
+    """
+    update = {'$set': {'plagiarism_result': 'found', 'flagged_by_peer': True}}
+    if newly_flagged:
+        update['$unset'] = {'stage_stamps.plagiarism': ''}
+    return UpdateOne({'_id': ObjectId(submission_id)}, update)
+
+
+def keeps_plagiarism(row):
+    """
+    Whether a stored submission stays plagiarized whatever the TF-IDF threshold: a class
+    analysis or a later submission flagged it, or a detector other than TF-IDF matched it.
+    """
+    signals = row.get('plagiarism_signals') or []
+    return bool(row.get('flagged_by_peer')) or any(signal != 'tfidf' for signal in signals)
+
+
+def model_answer_digest(assignment):
+    """Digest of an assignment's model answer text ('' when there is none)."""
+    text = assignment.model_answer_text if assignment else None
+    return content_hash(text.encode())[:16] if text else ''
+
 class DocumentProcessor:
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english')
+        self.vectorizer = TfidfVectorizer(analyzer=tokenizer.tokenize)
         self.ocr = OCRProcessor()  # Assumes env vars for credentials/processor
         self.similarity_checker = SimilarityChecker()  # Add similarity checker
+        # Batch-encode sentences for cross-submission paraphrase matching
+        assignment_indexes.set_sentence_encoder(
+            self.similarity_checker.encode_sentences, self.similarity_checker.model_name
+        )
     
     def process_submission_async(self, submission_id):
-        """Start asynchronous processing of a submission"""
-        thread = threading.Thread(target=self._process_submission, args=(submission_id,))
-        thread.start()
+        """Queue a submission for processing by the job workers (at most one pending job per submission)"""
+        return enqueue_submission(submission_id)
+    
+    def _run_job(self, payload):
+        """Job handler: errors propagate so the queue retries the submission"""
+        self._process_submission(payload['submission_id'], raise_errors=True)
+
+    def _extract_assignment_text(self, payload):
+        """Job handler: OCR an assignment's question and model answer PDFs"""
+        assignment = Assignment.objects(id=payload['assignment_id']).first()
+        if not assignment:
+            logger.error(f"Assignment {payload['assignment_id']} not found")
+            return
+
+        updates = {}
+        if assignment.question_file:
+            updates['set__question_text'] = self._extract_text_from_pdf(assignment.question_file.read())
+        if assignment.model_answer_file:
+            updates['set__model_answer_text'] = self._extract_text_from_pdf(assignment.model_answer_file.read())
+        if updates:
+            Assignment.objects(id=assignment.id).update_one(**updates)
+        logger.info(f"Extracted question and model answer text of assignment {assignment.id}")
+        
+        # A new model answer changes every grade; only the grade stage reruns
+        if updates.get('set__model_answer_text', assignment.model_answer_text) != assignment.model_answer_text:
+            processed = Submission.objects(assignment=assignment.id, processing_status='Completed').scalar('id')
+            for submission_id in processed:
+                enqueue_submission(submission_id, assignment.id)
+    
+    def _propagate_matches(self, payload):
+        """
+        Job handler: re-check and re-grade earlier submissions newly flagged by a later one, as one
+        batch. Only their plagiarism and grade stages run again, from the stored text and features
+        (no OCR or encoding); failed submissions make the job retry.
+        """
+        errors = [error for error in self._process_submissions(payload['submission_ids']) if error is not None]
+        if errors:
+            raise errors[0]
+    
+    def _regrade_assignment(self, payload):
+        """Job handler: re-grade an assignment after its threshold or severities changed"""
+        self.regrade_assignment(payload['assignment_id'])
+    
+    def regrade_assignment(self, assignment_id):
+        """
+        Recompute plagiarism results, labels and scores of every completed submission of an
+        assignment from their stored raw scores, with one vectorized grading pass and one bulk
+        write (no text, model or index is loaded).
+        
+        The TF-IDF signal is re-decided against the assignment's current threshold; the other
+        detectors' findings, class analysis flags and flags set by other submissions are kept.
+        Submissions processed before their raw scores were stored are queued for processing instead.
+        
+        Returns a summary: submissions re-graded, changed and queued.
+        """
+        assignment = Assignment.objects(id=assignment_id).only('id', 'tfidf_threshold').first()
+        if not assignment:
+            logger.error(f"Assignment {assignment_id} not found")
+            return None
+        threshold = plagiarism_threshold(assignment)
+        
+        fields = ['answer_similarity', 'content_quality', 'word_count', 'tfidf_max_similarity', 'plagiarism_signals',
+                  'flagged_by_peer', 'plagiarism_severity', 'plagiarism_result', 'stage_stamps',
+                  'correctness_score', 'correctness_label', 'final_score']
+        rows, outdated = [], []
+        for row in iter_projected(Submission, {'assignment': assignment.id, 'processing_status': 'Completed'}, fields):
+            stamps = row.get('stage_stamps') or {}
+            if (stamps.get('plagiarism', '').startswith(f"{PLAGIARISM_VERSION}:")
+                    and stamps.get('similarity', '').startswith(f"{SIMILARITY_VERSION}:")):
+                rows.append(row)
+            else:
+                outdated.append(row['_id'])
+        for submission_id in outdated:
+            enqueue_submission(submission_id, assignment.id)
+        
+        def column(name):
+            return np.array([np.nan if row.get(name) is None else row[name] for row in rows], dtype=np.float64)
+        
+        tfidf = np.nan_to_num(column('tfidf_max_similarity'))
+        other_signals = np.array([keeps_plagiarism(row) for row in rows], dtype=bool)
+        plagiarized = other_signals | (tfidf >= threshold)
+        severities = [row.get('plagiarism_severity') for row in rows]
+        scores, final_scores, labels = grade_batch(
+            column('answer_similarity'), column('content_quality'), np.nan_to_num(column('word_count')),
+            plagiarized, np.array([severity_penalty(severity) for severity in severities])
+        )
+        
+        operations = []
+        for i, row in enumerate(rows):
+            result = 'found' if plagiarized[i] else 'not found'
+            updates = {
+                'plagiarism_result': result,
+                'correctness_score': float(scores[i]),
+                'correctness_label': labels[i],
+                'final_score': float(final_scores[i])
+            }
+            if all(row.get(name) == value for name, value in updates.items()):
+                continue
+            stamps = row['stage_stamps']
+            updates['stage_stamps.grade'] = stage_stamp(GRADE_VERSION, stamps['similarity'], result, severities[i])
+            # Same guard as processing: a submission changed meanwhile is left to that job
+            operations.append(UpdateOne(
+                {'_id': row['_id'], 'stage_stamps': stamps, 'plagiarism_result': row.get('plagiarism_result')},
+                {'$set': updates}
+            ))
+        if operations:
+            Submission._get_collection().bulk_write(operations, ordered=False)
+        match_edges.reflag(assignment.id, threshold)
+        
+        logger.info(f"Re-graded {len(rows)} submissions of assignment {assignment.id} "
+                    f"({len(operations)} changed, {len(outdated)} queued for processing)")
+        return {'regraded': len(rows), 'changed': len(operations), 'queued': len(outdated)}
     
-    def _process_submission(self, submission_id):
+    def _run_batch(self, payloads):
+        """Batch job handler: process submissions of one assignment together, one error per payload"""
+        return self._process_submissions([payload['submission_id'] for payload in payloads])
+    
+    def _process_submission(self, submission_id, raise_errors=False):
         """Process a submission with text extraction and plagiarism checking"""
         try:
-            # Get the submission
-            submission = Submission.objects(id=submission_id).first()
-            if not submission:
-                logger.error(f"Submission {submission_id} not found")
-                return
-            
-            # Update status to Processing
-            submission.processing_status = 'Processing'
-            submission.save()
-            
-            # Extract text from PDF
-            pdf_data = submission.answer_file.read()
-            extracted_text = self._extract_text_from_pdf(pdf_data)
-            submission.ocr_text = extracted_text
-
-            # Check for plagiarism first
-            plagiarism_result, plagiarism_details = self._check_plagiarism(submission)
-            submission.plagiarism_result = plagiarism_result
-            submission.plagiarism_details = plagiarism_details
-            
-            # Calculate correctness score considering plagiarism
-            assignment = submission.assignment
-            correctness_score, correctness_label = self._calculate_correctness_score(extracted_text, assignment, plagiarism_result)
-            submission.correctness_score = correctness_score
-            submission.correctness_label = correctness_label
-            
-            # Calculate final score (now correctness already considers plagiarism)
-            final_score = correctness_score  # No additional penalty needed
-            submission.final_score = final_score
-            
-            # Update status to Completed
-            submission.processing_status = 'Completed'
-            submission.save()
-            
-            logger.info(f"Successfully processed submission {submission_id}")
-            
+            error = self._process_submissions([submission_id])[0]
         except Exception as e:
             logger.error(f"Error processing submission {submission_id}: {str(e)}")
+            error = e
+        if error is not None and raise_errors:
+            raise error
+    
+    def _process_submissions(self, submission_ids):
+        """
+        Run the extract, plagiarism and grade stages for submissions.
+        
+        Each stage persists its outputs with a stamp of its version and inputs, and
+        only stages whose stamp is out of date run: a new file runs all of them, a
+        new model answer re-grades, and a new severity only re-derives final_score.
+        Submissions of one assignment share a single index sync, one sentence-encoder
+        batch and one grading batch, and all results are written with one bulk write.
+        Returns one error per submission ID (None on success).
+        """
+        submission_ids = [str(sid) for sid in submission_ids]
+        # The previous plagiarism_details are rewritten rather than read, so they are not loaded
+        submissions = {
+            str(s.id): s
+            for s in Submission.objects(id__in=submission_ids).exclude('plagiarism_details').no_dereference()
+        }
+        for submission_id in submission_ids:
+            if submission_id not in submissions:
+                logger.error(f"Submission {submission_id} not found")
+        if not submissions:
+            return [None] * len(submission_ids)
+        
+        # Update status to Processing
+        Submission.objects(id__in=list(submissions)).update(set__processing_status='Processing')
+        assignments = {
+            assignment.id: assignment
+            for assignment in Assignment.objects(id__in=list({s.assignment.id for s in submissions.values()}))
+        }
+        
+        errors = {}
+        results = {submission_id: {} for submission_id in submissions}
+        stamps = {submission_id: dict(s.stage_stamps or {}) for submission_id, s in submissions.items()}
+        guards = {submission_id: write_guard(s) for submission_id, s in submissions.items()}
+        
+        # Extract stage: text from the PDF, unless the stored text belongs to the current file.
+        # Files seen before (same SHA-256) reuse their extracted text and sentence embeddings
+        extract = [
+            s for s in submissions.values()
+            if s.ocr_text is None or stamps[str(s.id)].get('extract') != stage_stamp(EXTRACT_VERSION, s.content_sha256)
+        ]
+        extracted = {str(s.id) for s in extract}
+        cached = content_cache.get_many([s.content_sha256 for s in extract])
+        if cached:
+            logger.info(f"Content cache hit for {len(cached)} of {len(extract)} submissions")
+        texts = {}
+        for submission in extract:
+            submission_id = str(submission.id)
+            try:
+                entry = cached.get(submission.content_sha256)
+                if entry is not None:
+                    submission.ocr_text = entry.text or ""
+                elif submission.content_sha256 in texts:
+                    # Same file as an earlier submission of this batch
+                    submission.ocr_text = texts[submission.content_sha256]
+                else:
+                    pdf_data = submission.answer_file.read()
+                    if not submission.content_sha256:
+                        submission.content_sha256 = content_hash(pdf_data)
+                    submission.ocr_text = self._extract_text_from_pdf(pdf_data)
+                    texts[submission.content_sha256] = submission.ocr_text
+                    if submission.ocr_text:
+                        content_cache.put(submission.content_sha256, submission.ocr_text)
+                stamps[submission_id]['extract'] = stage_stamp(EXTRACT_VERSION, submission.content_sha256)
+                # Flags from peers matched the previous file
+                submission.flagged_by_peer = False
+                results[submission_id].update(content_sha256=submission.content_sha256, ocr_text=submission.ocr_text,
+                                              flagged_by_peer=False)
+            except Exception as e:
+                logger.error(f"Error processing submission {submission_id}: {str(e)}")
+                errors[submission_id] = e
+        
+        # Plagiarism stage: for new text, grouped by assignment
+        groups = {}
+        for submission_id, submission in submissions.items():
+            if submission_id in errors:
+                continue
+            submission.assignment = assignments.get(submission.assignment.id)
+            if submission.assignment is None:
+                errors[submission_id] = ValueError(f"Assignment of submission {submission_id} not found")
+            elif stamps[submission_id].get('plagiarism') != stage_stamp(PLAGIARISM_VERSION, stamps[submission_id]['extract']):
+                groups.setdefault(submission.assignment.id, []).append(submission)
+        
+        flags = set()
+        edges = {}
+        for assignment_id, group in groups.items():
             try:
-                submission.processing_status = 'Failed'
-                submission.processing_error = str(e)
-                submission.save()
-            except Exception as save_error:
-                logger.error(f"Error updating submission status: {str(save_error)}")
+                # Tokenize, hash and index the texts once; every detector reads these stored features
+                known = [
+                    content_cache.sentence_features(cached.get(s.content_sha256), assignment_indexes.embedding_model)
+                    for s in group
+                ]
+                # Text that was not extracted again (e.g. a propagation re-check) reuses its stored features
+                unchanged = [str(s.id) not in extracted for s in group]
+                features_list = assignment_indexes.add_submissions(group, sentence_features=known, unchanged=unchanged)
+            except Exception as e:
+                logger.error(f"Error indexing submissions of assignment {assignment_id}: {str(e)}")
+                errors.update((str(submission.id), e) for submission in group)
+                continue
+            for submission, features, sentence_features in zip(group, features_list, known):
+                if sentence_features is None and str(submission.id) in extracted:
+                    content_cache.put_sentences(submission.content_sha256, features, assignment_indexes.embedding_model)
+            
+            # Class analysis flags of the same file stay, like other flags by peers; their details
+            # are read here since submissions are loaded without plagiarism_details
+            kept = [s.id for s in group if s.flagged_by_peer and 'class_analysis' in (s.plagiarism_signals or [])]
+            class_flags = {
+                str(row['_id']): row['plagiarism_details']['class_analysis']
+                for row in iter_projected(Submission, {'_id': {'$in': kept}}, ['plagiarism_details.class_analysis'])
+                if 'class_analysis' in row.get('plagiarism_details', {})
+            } if kept else {}
+            
+            # Each submission is compared with the class as it was when it was added,
+            # which leaves out the batch members added after it
+            later = {str(submission.id) for submission in group}
+            for submission, features in zip(group, features_list):
+                submission_id = str(submission.id)
+                later.discard(submission_id)
+                try:
+                    submission.plagiarism_result, submission.plagiarism_details = self._check_plagiarism(
+                        submission, features, flags=flags, exclude=later, edges=edges
+                    )
+                    if submission.flagged_by_peer:
+                        # Another submission matched this one; the flag stays even if this check disagrees
+                        submission.plagiarism_result = 'found'
+                    stamps[submission_id]['plagiarism'] = stage_stamp(PLAGIARISM_VERSION, stamps[submission_id]['extract'])
+                    # Raw scores, so a threshold or severity change can re-grade without another check
+                    signals = submission.plagiarism_details.get('signals', [])
+                    if submission.id in kept:
+                        signals = signals + ['class_analysis']
+                        if submission_id in class_flags:
+                            submission.plagiarism_details['class_analysis'] = class_flags[submission_id]
+                    submission.plagiarism_signals = signals
+                    submission.tfidf_max_similarity = submission.plagiarism_details.get('tfidf', {}).get('max_similarity')
+                    results[submission_id].update(
+                        plagiarism_result=submission.plagiarism_result,
+                        plagiarism_details=submission.plagiarism_details,
+                        plagiarism_signals=submission.plagiarism_signals,
+                        tfidf_max_similarity=submission.tfidf_max_similarity
+                    )
+                except Exception as e:
+                    errors[submission_id] = e
+            logger.info(f"Checked {len(group)} submissions of assignment {assignment_id} for plagiarism in one batch")
+        
+        # Members of this batch matched by a later member are flagged before they are graded
+        newly_flagged = set()
+        for submission_id in flags & set(submissions):
+            submission = submissions[submission_id]
+            if submission_id in errors:
+                continue
+            if 'plagiarism_result' not in results[submission_id] and submission.plagiarism_result != 'found':
+                # Checked in an earlier run: re-check it later so its details include the new match
+                stamps[submission_id].pop('plagiarism', None)
+                newly_flagged.add(submission_id)
+            submission.plagiarism_result = 'found'
+            submission.flagged_by_peer = True
+            results[submission_id].update(plagiarism_result='found', flagged_by_peer=True)
+        
+        # Grade stage: similarity to the model answer (one encode batch per assignment) when the
+        # text or model answer changed, then the scores, which also depend on plagiarism and severity
+        rescore = {}
+        for submission_id, submission in submissions.items():
+            if submission_id in errors:
+                continue
+            similarity_stamp = stage_stamp(SIMILARITY_VERSION, stamps[submission_id]['extract'],
+                                           model_answer_digest(submission.assignment))
+            if stamps[submission_id].get('similarity') != similarity_stamp:
+                rescore.setdefault(submission.assignment.id, []).append(submission)
+                stamps[submission_id]['similarity'] = similarity_stamp
+        for assignment_id, group in rescore.items():
+            similarities = self._answer_similarities([s.ocr_text for s in group], assignments[assignment_id])
+            for submission, similarity in zip(group, similarities):
+                submission.answer_similarity = similarity
+                submission.word_count = len((submission.ocr_text or "").split())
+                submission.content_quality = content_quality(submission.ocr_text)
+                results[str(submission.id)].update(answer_similarity=similarity, word_count=submission.word_count,
+                                                   content_quality=submission.content_quality)
+        
+        regrade = []
+        for submission_id, submission in submissions.items():
+            if submission_id in errors:
+                continue
+            grade_stamp = stage_stamp(GRADE_VERSION, stamps[submission_id]['similarity'],
+                                      submission.plagiarism_result, submission.plagiarism_severity)
+            if stamps[submission_id].get('grade') != grade_stamp:
+                regrade.append(submission)
+                stamps[submission_id]['grade'] = grade_stamp
+        if regrade:
+            # Correctness already considers plagiarism; final_score applies the severity penalty
+            scores, final_scores, labels = grade_batch(
+                [np.nan if s.answer_similarity is None else s.answer_similarity for s in regrade],
+                [np.nan if s.content_quality is None else s.content_quality for s in regrade],
+                [s.word_count or 0 for s in regrade],
+                [s.plagiarism_result == 'found' for s in regrade],
+                [severity_penalty(s.plagiarism_severity) for s in regrade]
+            )
+            for submission, score, final_score, label in zip(regrade, scores, final_scores, labels):
+                results[str(submission.id)].update(
+                    correctness_score=float(score), correctness_label=label, final_score=float(final_score)
+                )
+        
+        # Replace the match edges of every checked submission (their own collection, one bulk write)
+        match_edges.write([
+            operation
+            for submission_id, kept in edges.items() if submission_id not in errors
+            for operation in match_edges.replace_operations(
+                submissions[submission_id].assignment.id, submission_id, kept,
+                plagiarism_threshold(submissions[submission_id].assignment)
+            )
+        ])
+        
+        # Write every result and every flag of earlier submissions with one unordered bulk write
+        operations = []
+        for submission_id, fields in results.items():
+            if submission_id in errors:
+                operations.append(UpdateOne(
+                    guards[submission_id],
+                    {'$set': {'processing_status': 'Failed', 'processing_error': str(errors[submission_id])}}
+                ))
+                continue
+            fields.update(stage_stamps=stamps[submission_id], processing_status='Completed')
+            operations.append(UpdateOne(guards[submission_id], {'$set': fields}))
+        peers = flags - (set(submissions) - set(errors))
+        newly_flagged |= self._unflagged(peers - set(errors))
+        operations.extend(flag_operation(sid, sid in newly_flagged) for sid in sorted(peers))
+        result = Submission._get_collection().bulk_write(operations, ordered=False)
+        
+        if result.matched_count < len(operations):
+            self._check_lost_writes(guards, errors)
+        # Earlier submissions whose status changed are re-checked and re-graded in one batch
+        if newly_flagged:
+            enqueue_propagation(newly_flagged)
+            logger.info(f"Queued re-grading of {len(newly_flagged)} newly flagged earlier submissions")
+        return [errors.get(submission_id) for submission_id in submission_ids]
+    
+    def _unflagged(self, submission_ids):
+        """IDs of the given submissions not yet flagged as plagiarized (lean read)."""
+        if not submission_ids:
+            return set()
+        query = {'_id': {'$in': [ObjectId(sid) for sid in submission_ids]}, 'plagiarism_result': {'$ne': 'found'}}
+        return {str(stored['_id']) for stored in iter_projected(Submission, query, [])}
+    
+    def _check_lost_writes(self, guards, errors):
+        """
+        Find the submissions whose guarded write matched nothing because they changed after
+        they were loaded. A new file was uploaded meanwhile: the stale results are dropped and
+        the submission is queued again (a no-op when the upload already queued it). Otherwise
+        another job changed it, and if no job has finished it since it is failed with a
+        retryable error, so its job runs again on the current state (the stages that are
+        still current are skipped).
+        """
+        current = iter_projected(Submission, {'_id': {'$in': [guard['_id'] for guard in guards.values()]}},
+                                 ['assignment', 'content_sha256', 'processing_status'])
+        for stored in current:
+            submission_id = str(stored['_id'])
+            if stored.get('content_sha256') != guards[submission_id]['content_sha256']:
+                logger.warning(f"Submission {submission_id} was re-uploaded while it was processed, requeueing")
+                errors.pop(submission_id, None)
+                enqueue_submission(submission_id, stored['assignment'])
+            elif stored.get('processing_status') == 'Processing' and submission_id not in errors:
+                logger.warning(f"Submission {submission_id} was changed by another job while it was processed")
+                errors[submission_id] = RuntimeError("Submission changed by another job; retrying")
     
     def _extract_text_from_pdf(self, pdf_data):
         """Extract text from PDF using improved OCR processor"""
@@ -100,114 +524,169 @@ class DocumentProcessor:
             # Return empty text to allow processing to continue
             return ""
     
-    def _check_plagiarism(self, submission):
-        """Check for plagiarism against other submissions using MinHash+LSH and TF-IDF/cosine similarity. Returns 'found' or 'not found'. Also flags previous matching submissions."""
+    def _check_plagiarism(self, submission, features=None, flags=None, exclude=None, edges=None):
+        """Check for plagiarism against other submissions using MinHash+LSH and TF-IDF/cosine similarity. Returns 'found' or 'not found'. Also flags previous matching submissions (or adds their IDs to ``flags`` for the caller to write) and puts the submission's match edges in ``edges`` (by submission ID) for the caller to write. Submissions in ``exclude`` are not compared."""
         try:
-            # Get all other submissions for the same assignment
-            other_submissions = Submission.objects(
-                assignment=submission.assignment,
-                id__ne=submission.id,
-                ocr_text__exists=True
-            )
-            if not other_submissions:
-                return 'not found', {"message": "No other submissions to compare against"}
+            # No edges are kept for short texts or an empty class; any previous ones are removed
+            if edges is not None:
+                edges[str(submission.id)] = []
+            # Hash the submission once into the persistent per-assignment LSH index.
+            # This runs before any early return so later submissions can match it.
+            if features is None:
+                features = assignment_indexes.add_submission(submission)
+            lsh_matches = features['matches']
+
+            # Look the same signature up in the reference corpus (prior semesters, textbooks)
+            reference_details = None
+            if 'signature' in features:
+                reference_details = reference_corpus.check(features['signature'])
+            reference_found = bool(reference_details and reference_details['matches'])
 
-            # Prepare data for CheatingDetector
+            # Check if current text is meaningful (short texts are never indexed)
             current_text = submission.ocr_text or ""
-            
-            # Check if current text is meaningful
-            if len(current_text.strip()) < 50:
+            if len(current_text.strip()) < 50 or 'term_counts' not in features:
                 logger.warning(f"Submission {submission.id} has very short text: {len(current_text)} characters")
                 return 'not found', {"message": "Text too short for meaningful plagiarism analysis"}
-            
-            submissions_list = [
-                {"id": str(s.id), "text": s.ocr_text or ""} for s in other_submissions
-                if s.ocr_text and len(s.ocr_text.strip()) >= 50  # Filter out short texts
-            ]
-            
-            if not submissions_list:
-                return 'not found', {"message": "No meaningful submissions to compare against"}
-            
-            # Add the current submission as the last item
-            submissions_list.append({"id": str(submission.id), "text": current_text})
 
-            detector = CheatingDetector(exact_threshold=0.4)  # Lowered from 0.5 to 0.4 for better detection
-            exact_copies = detector.detect_exact_copies(submissions_list)
+            # In large classes the SimHash pre-filter already narrowed the MinHash
+            # stage to near duplicates; TF-IDF only scores those candidates too
+            candidates = features.get('candidates')
+            simhash_details = None
+            if candidates is not None:
+                simhash_details = {
+                    "candidates": len(candidates),
+                    "max_distance": assignment_indexes.simhash_distance
+                }
 
-            # MinHash+LSH result
-            flagged = [case for case in exact_copies if str(submission.id) in case['submission_ids']]
-            minhash_found = bool(flagged)
+            # Incremental TF-IDF: one transform (done at extraction) plus one sparse
+            # dot product against the assignment's stored term-count matrix
+            # (the index was synced when the features were added)
+            similarities, vocabulary_size = assignment_indexes.tfidf_similarities(
+                submission.assignment.id, submission.id, features['term_counts'], candidates=candidates,
+                exclude=exclude, sync=False
+            )
 
-            # TF-IDF/cosine similarity with error handling
-            texts = [s["text"] for s in submissions_list]
-            
-            try:
-                # Configure vectorizer to handle edge cases
-                vectorizer = TfidfVectorizer(
-                    stop_words='english', 
-                    min_df=1,  # Include words that appear in at least 1 document
-                    max_features=10000,  # Limit features to avoid memory issues
-                    lowercase=True,
-                    strip_accents='ascii',
-                    token_pattern=r'\b[a-zA-Z]{2,}\b'  # Only words with 2+ letters
+            # Sentence-embedding matches against the rest of the class (paraphrases that
+            # share little vocabulary); a submission is flagged when a large enough share
+            # of its sentences paraphrase one other submission
+            semantic_details = None
+            semantic_flagged = []
+            sentence_count = len(features.get('sentence_spans', []))
+            if 'semantic_matches' in features and sentence_count:
+                matched_sentences = {}
+                for match in features['semantic_matches']:
+                    matched_sentences.setdefault(match['submission_id'], set()).add(match['sentence'])
+                per_submission = sorted(
+                    (
+                        {
+                            "submission_id": sid,
+                            "matched_sentences": len(sentences),
+                            "match_ratio": round(len(sentences) / sentence_count, 4)
+                        }
+                        for sid, sentences in matched_sentences.items()
+                    ),
+                    key=lambda entry: entry["match_ratio"],
+                    reverse=True
                 )
-                
-                tfidf_matrix = vectorizer.fit_transform(texts)
-                
-                # Check if we got any features
-                if tfidf_matrix.shape[1] == 0:
-                    logger.warning("TF-IDF vectorizer produced empty vocabulary")
-                    tfidf_found = False
-                    max_similarity = 0
-                    tfidf_details = {
-                        "error": "Empty vocabulary - documents may contain only stop words",
-                        "max_similarity": 0,
-                        "threshold": 0.6
-                    }
+                semantic_flagged = [
+                    entry["submission_id"] for entry in per_submission
+                    if entry["match_ratio"] >= Config.SEMANTIC_MATCH_RATIO
+                ]
+                semantic_details = {
+                    "threshold": assignment_indexes.semantic_threshold,
+                    "match_ratio": Config.SEMANTIC_MATCH_RATIO,
+                    "sentences": sentence_count,
+                    "submissions": per_submission,
+                    "pairs": [
+                        match for match in features['semantic_matches']
+                        if match['submission_id'] in semantic_flagged
+                    ]
+                }
+            semantic_found = bool(semantic_flagged)
+
+            if not similarities and not semantic_found:
+                details = {"reference_corpus": reference_details} if reference_found else {}
+                if simhash_details is not None:
+                    details["simhash"] = simhash_details
+                    details["message"] = "No near-duplicate candidates found by SimHash"
                 else:
-                    similarity_scores = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1])[0]
-                    max_similarity = max(similarity_scores) if len(similarity_scores) > 0 else 0
-                    tfidf_threshold = 0.6  # 60% similarity (lowered from 70% to catch more cases)
-                    tfidf_found = max_similarity >= tfidf_threshold
-                    tfidf_details = {
-                        "max_similarity": float(max_similarity),
-                        "threshold": 0.6,
-                        "vocabulary_size": tfidf_matrix.shape[1],
-                        "comparisons": [
-                            {
-                                "submission_id": submissions_list[i]["id"],
-                                "similarity_score": float(score)
-                            }
-                            for i, score in enumerate(similarity_scores)
-                        ]
+                    details["message"] = "No other submissions to compare against"
+                details["signals"] = ['reference'] if reference_found else []
+                return ('found' if reference_found else 'not found'), details
+
+            # MinHash+LSH result from the persistent index query
+            flagged = []
+            if lsh_matches:
+                flagged.append({
+                    'type': 'exact_copy',
+                    'submission_ids': [str(submission.id)] + [sid for sid, _ in lsh_matches],
+                    'similarity_score': max(score for _, score in lsh_matches),
+                    'passages': {
+                        sid: assignment_indexes.matching_passages(submission.assignment.id, submission.id, sid, sync=False)
+                        for sid, _ in lsh_matches
                     }
-            
-            except ValueError as ve:
-                logger.error(f"TF-IDF vectorization failed: {str(ve)}")
+                })
+            minhash_found = bool(flagged)
+
+            # TF-IDF/cosine similarity result
+            tfidf_threshold = plagiarism_threshold(submission.assignment)
+            # Only the strongest pairs are kept, as indexed match edges, instead of a score against every classmate
+            kept_edges = match_edges.select(similarities, tfidf_threshold)
+            if edges is not None:
+                edges[str(submission.id)] = kept_edges
+            if vocabulary_size == 0:
+                logger.warning("TF-IDF term statistics are empty")
                 tfidf_found = False
-                max_similarity = 0
                 tfidf_details = {
-                    "error": str(ve),
+                    "error": "Empty vocabulary - documents may contain only stop words",
                     "max_similarity": 0,
-                    "threshold": 0.6
-                }            # Combine results
+                    "threshold": tfidf_threshold
+                }
+            else:
+                max_similarity = max((score for _, score in similarities), default=0.0)
+                tfidf_found = max_similarity >= tfidf_threshold
+                tfidf_details = {
+                    "max_similarity": float(max_similarity),
+                    "threshold": tfidf_threshold,
+                    "vocabulary_size": vocabulary_size,
+                    "compared": len(similarities),
+                    "top_matches": [
+                        {
+                            "submission_id": sid,
+                            "similarity_score": score
+                        }
+                        for sid, score in kept_edges[:match_edges.top_k]
+                    ]
+                }
+
+            # Combine results
             details = {
                 "minhash_lsh": flagged[0] if minhash_found else {"message": "No exact copy detected by MinHash+LSH."},
                 "tfidf": tfidf_details
             }
+            if reference_details is not None:
+                details["reference_corpus"] = reference_details
+            if simhash_details is not None:
+                details["simhash"] = simhash_details
+            if semantic_details is not None:
+                details["semantic"] = semantic_details
+            details["signals"] = [
+                name for name, found in (('minhash', minhash_found), ('tfidf', tfidf_found),
+                                         ('semantic', semantic_found), ('reference', reference_found))
+                if found
+            ]
             # Decision and flagging
-            if minhash_found or tfidf_found:
+            if minhash_found or tfidf_found or semantic_found or reference_found:
                 # Also flag previous matching submissions
+                matched = set(semantic_flagged)
                 if minhash_found:
-                    for sid in flagged[0]['submission_ids']:
-                        if sid != str(submission.id):
-                            Submission.objects(id=sid).update(set__plagiarism_result='found')
+                    matched.update(sid for sid in flagged[0]['submission_ids'] if sid != str(submission.id))
                 if tfidf_found:
-                    for i, score in enumerate(similarity_scores):
-                        if score >= tfidf_threshold:
-                            sid = submissions_list[i]['id']
-                            if sid != str(submission.id):
-                                Submission.objects(id=sid).update(set__plagiarism_result='found')
+                    matched.update(sid for sid, score in similarities if score >= tfidf_threshold)
+                if flags is not None:
+                    flags.update(matched)
+                elif matched:
+                    Submission._get_collection().bulk_write([flag_operation(sid) for sid in matched], ordered=False)
                 return 'found', details
             else:
                 return 'not found', details
@@ -215,162 +694,26 @@ class DocumentProcessor:
             logger.error(f"Error in plagiarism checking: {str(e)}")
             raise
 
-    def _calculate_correctness_score(self, text, assignment, plagiarism_result=None):
-        """
-        Calculate correctness score by comparing student answer to professor's model answer
-        Returns: (score, label) where score is 0-100 and label is descriptive
-        """
-        try:
-            if not text or len(text.strip()) < 50:
-                return 0, "Insufficient Content"
-            
-            # Get the professor's model answer
-            model_answer = assignment.model_answer_text if assignment else None
-            
-            if not model_answer or len(model_answer.strip()) < 50:
-                # Fallback to basic content analysis if no model answer
-                logger.warning(f"No model answer available for assignment {assignment.id if assignment else 'unknown'}")
-                return self._fallback_content_analysis(text, plagiarism_result)
-            
-            # Use SimilarityChecker to compare against model answer
-            correctness_analysis = self.similarity_checker.check_answer_correctness(
-                student_answer=text,
-                correct_answer=model_answer
-            )
-            
-            if 'error' in correctness_analysis:
-                logger.error(f"Error in similarity checking: {correctness_analysis['error']}")
-                return self._fallback_content_analysis(text, plagiarism_result)
-            
-            # Extract similarity score and correctness label
-            similarity_score = correctness_analysis.get('similarity_score', 0)
-            semantic_correctness = correctness_analysis.get('correctness', 'Incorrect')
-            confidence = correctness_analysis.get('confidence', 0)
-            
-            # Convert semantic similarity to percentage score
-            base_score = round(similarity_score * 100, 1)
-            
-            # Apply additional scoring factors
-            word_count = len(text.split())
-            
-            # Bonus for comprehensive answers (but cap at reasonable limits)
-            if word_count >= 300:
-                completeness_bonus = min(5, (word_count - 300) / 100)  # Up to 5% bonus
-                base_score += completeness_bonus
-            elif word_count < 100:
-                # Penalty for very short answers
-                base_score *= (word_count / 100)
-            
-            # Cap the score at 100%
-            base_score = min(100, base_score)
-            
-            # Apply plagiarism penalty if detected
-            if plagiarism_result == 'found':
-                penalty_factor = 0.4  # 60% of original score (40% penalty)
-                final_score = round(base_score * penalty_factor, 1)
-                
-                # Create plagiarism-aware label
-                if base_score >= 80:
-                    label = f"Plagiarized (High Similarity to Model: {base_score:.1f}%)"
-                elif base_score >= 60:
-                    label = f"Plagiarized (Good Similarity to Model: {base_score:.1f}%)"
-                elif base_score >= 40:
-                    label = f"Plagiarized (Fair Similarity to Model: {base_score:.1f}%)"
-                else:
-                    label = f"Plagiarized (Poor Answer: {base_score:.1f}%)"
-                
-                logger.info(f"Model answer comparison: {base_score:.1f}% similarity → {final_score:.1f}% after plagiarism penalty ({label})")
-                return final_score, label
-            else:
-                # No plagiarism - use original scoring with semantic labels
-                if base_score >= 85:
-                    label = f"Excellent (Similarity: {similarity_score:.3f})"
-                elif base_score >= 70:
-                    label = f"Good (Similarity: {similarity_score:.3f})"
-                elif base_score >= 55:
-                    label = f"Satisfactory (Similarity: {similarity_score:.3f})"
-                elif base_score >= 40:
-                    label = f"Needs Improvement (Similarity: {similarity_score:.3f})"
-                else:
-                    label = f"Poor (Similarity: {similarity_score:.3f})"
-                
-                logger.info(f"Model answer comparison: {similarity_score:.3f} similarity → {base_score:.1f}% score ({semantic_correctness}, {label})")
-                return round(base_score, 1), label
-            
-        except Exception as e:
-            logger.error(f"Error calculating correctness score: {str(e)}")
-            return self._fallback_content_analysis(text, plagiarism_result)
-    
-    def _fallback_content_analysis(self, text, plagiarism_result=None):
+
+    def _answer_similarities(self, texts, assignment):
         """
-        Fallback content analysis when model answer is not available
+        Semantic similarity of each answer to the professor's model answer, encoded in one batch.
+        None where there is no usable model answer or answer text (graded by content analysis instead).
         """
-        try:
-            word_count = len(text.split())
-            
-            # Basic content quality scoring
-            base_score = 60  # Start with 60% for having content
-            
-            # Word count scoring
-            if word_count >= 200:
-                word_score = min(25, (word_count / 400) * 25)
-            else:
-                word_score = (word_count / 200) * 15
-            
-            # Structure scoring
-            structure_score = 0
-            text_lower = text.lower()
-            
-            if 'assignment' in text_lower or 'name:' in text_lower:
-                structure_score += 3
-            if 'student id' in text_lower or 'id:' in text_lower:
-                structure_score += 2
-            if any(word in text_lower for word in ['introduction', 'fundamentals', 'principles']):
-                structure_score += 3
-            if any(word in text_lower for word in ['conclusion', 'summary']):
-                structure_score += 2
-            
-            # Technical content scoring
-            technical_keywords = [
-                'software', 'engineering', 'development', 'system', 'design',
-                'architecture', 'database', 'algorithm', 'programming', 'testing',
-                'methodology', 'principles', 'framework', 'implementation', 'analysis'
-            ]
-            found_keywords = sum(1 for keyword in technical_keywords if keyword in text_lower)
-            technical_score = min(10, found_keywords)
-            
-            content_score = base_score + word_score + structure_score + technical_score
-            content_score = min(100, round(content_score, 1))
-            
-            # Apply plagiarism penalty
-            if plagiarism_result == 'found':
-                penalty_factor = 0.4
-                final_score = round(content_score * penalty_factor, 1)
-                label = f"Plagiarized (Content Quality: {content_score:.1f}%)"
-                logger.info(f"Fallback analysis with plagiarism: {content_score:.1f}% → {final_score:.1f}%")
-                return final_score, label
+        similarities = [None] * len(texts)
+        model_answer = assignment.model_answer_text if assignment else None
+        if not model_answer or len(model_answer.strip()) < 50:
+            logger.warning(f"No model answer available for assignment {assignment.id if assignment else 'unknown'}")
+            return similarities
+        
+        positions = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 50]
+        batch = self.similarity_checker.check_answers_against([texts[i] for i in positions], model_answer)
+        for i, analysis in zip(positions, batch):
+            if 'error' in analysis:
+                logger.error(f"Error in similarity checking: {analysis['error']}")
             else:
-                if content_score >= 90:
-                    label = "Good Content (No Model Answer Available)"
-                elif content_score >= 80:
-                    label = "Fair Content (No Model Answer Available)"
-                elif content_score >= 70:
-                    label = "Basic Content (No Model Answer Available)"
-                else:
-                    label = "Poor Content (No Model Answer Available)"
-                    
-                logger.info(f"Fallback analysis: {content_score:.1f}% content quality ({label})")
-                return content_score, label
-                
-        except Exception as e:
-            logger.error(f"Error in fallback content analysis: {str(e)}")
-            return 0, "Error in Grading"
-    
-    def _calculate_final_score(self, correctness_score, plagiarism_result):
-        """
-        Legacy method - now correctness_score already includes plagiarism penalties
-        """
-        return correctness_score
+                similarities[i] = analysis.get('similarity_score', 0)
+        return similarities
 
 # Create a global instance
 document_processor = DocumentProcessor() 
\ No newline at end of file
@@ -0,0 +1,450 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from mongoengine.errors import NotUniqueError
+from mongoengine.queryset.visitor import Q
+
+from config import Config
+from models.analysis_job import AnalysisJob
+from models.job import Job
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How often a worker filling a batch checks for more jobs of its group
+BATCH_POLL_SECONDS = 0.1
+
+# Job kinds; the handlers live in the worker process (see worker.py)
+PROCESS_SUBMISSION = 'process_submission'
+EXTRACT_ASSIGNMENT_TEXT = 'extract_assignment_text'
+CLASS_ANALYSIS = 'class_analysis'
+PROPAGATE_MATCHES = 'propagate_matches'
+REGRADE_ASSIGNMENT = 'regrade_assignment'
+REMOVE_SUBMISSION = 'remove_submission'
+
+
+class JobQueue:
+    """
+    Durable job queue stored in the ``jobs`` collection.
+
+    Jobs are claimed with a single findAndModify, so any number of worker
+    processes (on any number of nodes) can drain the queue without running a
+    job twice. A claim takes a lease that the worker extends with heartbeats;
+    if the worker dies, the lease expires and another worker picks the job up.
+    Failed jobs are retried with exponential backoff and end up in the
+    ``Dead`` state once their attempts are used up.
+    """
+
+    def __init__(self, lease_seconds: int = 300, max_attempts: int = 3,
+                 retry_base_seconds: int = 30, retry_max_seconds: int = 3600, max_pending: int = 0):
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_pending = max_pending
+        # Set on every local enqueue so idle workers in this process wake up immediately
+        self.wakeup = threading.Event()
+
+    def pending_count(self) -> int:
+        """Number of jobs waiting to be claimed."""
+        return Job.objects(status='Queued').count()
+
+    def is_full(self) -> bool:
+        """
+        Whether new uploads should be refused (backpressure); never true without a limit.
+
+        Only the upload route checks it, before it stores anything: enqueue itself never
+        refuses a job, because internal work (propagation, requeues after a re-upload) is
+        enqueued after its results were written and would otherwise be lost.
+        """
+        return self.max_pending > 0 and self.pending_count() >= self.max_pending
+
+    def enqueue(self, kind: str, payload: Dict, dedupe_key: Optional[str] = None,
+                max_attempts: Optional[int] = None, group_key: Optional[str] = None) -> Job:
+        """
+        Add a job, or return the queued job with the same ``dedupe_key``.
+
+        A running job with the key does not absorb the new one: it may be working
+        on inputs that changed since (e.g. a file re-uploaded during processing),
+        so a successor is queued to run after it.
+
+        Args:
+            kind (str): Handler name
+            payload (Dict): Arguments for the handler (must be BSON-serializable)
+            dedupe_key (str): Key identifying the work, e.g. ``submission:<id>``
+            max_attempts (int): Attempts before the job is dead-lettered
+            group_key (str): Key of jobs that may run as one batch, e.g. ``<assignment_id>``
+
+        Returns:
+            Job: The queued job
+        """
+        now = datetime.utcnow()
+        fields = {
+            'set_on_insert__kind': kind,
+            'set_on_insert__payload': payload,
+            'set_on_insert__status': 'Queued',
+            'set_on_insert__attempts': 0,
+            'set_on_insert__max_attempts': max_attempts or self.max_attempts,
+            'set_on_insert__available_at': now,
+            'set_on_insert__created_at': now
+        }
+        if group_key is not None:
+            fields['set_on_insert__group_key'] = group_key
+        if dedupe_key is not None:
+            job = None
+            while job is None:
+                try:
+                    job = Job.objects(dedupe_key=dedupe_key, status='Queued').modify(upsert=True, new=True, **fields)
+                except NotUniqueError:
+                    # A concurrent enqueue inserted the queued job first (None if it was claimed since)
+                    job = Job.objects(dedupe_key=dedupe_key, status='Queued').first()
+        else:
+            job = Job(kind=kind, payload=payload, group_key=group_key,
+                      max_attempts=max_attempts or self.max_attempts).save()
+        self.wakeup.set()
+        return job
+
+    def claim(self, owner: str, kinds: Optional[List[str]] = None, group_key: Optional[str] = None) -> Optional[Job]:
+        """
+        Atomically take the next runnable job: a queued job past its backoff,
+        or a running job whose lease expired.
+
+        Args:
+            owner (str): Unique worker identity holding the lease
+            kinds (List[str]): Only claim these kinds of jobs
+            group_key (str): Only claim jobs of this group
+
+        Returns:
+            Job: The claimed job (status Running, attempts incremented), or None
+        """
+        while True:
+            now = datetime.utcnow()
+            runnable = (Q(status='Queued') & Q(available_at__lte=now)) | \
+                       (Q(status='Running') & Q(lease_expires_at__lt=now))
+            query = Job.objects(runnable)
+            if kinds is not None:
+                query = query.filter(kind__in=kinds)
+            if group_key is not None:
+                query = query.filter(group_key=group_key)
+            job = query.order_by('available_at').modify(
+                new=True,
+                set__status='Running',
+                set__lease_owner=owner,
+                set__lease_expires_at=now + self.lease,
+                set__heartbeat_at=now,
+                set__started_at=now,
+                inc__attempts=1
+            )
+            if job is None or job.attempts <= job.max_attempts:
+                return job
+            # Its last worker died mid-run on the final attempt
+            self._finish(job, owner, 'Dead', error=job.last_error or 'Lease expired on the final attempt')
+            logger.warning(f"Job {job.id} ({job.kind}) dead-lettered after {job.max_attempts} attempts")
+
+    def heartbeat(self, job: Job, owner: str) -> bool:
+        """Extend a lease; False if the lease was lost (expired and claimed by another worker)."""
+        now = datetime.utcnow()
+        return Job.objects(id=job.id, status='Running', lease_owner=owner).update_one(
+            set__lease_expires_at=now + self.lease,
+            set__heartbeat_at=now
+        ) == 1
+
+    def _finish(self, job: Job, owner: str, status: str, error: Optional[str] = None) -> bool:
+        updates = {
+            'set__status': status,
+            'set__finished_at': datetime.utcnow(),
+            'unset__lease_owner': True,
+            'unset__lease_expires_at': True
+        }
+        if error is not None:
+            updates['set__last_error'] = error
+        return Job.objects(id=job.id, lease_owner=owner).update_one(**updates) == 1
+
+    def complete(self, job: Job, owner: str) -> bool:
+        """Mark a job done; False if this worker no longer held its lease."""
+        return self._finish(job, owner, 'Completed')
+
+    def fail(self, job: Job, owner: str, error: str) -> bool:
+        """
+        Record a failed attempt: requeue with exponential backoff (with jitter),
+        or dead-letter the job when it has no attempts left.
+        """
+        if job.attempts >= job.max_attempts:
+            logger.warning(f"Job {job.id} ({job.kind}) dead-lettered after {job.attempts} attempts: {error}")
+            return self._finish(job, owner, 'Dead', error=error)
+
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (job.attempts - 1))
+        delay *= random.uniform(0.8, 1.2)
+        try:
+            return Job.objects(id=job.id, lease_owner=owner).update_one(
+                set__status='Queued',
+                set__available_at=datetime.utcnow() + timedelta(seconds=delay),
+                set__last_error=error,
+                unset__lease_owner=True,
+                unset__lease_expires_at=True
+            ) == 1
+        except NotUniqueError:
+            # A successor with the same dedupe key is already queued and redoes the work
+            logger.info(f"Job {job.id} ({job.kind}) failed and is superseded by a queued job: {error}")
+            return self._finish(job, owner, 'Completed', error=error)
+
+    def requeue_dead(self, kind: Optional[str] = None) -> int:
+        """Give dead-lettered jobs a fresh set of attempts; returns how many were requeued."""
+        query = Job.objects(status='Dead')
+        if kind is not None:
+            query = query.filter(kind=kind)
+        count = 0
+        for job_id in query.scalar('id'):
+            try:
+                count += Job.objects(id=job_id, status='Dead').update_one(
+                    set__status='Queued', set__attempts=0, set__available_at=datetime.utcnow(),
+                    unset__finished_at=True
+                )
+            except NotUniqueError:
+                # The same work is already queued again
+                continue
+        if count:
+            self.wakeup.set()
+        return count
+
+
+class JobWorker:
+    """
+    Drains a JobQueue with a fixed number of threads.
+
+    ``concurrency`` bounds how many jobs this process runs at once, however
+    many are queued; more capacity comes from starting more worker processes.
+    Kinds registered with :meth:`register_batch` are run in micro-batches of
+    jobs that share a ``group_key``.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int = 2, poll_seconds: float = 2.0):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.handlers: Dict[str, Callable[[Dict], None]] = {}
+        self.batch_handlers: Dict[str, Tuple[Callable[[List[Dict]], List[Optional[Exception]]], int, float]] = {}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def register(self, kind: str, handler: Callable[[Dict], None]):
+        """Run ``handler(payload)`` for jobs of this kind; an exception marks the attempt failed."""
+        self.handlers[kind] = handler
+
+    def register_batch(self, kind: str, handler: Callable[[List[Dict]], List[Optional[Exception]]],
+                       max_size: int = 32, window_seconds: float = 2.0):
+        """
+        Run jobs of this kind in batches of up to ``max_size`` jobs with the same group key.
+
+        After claiming a job, the worker keeps claiming queued jobs of its group
+        until the batch is full or the job has waited ``window_seconds`` since it
+        became available, so batching adds at most that much latency (none when
+        a backlog is already queued).
+
+        Args:
+            kind (str): Handler name
+            handler (Callable): Maps the batch's payloads to one error per payload
+                (None on success); raising fails every job in the batch
+            max_size (int): Most jobs per batch
+            window_seconds (float): Longest a job waits for others to join its batch
+        """
+        self.batch_handlers[kind] = (handler, max_size, window_seconds)
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """Start the worker threads (no-op if already running)."""
+        if self.running:
+            return
+        self._stop.clear()
+        identity = f"{socket.gethostname()}:{os.getpid()}"
+        self._threads = [
+            threading.Thread(target=self._loop, args=(f"{identity}:{slot}",), daemon=True,
+                             name=f"job-worker-{slot}")
+            for slot in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+        kinds = sorted(set(self.handlers) | set(self.batch_handlers))
+        logger.info(f"Job worker {identity} started with {self.concurrency} threads for {kinds}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop claiming jobs and wait for the running ones to finish."""
+        self._stop.set()
+        self.queue.wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _loop(self, owner: str):
+        kinds = list(self.handlers) + list(self.batch_handlers)
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(owner, kinds=kinds)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                self.queue.wakeup.wait(self.poll_seconds)
+                self.queue.wakeup.clear()
+                continue
+            if job.kind in self.batch_handlers:
+                self.run_batch(self._gather(job, owner), owner)
+            else:
+                self.run(job, owner)
+
+    def _gather(self, first: Job, owner: str) -> List[Job]:
+        """Claim more jobs of the first job's group until the batch is full or its window closes."""
+        _, max_size, window_seconds = self.batch_handlers[first.kind]
+        jobs = [first]
+        if first.group_key is None:
+            return jobs
+        remaining = window_seconds - (datetime.utcnow() - first.available_at).total_seconds()
+        deadline = time.monotonic() + max(0.0, remaining)
+        while len(jobs) < max_size:
+            try:
+                job = self.queue.claim(owner, kinds=[first.kind], group_key=first.group_key)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                break
+            if job is not None:
+                jobs.append(job)
+                continue
+            wait = deadline - time.monotonic()
+            if wait <= 0 or self._stop.wait(min(wait, BATCH_POLL_SECONDS)):
+                break
+        return jobs
+
+    @contextmanager
+    def _heartbeats(self, jobs: List[Job], owner: str):
+        """Extend the leases of running jobs until the block exits."""
+        done = threading.Event()
+
+        def beat():
+            interval = self.queue.lease.total_seconds() / 3
+            held = list(jobs)
+            while held and not done.wait(interval):
+                for job in list(held):
+                    if not self.queue.heartbeat(job, owner):
+                        logger.warning(f"Lost the lease on job {job.id} ({job.kind})")
+                        held.remove(job)
+
+        heartbeat = threading.Thread(target=beat, daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def run(self, job: Job, owner: str):
+        """Run one claimed job, heartbeating its lease until the handler returns."""
+        with self._heartbeats([job], owner):
+            try:
+                self.handlers[job.kind](job.payload)
+                self.queue.complete(job, owner)
+            except Exception as e:
+                logger.error(f"Error running job {job.id} ({job.kind}), attempt {job.attempts}: {str(e)}")
+                self.queue.fail(job, owner, str(e))
+
+    def run_batch(self, jobs: List[Job], owner: str):
+        """Run claimed jobs of one kind through its batch handler, completing or failing each."""
+        handler = self.batch_handlers[jobs[0].kind][0]
+        with self._heartbeats(jobs, owner):
+            try:
+                errors = handler([job.payload for job in jobs])
+            except Exception as e:
+                logger.error(f"Error running batch of {len(jobs)} {jobs[0].kind} jobs: {str(e)}")
+                errors = [e] * len(jobs)
+            for job, error in zip(jobs, errors):
+                if error is None:
+                    self.queue.complete(job, owner)
+                else:
+                    logger.error(f"Error running job {job.id} ({job.kind}), attempt {job.attempts}: {str(error)}")
+                    self.queue.fail(job, owner, str(error))
+        if len(jobs) > 1:
+            logger.info(f"Ran {len(jobs)} {jobs[0].kind} jobs of group {jobs[0].group_key} as one batch")
+
+
+# Create global instances
+job_queue = JobQueue(
+    lease_seconds=Config.JOB_LEASE_SECONDS,
+    max_attempts=Config.JOB_MAX_ATTEMPTS,
+    retry_base_seconds=Config.JOB_RETRY_BASE_SECONDS,
+    max_pending=Config.JOB_QUEUE_MAX_PENDING
+)
+job_worker = JobWorker(job_queue, concurrency=Config.JOB_WORKER_CONCURRENCY)
+
+
+def enqueue_submission(submission_id, assignment_id=None) -> Job:
+    """Queue OCR, plagiarism checking and grading of a submission (batched per assignment when given)."""
+    return job_queue.enqueue(PROCESS_SUBMISSION, {'submission_id': str(submission_id)},
+                             dedupe_key=f"submission:{submission_id}",
+                             group_key=str(assignment_id) if assignment_id is not None else None)
+
+
+def enqueue_propagation(submission_ids) -> Job:
+    """Queue a re-check and re-grade, as one batch, of earlier submissions newly flagged by a later one."""
+    return job_queue.enqueue(PROPAGATE_MATCHES, {'submission_ids': sorted(str(sid) for sid in submission_ids)})
+
+
+def enqueue_regrade(assignment_id) -> Job:
+    """Queue a re-grade of an assignment's submissions from their stored scores."""
+    return job_queue.enqueue(REGRADE_ASSIGNMENT, {'assignment_id': str(assignment_id)},
+                             dedupe_key=f"regrade:{assignment_id}")
+
+
+def enqueue_removal(assignment_id, submission_id) -> Job:
+    """Queue removal of a deleted submission's stored features from its assignment's index and statistics."""
+    return job_queue.enqueue(REMOVE_SUBMISSION, {'assignment_id': str(assignment_id), 'submission_id': str(submission_id)},
+                             dedupe_key=f"remove:{submission_id}")
+
+
+def enqueue_assignment_text(assignment_id) -> Job:
+    """Queue text extraction of an assignment's question and model answer files."""
+    return job_queue.enqueue(EXTRACT_ASSIGNMENT_TEXT, {'assignment_id': str(assignment_id)},
+                             dedupe_key=f"assignment-text:{assignment_id}")
+
+
+def start_class_analysis(assignment, user=None) -> AnalysisJob:
+    """
+    Queue a class-wide analysis of an assignment, unless one is already queued or running.
+
+    Args:
+        assignment (Assignment): Assignment to analyze
+        user (User): Professor who requested it
+
+    Returns:
+        AnalysisJob: The new job, or the one already in progress
+    """
+    # An upsert on the unique active-job index: of concurrent requests only one inserts its
+    # job, the others get that one back (or lose the insert race and read it)
+    job_id = ObjectId()
+    try:
+        job = AnalysisJob.objects(assignment=assignment.id, active=True).modify(
+            upsert=True,
+            new=True,
+            set_on_insert__id=job_id,
+            set_on_insert__requested_by=user,
+            set_on_insert__status='Queued',
+            set_on_insert__progress=0,
+            set_on_insert__created_at=datetime.utcnow()
+        )
+    except NotUniqueError:
+        return AnalysisJob.objects(assignment=assignment.id, active=True).first()
+    if job.id != job_id:
+        return job
+
+    job_queue.enqueue(CLASS_ANALYSIS, {'analysis_job_id': str(job.id)},
+                      dedupe_key=f"analysis:{job.id}", max_attempts=1)
+    return job
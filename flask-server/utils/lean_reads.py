@@ -0,0 +1,28 @@
+from typing import Dict, Iterable, Iterator
+
+# Documents fetched per cursor round trip
+DEFAULT_BATCH_SIZE = 1000
+
+
+def iter_projected(document_cls, query: Dict, fields: Iterable[str],
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Dict]:
+    """
+    Stream raw documents with only the given fields, read in cursor batches.
+
+    This is the lean read path of the processing pipeline: pymongo returns
+    plain dicts, so no mongoengine document is built or validated, and fields
+    the caller does not need (GridFS proxies, result dicts) never leave the
+    database.
+
+    Args:
+        document_cls: mongoengine Document class whose collection is read
+        query (Dict): Raw MongoDB filter (reference fields hold plain ObjectIds)
+        fields (Iterable[str]): Field names to return ('_id' is always included)
+        batch_size (int): Documents per cursor batch
+
+    Returns:
+        Iterator[Dict]: Projected documents; missing fields are absent from the dict
+    """
+    # An empty projection would return whole documents, so ask for '_id' alone
+    projection = {field: 1 for field in fields} or {'_id': 1}
+    return document_cls._get_collection().find(query, projection).batch_size(batch_size)
@@ -0,0 +1,175 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, UpdateOne
+
+from config import Config
+from models.match_edge import MatchEdge
+from models.submission_features import SubmissionFeatures
+from ml_models.clustering import build_clusters
+from ml_models.winnowing import FingerprintIndex, fingerprints_from_bytes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MatchEdgeStore:
+    """
+    Bounded "who matched whom" graph of an assignment, one document per edge.
+
+    A check keeps the edges at or above the plagiarism threshold, plus the
+    top_k most similar other submissions at or above min_similarity, instead
+    of a score against every classmate inside the submission document. The
+    edges of a submission are replaced whenever it is checked again.
+
+    The web tier answers its match queries (edges, clusters, passages) from
+    these edges and the stored features only, without the in-memory index or
+    the ML libraries.
+    """
+
+    def __init__(self, min_similarity: float = 0.3, top_k: int = 10):
+        self.min_similarity = min_similarity
+        self.top_k = top_k
+
+    def select(self, similarities: List[Tuple[str, float]], threshold: float) -> List[Tuple[str, float]]:
+        """
+        Edges worth keeping from one check's similarities, most similar first.
+
+        Args:
+            similarities (List[Tuple[str, float]]): (submission ID, similarity) against the class
+            threshold (float): Plagiarism threshold; edges at or above it are always kept
+
+        Returns:
+            List[Tuple[str, float]]: Kept (submission ID, similarity) pairs
+        """
+        ranked = sorted(similarities, key=lambda pair: pair[1], reverse=True)
+        return [
+            (sid, score) for rank, (sid, score) in enumerate(ranked)
+            if score >= threshold or (rank < self.top_k and score >= self.min_similarity)
+        ]
+
+    def replace_operations(self, assignment_id, source_id, edges: List[Tuple[str, float]],
+                           threshold: float) -> List:
+        """
+        Bulk-write operations replacing a submission's outgoing edges. They are
+        idempotent and independent of each other, so they can run unordered.
+        """
+        source = ObjectId(str(source_id))
+        targets = [ObjectId(sid) for sid, _ in edges]
+        now = datetime.utcnow()
+        operations = [DeleteMany({'source': source, 'target': {'$nin': targets}})]
+        for target, (_, score) in zip(targets, edges):
+            operations.append(UpdateOne(
+                {'source': source, 'target': target},
+                {'$set': {
+                    'assignment': ObjectId(str(assignment_id)),
+                    'similarity': float(score),
+                    'flagged': score >= threshold,
+                    'updated_at': now
+                }},
+                upsert=True
+            ))
+        return operations
+
+    def write(self, operations: List):
+        """Apply replace_operations of several submissions with one unordered bulk write."""
+        if operations:
+            MatchEdge._get_collection().bulk_write(operations, ordered=False)
+
+    def reflag(self, assignment_id, threshold: float):
+        """Re-mark an assignment's edges against a new plagiarism threshold (two indexed updates)."""
+        collection = MatchEdge._get_collection()
+        assignment = ObjectId(str(assignment_id))
+        collection.update_many({'assignment': assignment, 'similarity': {'$gte': threshold}, 'flagged': {'$ne': True}},
+                               {'$set': {'flagged': True}})
+        collection.update_many({'assignment': assignment, 'similarity': {'$lt': threshold}, 'flagged': True},
+                               {'$set': {'flagged': False}})
+
+    def for_submission(self, submission_id, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Edges from and to a submission, most similar first (one indexed query per direction).
+
+        Returns:
+            List[Dict]: ``submission_id`` (the other submission), ``similarity``,
+            ``flagged`` and ``direction`` ('outgoing' when this submission was the one checked)
+        """
+        limit = limit or 0
+        matches = []
+        for field, other, direction in (('source', 'target', 'outgoing'), ('target', 'source', 'incoming')):
+            edges = MatchEdge._get_collection().find(
+                {field: ObjectId(str(submission_id))}, {other: 1, 'similarity': 1, 'flagged': 1}
+            ).sort('similarity', -1).limit(limit)
+            matches.extend(
+                {
+                    'submission_id': str(edge[other]),
+                    'similarity': edge['similarity'],
+                    'flagged': edge.get('flagged', False),
+                    'direction': direction
+                }
+                for edge in edges
+            )
+        matches.sort(key=lambda match: match['similarity'], reverse=True)
+        return matches[:limit] if limit else matches
+
+    def for_assignment(self, assignment_id, min_similarity: float = 0.0, limit: Optional[int] = None) -> List[Dict]:
+        """Edges of an assignment at or above min_similarity, most similar first (indexed)."""
+        edges = MatchEdge._get_collection().find(
+            {'assignment': ObjectId(str(assignment_id)), 'similarity': {'$gte': min_similarity}},
+            {'source': 1, 'target': 1, 'similarity': 1, 'flagged': 1}
+        ).sort('similarity', -1).limit(limit or 0)
+        return [
+            {
+                'source_id': str(edge['source']),
+                'target_id': str(edge['target']),
+                'similarity': edge['similarity'],
+                'flagged': edge.get('flagged', False)
+            }
+            for edge in edges
+        ]
+
+    def clusters(self, assignment_id, threshold: Optional[float] = None) -> List[Dict]:
+        """
+        Group an assignment's match edges into collusion clusters with union-find.
+
+        Args:
+            assignment_id: Assignment to cluster
+            threshold (float): Similarity to cluster at; the flagged edges (at or above the
+                assignment's plagiarism threshold) by default. Below the plagiarism threshold
+                only each submission's top_k edges are stored, so such clusters may miss pairs
+
+        Returns:
+            List[Dict]: Clusters as returned by :func:`build_clusters`
+        """
+        query = {'assignment': ObjectId(str(assignment_id))}
+        if threshold is None:
+            query['flagged'] = True
+        else:
+            query['similarity'] = {'$gte': threshold}
+        # A pair checked from both sides has an edge in each direction; keep the stronger one
+        pairs = {}
+        for edge in MatchEdge._get_collection().find(query, {'source': 1, 'target': 1, 'similarity': 1}):
+            pair = tuple(sorted((str(edge['source']), str(edge['target']))))
+            pairs[pair] = max(pairs.get(pair, 0.0), edge['similarity'])
+        return build_clusters((a, b, score) for (a, b), score in pairs.items())
+
+    @staticmethod
+    def passages(source_id, target_id) -> List[Dict]:
+        """
+        Passages of one submission that also appear in another, from their stored
+        winnowing fingerprints (see FingerprintIndex.matching_passages).
+        """
+        index = FingerprintIndex()
+        stored = SubmissionFeatures._get_collection().find(
+            {'submission': {'$in': [ObjectId(str(source_id)), ObjectId(str(target_id))]}},
+            {'submission': 1, 'fingerprints': 1}
+        )
+        for features in stored:
+            index.add(str(features['submission']), fingerprints_from_bytes(features.get('fingerprints') or b''))
+        return index.matching_passages(str(source_id), str(target_id))
+
+
+# Create a global instance
+match_edges = MatchEdgeStore(min_similarity=Config.MATCH_EDGE_MIN_SIMILARITY, top_k=Config.MATCH_EDGE_TOP_K)
@@ -0,0 +1,54 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from config import Config
+from ml_models.reference_index import ReferenceIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ReferenceCorpus:
+    """Lazily opened reference corpus index shared by all plagiarism checks."""
+
+    def __init__(self, root: Optional[str], threshold: float):
+        self.root = root
+        self.threshold = threshold
+        self._index = ReferenceIndex(root) if root else None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._index is not None
+
+    def check(self, signature: np.ndarray, limit: int = 10) -> Optional[Dict]:
+        """
+        Look a submission's signature up in the reference corpus.
+
+        Args:
+            signature (np.ndarray): MinHash hash values of the submission
+            limit (int): Maximum number of reference documents reported
+
+        Returns:
+            Dict: Matches and threshold, or None when no corpus is configured
+        """
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                matches = self._index.query(signature, threshold=self.threshold, limit=limit)
+        except Exception as e:
+            logger.error(f"Reference corpus lookup failed: {str(e)}")
+            return {"error": str(e), "matches": [], "threshold": self.threshold}
+        return {
+            "matches": [{"document": name, "similarity_score": score} for name, score in matches],
+            "threshold": self.threshold
+        }
+
+
+# Create a global instance
+reference_corpus = ReferenceCorpus(Config.REFERENCE_CORPUS_PATH, Config.REFERENCE_MATCH_THRESHOLD)
@@ -0,0 +1,93 @@
+"""
+Processing worker: drains the job queue (OCR, plagiarism checks, grading and
+class-wide analyses) outside the web tier.
+
+The web server only stores uploads and enqueues jobs, so it never imports the
+OCR and sentence-embedding stack. Run as many of these processes as the
+workload needs; jobs are leased, so they can share one database.
+
+Usage (from flask-server/):
+    python -m worker --concurrency 2
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+
+from dotenv import load_dotenv
+
+# Load environment variables before Config reads them
+load_dotenv()
+
+from mongoengine import connect
+
+from config import Config
+from utils.job_queue import (
+    CLASS_ANALYSIS, EXTRACT_ASSIGNMENT_TEXT, PROCESS_SUBMISSION, PROPAGATE_MATCHES, REGRADE_ASSIGNMENT,
+    REMOVE_SUBMISSION, job_worker
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def register_handlers():
+    """Load the processing models and register the job handlers on the global worker."""
+    from utils.document_processor import document_processor
+    from utils.class_analysis import class_analyzer
+    from utils.assignment_index import assignment_indexes
+
+    if Config.SUBMISSION_BATCH_SIZE > 1:
+        job_worker.register_batch(PROCESS_SUBMISSION, document_processor._run_batch,
+                                  max_size=Config.SUBMISSION_BATCH_SIZE,
+                                  window_seconds=Config.SUBMISSION_BATCH_WINDOW_SECONDS)
+    else:
+        job_worker.register(PROCESS_SUBMISSION, document_processor._run_job)
+    job_worker.register(EXTRACT_ASSIGNMENT_TEXT, document_processor._extract_assignment_text)
+    job_worker.register(PROPAGATE_MATCHES, document_processor._propagate_matches)
+    job_worker.register(REGRADE_ASSIGNMENT, document_processor._regrade_assignment)
+    job_worker.register(CLASS_ANALYSIS, class_analyzer.run_job)
+    job_worker.register(REMOVE_SUBMISSION, assignment_indexes.run_removal)
+
+
+def connect_database():
+    mongodb_uri = os.getenv('MONGODB_URI')
+    if not mongodb_uri:
+        # Fallback to localhost MongoDB in development, like the web server
+        if os.getenv('FLASK_ENV') == 'production':
+            raise ValueError("MONGODB_URI environment variable is not set")
+        mongodb_uri = 'mongodb://localhost:27017/assignment_checker'
+        logger.warning(f"MONGODB_URI not set, using default: {mongodb_uri}")
+    connect(host=mongodb_uri)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=Config.JOB_WORKER_CONCURRENCY,
+                        help='Jobs run at once by this process')
+    args = parser.parse_args()
+
+    connect_database()
+    register_handlers()
+    job_worker.concurrency = args.concurrency
+
+    stopping = threading.Event()
+
+    def shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, finishing running jobs")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    job_worker.start()
+    while not stopping.wait(1):
+        pass
+    # Unfinished jobs keep their lease until it expires and are then retried elsewhere
+    job_worker.stop(timeout=Config.JOB_LEASE_SECONDS)
+    logger.info("Worker stopped")
+
+
+if __name__ == '__main__':
+    main()
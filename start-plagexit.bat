@@ -34,6 +34,7 @@ timeout /t 2 /nobreak >nul
 REM Start Flask backend in new window
 echo [2/4] Starting Flask backend server...
 start "PlagExit Backend" cmd /k "cd flask-server && python app.py"
+start "PlagExit Worker" cmd /k "cd flask-server && python -m worker"
 timeout /t 3 /nobreak >nul
 
 REM Install frontend dependencies if needed and start React